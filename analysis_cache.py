@@ -0,0 +1,168 @@
+# analysis_cache.py
+"""
+Content-addressed cache for AnalysisResult.
+Entries are keyed by sha256(config bytes) + benchmark family/version + ANALYZER_VERSION
++ the loaded benchmark packs and rule registry (benchmark_loader.registry_digest)
+(+ whether the cross-pack comparison was requested),
+held in a bounded in-memory LRU and optionally persisted to a directory as
+zlib-compressed JSON of the result's fields: loading an entry only ever builds
+data. Like the pack cache (benchmark_loader.private_dir), the directory is only
+used while this user owns it and others cannot access it.
+Cached results are shared between callers; treat them as read-only.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Callable, Dict, Optional, Union
+from analyzer import ANALYZER_VERSION, AnalysisResult, analyze_tree, stage_sections
+from benchmark_loader import private_dir, registry_digest
+from config_tree import ConfigTree, load_config_tree, parse_config_tree
+BytesLike = Union[bytes, bytearray, memoryview]
+def content_hash(data: BytesLike) -> str:
+   return hashlib.sha256(data).hexdigest()
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+   h = hashlib.sha256()
+   with open(path, "rb") as f:
+       for chunk in iter(lambda: f.read(chunk_size), b""):
+           h.update(chunk)
+   return h.hexdigest()
+def cache_key(digest: str, benchmark_family: str, benchmark_version: str, compare_packs: bool = False) -> str:
+   raw = f"{digest}|{benchmark_family}|{benchmark_version}|{ANALYZER_VERSION}|{registry_digest()}" + ("|compare" if compare_packs else "")
+   return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+class AnalysisCache:
+   """
+   LRU of AnalysisResult by cache_key(), bounded to `max_entries`, with an
+   optional on-disk second level; `disk_dir` is created 0700 if missing and
+   left unused (disk_dir None) unless it is private to this user.
+   Safe to share across threads.
+   """
+   def __init__(self, max_entries: int = 32, disk_dir: Optional[str] = None):
+       self.max_entries = max(1, int(max_entries))
+       self.disk_dir = disk_dir if disk_dir and private_dir(disk_dir) else None
+       self._entries: "OrderedDict[str, AnalysisResult]" = OrderedDict()
+       self._lock = threading.Lock()
+       self.hits = 0
+       self.disk_hits = 0
+       self.misses = 0
+   @property
+   def stats(self) -> Dict[str, int]:
+       with self._lock:
+           return {
+               "hits": self.hits,
+               "disk_hits": self.disk_hits,
+               "misses": self.misses,
+               "entries": len(self._entries),
+               "max_entries": self.max_entries,
+           }
+   def clear(self) -> None:
+       with self._lock:
+           self._entries.clear()
+   # -------------------------
+   # Lookup / store
+   # -------------------------
+   def get(self, key: str) -> Optional[AnalysisResult]:
+       with self._lock:
+           result = self._entries.get(key)
+           if result is not None:
+               self._entries.move_to_end(key)
+               self.hits += 1
+               return result
+       result = self._load(key)
+       with self._lock:
+           if result is None:
+               self.misses += 1
+               return None
+           self.disk_hits += 1
+           self._remember(key, result)
+       return result
+   def put(self, key: str, result: AnalysisResult) -> None:
+       with self._lock:
+           self._remember(key, result)
+       self._store(key, result)
+   def _remember(self, key: str, result: AnalysisResult) -> None:
+       self._entries[key] = result
+       self._entries.move_to_end(key)
+       while len(self._entries) > self.max_entries:
+           self._entries.popitem(last=False)
+   # -------------------------
+   # Disk level
+   # -------------------------
+   def _path(self, key: str) -> str:
+       return os.path.join(self.disk_dir, f"{key}.json.z")
+   def _load(self, key: str) -> Optional[AnalysisResult]:
+       if not self.disk_dir:
+           return None
+       path = self._path(key)
+       try:
+           with open(path, "rb") as f:
+               return AnalysisResult(**json.loads(zlib.decompress(f.read())))
+       except FileNotFoundError:
+           return None
+       except (OSError, ValueError, TypeError, zlib.error):
+           # Truncated or stale entry: drop it and re-analyze.
+           try:
+               os.remove(path)
+           except OSError:
+               pass
+           return None
+   def _store(self, key: str, result: AnalysisResult) -> None:
+       if not self.disk_dir:
+           return
+       try:
+           blob = zlib.compress(json.dumps(asdict(result), ensure_ascii=False).encode("utf-8"), 1)
+       except (TypeError, ValueError):
+           # A field JSON cannot hold: keep the entry in memory only.
+           return
+       fd, tmp = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+       try:
+           with os.fdopen(fd, "wb") as f:
+               f.write(blob)
+           os.replace(tmp, self._path(key))
+       except BaseException:
+           if os.path.exists(tmp):
+               os.remove(tmp)
+           raise
+   # -------------------------
+   # Analysis entry points
+   # -------------------------
+   def analyze(
+       self,
+       data: BytesLike,
+       benchmark_family: str = "Auto (from firmware)",
+       benchmark_version: str = "Auto",
+       compare_packs: bool = False,
+       load_tree: Optional[Callable[[], ConfigTree]] = None
+   ) -> AnalysisResult:
+       """
+       Returns the cached result for these config bytes, analyzing them on a miss.
+       The buffer is parsed in place; `load_tree`, when given, supplies the tree
+       instead (parsed from the same bytes, with at least stage_sections()).
+       """
+       key = cache_key(content_hash(data), benchmark_family, benchmark_version, compare_packs)
+       result = self.get(key)
+       if result is None:
+           tree = load_tree() if load_tree is not None else parse_config_tree(data, stage_sections())
+           result = analyze_tree(tree, benchmark_family, benchmark_version, compare_packs=compare_packs)
+           self.put(key, result)
+       return result
+   def analyze_file(
+       self,
+       path: str,
+       benchmark_family: str = "Auto (from firmware)",
+       benchmark_version: str = "Auto",
+       compare_packs: bool = False
+   ) -> AnalysisResult:
+       """Same as analyze() for a file on disk; parses through the memory-mapped path on a miss."""
+       key = cache_key(file_hash(path), benchmark_family, benchmark_version, compare_packs)
+       result = self.get(key)
+       if result is None:
+           tree = load_config_tree(path, stage_sections())
+           result = analyze_tree(tree, benchmark_family, benchmark_version, compare_packs=compare_packs)
+           self.put(key, result)
+       return result
@@ -1,71 +1,41 @@
+import os
 import re
 from collections import defaultdict
-from dataclasses import dataclass
-from typing import Dict, Any, List, Tuple, Optional
-# -------------------------
-# Parsing Helpers
-# -------------------------
-def extract_block(section_header: str, text: str) -> str:
-   m = re.search(rf"(?ms)^{re.escape(section_header)}\s*(.*?)^end\s*$", text)
-   return m.group(0) if m else ""
-def parse_kv_block(block: str) -> Dict[str, str]:
-   d = {}
-   for line in block.splitlines():
-       line = line.strip()
-       if line.startswith("set "):
-           parts = line.split(None, 2)
-           if len(parts) == 3:
-               d[parts[1]] = parts[2].strip()
-   return d
-def parse_config_edit_block(section_header: str, text: str) -> Dict[str, Dict[str, str]]:
-   """
-   Parse:
-     config X
-       edit "name" / edit 1
-         set k v
-       next
-     end
-   """
-   block = extract_block(section_header, text)
-   if not block:
-       return {}
-   items: Dict[str, Dict[str, str]] = {}
-   cur_key = None
-   cur: Dict[str, str] = {}
-   for raw in block.splitlines():
-       line = raw.strip()
-       if line.startswith("edit "):
-           if cur_key is not None:
-               items[cur_key] = cur
-           cur_key = line[5:].strip().strip('"')
-           cur = {}
-       elif line.startswith("set ") and cur_key is not None:
-           parts = line.split(None, 2)
-           if len(parts) == 3:
-               cur[parts[1]] = parts[2].strip()
-       elif line == "next":
-           if cur_key is not None:
-               items[cur_key] = cur
-               cur_key = None
-               cur = {}
-       elif line == "end":
-           break
-   if cur_key is not None:
-       items[cur_key] = cur
-   return items
-def norm_list_val(v) -> List[str]:
-   if not v:
-       return []
-   tokens = re.findall(r'"([^"]+)"|(\S+)', str(v))
-   return [a if a else b for a, b in tokens]
-def is_all(vals: List[str]) -> bool:
-   return any(x.lower() == "all" for x in (vals or []))
-def has_utm(p: Dict[str, str]) -> bool:
-   keys = [
-       "av-profile", "ips-sensor", "webfilter-profile",
-       "application-list", "ssl-ssh-profile", "profile-protocol-options"
-   ]
-   return any(k in p and p.get(k) not in (None, "", "0", "\"\"") for k in keys)
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Collection, Dict, Any, FrozenSet, List, Mapping, Tuple, Optional
+import numpy as np
+from benchmark_loader import BenchmarkPack, PackSelection, load_pack, load_supported_packs
+from config_tree import ConfigTree, load_config_tree, parse_config_tree
+from control_engine import CONTEXT_SECTIONS, config_hostname, evaluate_pack, evaluate_packs, rule_context
+from fw_objects import ANY_ADDRESS, ANY_SERVICE, OBJECT_SECTIONS, PolicyObjects, Span, contains, overlaps
+from interface_roles import INTERNAL_ROLES, ROLE_WAN, ROLE_SECTIONS, InterfaceRoles
+from policy_engine import ANY_INTERFACE, first_coverers, interface_contains
+from policy_matrix import find_union_shadowed
+from policy_overlap import find_conflicts
+from policy_model import (
+   FLAG_ACCEPT, FLAG_ANY_DST, FLAG_ANY_SRC, FLAG_ANY_SVC, FLAG_LOGGED, FLAG_UTM, FLAG_VALUES,
+   PolicyRecord, build_policy_records,
+)
+from reachability import zone_reachability
+# Bump whenever analysis output changes; it is part of every AnalysisCache key.
+ANALYZER_VERSION = "1.23"
+# Top-level sections each analyzer stage reads (paths without the "config " prefix).
+# CIS_SECTIONS is all the rule context can read; a run reads what its packs declare (benchmark_sections).
+CIS_SECTIONS = CONTEXT_SECTIONS
+POLICY_SECTIONS = ("firewall policy",) + OBJECT_SECTIONS + ROLE_SECTIONS
+# Settings searched after the `#...` header lines for firmware details (firmware_text).
+FIRMWARE_SECTIONS = ("system status", "system global")
+# Read by every run, whatever its stages: the hostname (config_hostname) and firmware details.
+META_SECTIONS = FIRMWARE_SECTIONS
+# Analysis stages: benchmark controls, and per-VDOM policy hygiene.
+STAGE_CIS = "cis"
+STAGE_HYGIENE = "hygiene"
+STAGES = (STAGE_CIS, STAGE_HYGIENE)
+# Steps of analyze_tree, in run order, as reported to its `on_step` hook.
+ANALYSIS_STEPS = ("hygiene", "cis", "report")
+# Multi-VDOM exports fan per-VDOM policy analytics out to worker processes from this many policies.
+PARALLEL_MIN_POLICIES = 20000
 # -------------------------
 # Firmware Extraction
 # -------------------------
@@ -110,35 +80,25 @@ def extract_firmware_info(text: str) -> Tuple[str, str, str]:
    if m:
        return platform, m.group(1), m.group(2)
    return platform, version, build
+def firmware_text(tree: ConfigTree) -> str:
+   """
+   The text extract_firmware_info searches: the export's `#...` header lines,
+   then the FIRMWARE_SECTIONS settings as `set` lines for exports without a header.
+   """
+   lines = [tree.header]
+   for path in FIRMWARE_SECTIONS:
+       lines.extend(f"set {k} {v}" for k, v in tree.settings(path).items())
+   return "\n".join(lines)
 # -------------------------
-# Benchmark Pack selection (metadata only for MVP subset)
+# Benchmark Pack selection
 # -------------------------
-def detect_branch(version: str) -> str:
-   m = re.match(r"^\s*(\d+)\.(\d+)\.", str(version).strip())
-   if not m:
-       return "unknown"
-   return f"{int(m.group(1))}.{int(m.group(2))}"
-def select_benchmark_pack(fw_version: str, benchmark_family: str, benchmark_version: str) -> Dict[str, str]:
-   """
-   Returns benchmark_meta used in UI + Excel.
-   This does NOT parse PDFs yet; it declares what pack you are aligning to.
-   """
-   branch = detect_branch(fw_version)
-   # Auto
-   if benchmark_family.startswith("Auto"):
-       if branch == "7.0":
-           return {"pack_name": "CIS FortiGate 7.0.x Benchmark", "pack_version": "v1.4.0", "selection": "auto"}
-       if branch == "7.4":
-           return {"pack_name": "CIS FortiGate 7.4.x Benchmark", "pack_version": "v1.0.1", "selection": "auto"}
-       return {"pack_name": "CIS FortiGate Benchmark", "pack_version": "auto", "selection": "auto"}
-   # Explicit
-   if benchmark_family == "FortiOS 7.0.x":
-       v = benchmark_version if benchmark_version and benchmark_version != "Auto" else "v1.4.0"
-       return {"pack_name": "CIS FortiGate 7.0.x Benchmark", "pack_version": v, "selection": "manual"}
-   if benchmark_family == "FortiOS 7.4.x":
-       v = benchmark_version if benchmark_version and benchmark_version != "Auto" else "v1.0.1"
-       return {"pack_name": "CIS FortiGate 7.4.x Benchmark", "pack_version": v, "selection": "manual"}
-   return {"pack_name": "CIS FortiGate Benchmark", "pack_version": "unknown", "selection": "manual"}
+def select_benchmark_pack(fw_version: str, benchmark_family: str, benchmark_version: str) -> PackSelection:
+   """The pack CIS controls are evaluated against (benchmark_loader.load_pack)."""
+   return load_pack(fw_version, benchmark_family, benchmark_version)
+def benchmark_meta(selected: PackSelection) -> Dict[str, str]:
+   """Pack details shown in the UI and the Excel report."""
+   pack = selected.pack
+   return {"pack_id": pack.pack_id, "pack_name": pack.pack_name, "pack_version": pack.pack_version, "selection": selected.selection}
 # -------------------------
 # Lifecycle Assessment (OFFLINE / POLICY-BASED)
 # -------------------------
@@ -175,57 +135,404 @@ def derive_lifecycle_assessment(platform: str, version: str, build: str) -> Dict
 # -------------------------
 # Policy Analytics
 # -------------------------
-def permissive_score(p: Dict[str, str]) -> Tuple[int, str, str]:
-   src = norm_list_val(p.get("srcaddr"))
-   dst = norm_list_val(p.get("dstaddr"))
-   svc = norm_list_val(p.get("service"))
-   action = (p.get("action", "").strip('"').lower())
-   logtraffic = (p.get("logtraffic", "").strip('"').lower())
+# Permissive-risk (score, severity, reasons) for every PolicyRecord.flags value;
+# the per-policy and columnar paths both index it.
+PERMISSIVE_MIN_SCORE = 5
+def _permissive_entry(flags: int) -> Tuple[int, str, str]:
+   src, dst, svc = flags & FLAG_ANY_SRC, flags & FLAG_ANY_DST, flags & FLAG_ANY_SVC
    score = 0
    reasons = []
-   if action == "accept":
-       if is_all(src) and is_all(dst) and (is_all(svc) or any(x.upper() == "ALL" for x in svc)):
+   if flags & FLAG_ACCEPT:
+       if src and dst and svc:
            score += 10; reasons.append("ANY-ANY-ANY ACCEPT")
-       elif is_all(src) and is_all(dst):
+       elif src and dst:
            score += 7; reasons.append("ANY-ANY ACCEPT")
-       elif is_all(dst) and (is_all(svc) or any(x.upper() == "ALL" for x in svc)):
+       elif dst and svc:
            score += 7; reasons.append("ANY-DST + ANY-SVC")
-       elif is_all(src) and (is_all(svc) or any(x.upper() == "ALL" for x in svc)):
+       elif src and svc:
            score += 7; reasons.append("ANY-SRC + ANY-SVC")
-   if logtraffic in ("disable", "none", ""):
+   if not flags & FLAG_LOGGED:
        score += 2; reasons.append("Logging not enabled")
-   if not has_utm(p):
+   if not flags & FLAG_UTM:
        score += 2; reasons.append("No UTM profiles detected")
    if score >= 10: sev = "CRITICAL"
    elif score >= 8: sev = "HIGH"
    elif score >= 5: sev = "MEDIUM"
    else: sev = "LOW"
    return score, sev, ", ".join(reasons)
-def policy_signature(p: Dict[str, str]) -> Tuple:
+PERMISSIVE_TABLE = [_permissive_entry(flags) for flags in range(FLAG_VALUES)]
+PERMISSIVE_SCORES = np.array([entry[0] for entry in PERMISSIVE_TABLE], dtype=np.int16)
+def permissive_score(p: PolicyRecord) -> Tuple[int, str, str]:
+   return PERMISSIVE_TABLE[p.flags]
+def policy_signature(p: PolicyRecord) -> Tuple:
+   return (
+       tuple(sorted(p.srcintf)),
+       tuple(sorted(p.dstintf)),
+       tuple(sorted(p.srcaddr)),
+       tuple(sorted(p.dstaddr)),
+       tuple(sorted(p.service)),
+       p.schedule,
+       p.action,
+       p.status,
+   )
+def covers(prev: PolicyRecord, curr: PolicyRecord) -> bool:
+   # Same action; interfaces, expanded addresses and services each a superset.
    return (
-       tuple(sorted(norm_list_val(p.get("srcintf")))),
-       tuple(sorted(norm_list_val(p.get("dstintf")))),
-       tuple(sorted(norm_list_val(p.get("srcaddr")))),
-       tuple(sorted(norm_list_val(p.get("dstaddr")))),
-       tuple(sorted(norm_list_val(p.get("service")))),
-       p.get("schedule", ""),
-       p.get("action", ""),
-       p.get("status", "enable"),
+       interface_contains(prev.sif, curr.sif) and
+       interface_contains(prev.dif, curr.dif) and
+       contains(prev.src, curr.src) and
+       contains(prev.dst, curr.dst) and
+       contains(prev.svc, curr.svc) and
+       prev.action_key == curr.action_key
    )
-def covers(prev: Dict[str, str], curr: Dict[str, str]) -> bool:
-   # Conservative: only 'all' covers anything; otherwise exact match.
-   def covers_list(prev_list, curr_list):
-       sp = set([x.lower() for x in prev_list])
-       sc = set([x.lower() for x in curr_list])
-       if "all" in sp:
-           return True
-       return sp == sc
+def policy_rows(records: List[PolicyRecord], vdom: str = "root") -> List[Dict[str, Any]]:
+   return [{
+       "vdom": vdom,
+       "policy_id": p.policy_id,
+       "name": p.name,
+       "status": p.status,
+       "srcintf": " ".join(p.srcintf),
+       "dstintf": " ".join(p.dstintf),
+       "srcaddr": " ".join(p.srcaddr),
+       "dstaddr": " ".join(p.dstaddr),
+       "service": " ".join(p.service),
+       "action": p.action,
+       "schedule": p.schedule,
+       "logtraffic": p.logtraffic,
+       "utm_detected": "YES" if p.utm else "NO",
+   } for p in records]
+def find_permissive(records: List[PolicyRecord], vdom: str = "root") -> List[Dict[str, Any]]:
+   """
+   Policies scoring at least PERMISSIVE_MIN_SCORE, riskiest first. Rows carry
+   only the key and the score; permissive_view() joins them with policies_raw.
+   """
+   codes = np.fromiter((p.flags for p in records), dtype=np.int64, count=len(records))
+   scores = PERMISSIVE_SCORES[codes]
+   keep = np.flatnonzero(scores >= PERMISSIVE_MIN_SCORE)
+   pids = np.fromiter((records[i].policy_id for i in keep), dtype=np.int64, count=len(keep))
+   keep = keep[np.lexsort((pids, -scores[keep]))]
+   table = PERMISSIVE_TABLE
+   rows: List[Dict[str, Any]] = []
+   for i, code in zip(keep.tolist(), codes[keep].tolist()):
+       score, sev, reasons = table[code]
+       rows.append({"vdom": vdom, "policy_id": records[i].policy_id, "risk_score": score, "severity": sev, "reasons": reasons})
+   return rows
+def permissive_view(result: "AnalysisResult") -> List[Dict[str, Any]]:
+   """Permissive rows with their policy's policies_raw fields, in permissive order."""
+   raw = {(row["vdom"], row["policy_id"]): row for row in result.policies_raw}
+   return [dict(raw.get((p["vdom"], p["policy_id"]), {}), **p) for p in result.permissive]
+def permissive_order(row: Dict[str, Any]) -> Tuple[int, int]:
+   return -row["risk_score"], row["policy_id"]
+def find_duplicates(records: List[PolicyRecord], vdom: str = "root") -> List[Dict[str, Any]]:
+   """
+   Policies matching exactly the same traffic as an earlier one: same interface
+   sets, same expanded (resolved, negation-applied) address and service spans,
+   schedule, action and status. `web-srv` and a group holding only that host
+   are the same object here; the criteria say whether the names matched too.
+   One dict pass: each distinct span object (the object books intern spans and
+   memoize group expansion) is hashed once and replaced by a small id.
+   """
+   span_ids: Dict[Span, int] = {}
+   by_object: Dict[int, int] = {}
+   def span_id(span: Span) -> int:
+       k = by_object.get(id(span))
+       if k is None:
+           k = by_object[id(span)] = span_ids.setdefault(span, len(span_ids))
+       return k
+   any_interface = frozenset((ANY_INTERFACE,))
+   def interfaces(names: FrozenSet[str]) -> FrozenSet[str]:
+       return any_interface if ANY_INTERFACE in names else names
+   groups: Dict[Tuple, List[PolicyRecord]] = defaultdict(list)
+   for p in records:
+       groups[(interfaces(p.sif), interfaces(p.dif), span_id(p.src), span_id(p.dst), span_id(p.svc), p.schedule.strip('"'),
+               p.action_key, p.status.strip('"').lower())].append(p)
+   duplicates: List[Dict[str, Any]] = []
+   for same in groups.values():
+       if len(same) > 1:
+           base = same[0]
+           sig = policy_signature(base)
+           for other in same[1:]:
+               criteria = "Exact signature match" if policy_signature(other) == sig else "Same expanded objects"
+               duplicates.append({"vdom": vdom, "policy_id": other.policy_id, "duplicate_of": base.policy_id, "criteria": criteria})
+   duplicates.sort(key=lambda x: x["policy_id"])
+   return duplicates
+# Mergeable fields: (setting, index in policy_signature, negate setting, PolicyRecord span, its ANY span).
+CONSOLIDATE_FIELDS = (
+   ("srcaddr", 2, "srcaddr-negate", "src", ANY_ADDRESS),
+   ("dstaddr", 3, "dstaddr-negate", "dst", ANY_ADDRESS),
+   ("service", 4, "service-negate", "svc", ANY_SERVICE),
+)
+# Rules between two consecutive merge candidates, and differently configured rules a run may
+# span, checked for conflicts; beyond either the run is split.
+MERGE_MAX_GAP = 64
+def _setting(p: PolicyRecord, key: str) -> str:
+   for k, v in p.settings:
+       if k == key:
+           return v.strip('"')
+   return ""
+def _interfaces_overlap(a: frozenset, b: frozenset) -> bool:
+   return bool(a and b) and ("any" in a or "any" in b or not a.isdisjoint(b))
+def _conflicts(k: PolicyRecord, p: PolicyRecord) -> bool:
+   """Whether `k`, sitting above `p`, would stop matching some of p's traffic if p moved above it."""
    return (
-       covers_list(norm_list_val(prev.get("srcaddr")), norm_list_val(curr.get("srcaddr"))) and
-       covers_list(norm_list_val(prev.get("dstaddr")), norm_list_val(curr.get("dstaddr"))) and
-       covers_list(norm_list_val(prev.get("service")), norm_list_val(curr.get("service"))) and
-       prev.get("action", "").lower() == curr.get("action", "").lower()
+       _interfaces_overlap(k.sif, p.sif) and _interfaces_overlap(k.dif, p.dif) and
+       overlaps(k.src, p.src) and overlaps(k.dst, p.dst) and overlaps(k.svc, p.svc)
+   )
+def _merge_runs(records: List[PolicyRecord], members: List[int]) -> List[List[int]]:
+   """
+   Splits one bucket (positions in order) into runs that can be merged into the
+   first rule's position: each later rule must not overlap any differently
+   configured enabled rule between the run's first rule and itself.
+   """
+   runs: List[List[int]] = []
+   run = [members[0]]
+   between: List[PolicyRecord] = []
+   settings = records[members[0]].settings
+   for j in members[1:]:
+       if j - run[-1] > MERGE_MAX_GAP:
+           runs.append(run)
+           run, between = [j], []
+           continue
+       for k in range(run[-1] + 1, j):
+           q = records[k]
+           if q.settings != settings and q.status.strip('"') != "disable":
+               between.append(q)
+       p = records[j]
+       if len(between) > MERGE_MAX_GAP or any(_conflicts(q, p) for q in between):
+           runs.append(run)
+           run, between = [j], []
+       else:
+           run.append(j)
+   runs.append(run)
+   return [r for r in runs if len(r) > 1]
+def _merged_tokens(rules: List[PolicyRecord], field: str, span: str, any_span: Span) -> List[str]:
+   """
+   Tokens of the merged rule: one rule's tokens when they resolve to exactly
+   ANY, otherwise the union (ALLTCP + DNS must keep udp/53).
+   """
+   for p in rules:
+       if getattr(p, span) == any_span:
+           return list(getattr(p, field))
+   return list(dict.fromkeys(t for p in rules for t in getattr(p, field)))
+def find_consolidations(records: List[PolicyRecord], vdom: str = "root") -> List[Dict[str, Any]]:
+   """
+   Groups of enabled rules that can become one rule: equal settings (action,
+   interfaces, schedule, profiles, ...) and equal in two of source, destination
+   and service, so the merged rule takes the union of the third. Rules are
+   bucketed on the "all fields but one" key per field, and a group only spans
+   rules no differently configured overlapping rule sits between (see
+   _merge_runs). Positions are config sequence, so a group is only proposed
+   where merging keeps what the device evaluates first. Each rule joins at
+   most one group, largest groups first; groups are listed in config sequence.
+   """
+   buckets: Dict[str, Dict[Tuple, List[int]]] = {f[0]: defaultdict(list) for f in CONSOLIDATE_FIELDS}
+   # Distinct settings -> (small id for bucket keys, fields that may not be merged).
+   by_settings: Dict[Tuple, Tuple[int, FrozenSet[str]]] = {}
+   for i, p in enumerate(records):
+       if p.status.strip('"') == "disable":
+           continue
+       meta = by_settings.get(p.settings)
+       if meta is None:
+           # A union of negated sets is not the negation of their union; ISDB rules have no dstaddr.
+           skip = frozenset(
+               [f[0] for f in CONSOLIDATE_FIELDS if _setting(p, f[2]) == "enable"]
+               + (["dstaddr"] if _setting(p, "internet-service") == "enable" else []))
+           meta = by_settings[p.settings] = (len(by_settings), skip)
+       sid, skip = meta
+       sig = policy_signature(p)
+       for field, idx, _, _, _ in CONSOLIDATE_FIELDS:
+           if field not in skip:
+               buckets[field][(sid,) + sig[:idx] + sig[idx + 1:]].append(i)
+   runs: List[Tuple[str, List[int]]] = []
+   for field, by_key in buckets.items():
+       for members in by_key.values():
+           if len(members) > 1:
+               runs.extend((field, run) for run in _merge_runs(records, members))
+   runs.sort(key=lambda fr: (-len(fr[1]), fr[1][0]))
+   used = set()
+   groups: List[Tuple[int, Dict[str, Any]]] = []
+   for field, run in runs:
+       run = [i for i in run if i not in used]
+       if len(run) < 2:
+           continue
+       used.update(run)
+       rules = [records[i] for i in run]
+       _, _, _, span, any_span = next(f for f in CONSOLIDATE_FIELDS if f[0] == field)
+       merged = " ".join(f'"{t}"' for t in _merged_tokens(rules, field, span, any_span))
+       keep, drop = rules[0].policy_id, [p.policy_id for p in rules[1:]]
+       cli = (f"config firewall policy\n    edit {keep}\n        set {field} {merged}\n    next\n"
+              + "".join(f"    delete {pid}\n" for pid in drop) + "end")
+       groups.append((run[0], {
+           "vdom": vdom,
+           "keep_id": keep,
+           "policy_ids": " ".join(str(p.policy_id) for p in rules),
+           "field": field,
+           "merged": merged,
+           "removed": len(drop),
+           "cli": cli,
+       }))
+   groups.sort(key=lambda pg: pg[0])
+   return [g for _, g in groups]
+def find_shadowed_redundant(records: List[PolicyRecord], start: int = 0, vdom: str = "root",
+                            coverers: Optional[List[int]] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+   """
+   (shadowed, redundant) for rules at position >= `start`. A rule is shadowed by
+   the earliest rule above that covers it, whatever its action: the rule never
+   matches a packet first. Redundant is the allow subset of shadowed whose
+   coverer is an allow too. `coverers` is first_coverers(records, start,
+   same_action=False) when the caller already has it.
+   """
+   if coverers is None:
+       coverers = first_coverers(records, start, same_action=False)
+   shadowed: List[Dict[str, Any]] = []
+   redundant: List[Dict[str, Any]] = []
+   for idx in range(start, len(records)):
+       by = coverers[idx]
+       if by < 0:
+           continue
+       curr, prev = records[idx], records[by]
+       same = prev.action_key == curr.action_key
+       reason = "Superset/equal match above (objects expanded)" if same else "Superset match above with a different action (objects expanded)"
+       shadowed.append({"vdom": vdom, "policy_id": curr.policy_id, "shadowed_by": prev.policy_id, "reason": reason})
+       if curr.accept and same:
+           redundant.append({"vdom": vdom, "policy_id": curr.policy_id, "covered_by": prev.policy_id, "reason": "Covered by broader/equal allow (objects expanded)"})
+   return shadowed, redundant
+def find_shadowed(records: List[PolicyRecord], start: int = 0, vdom: str = "root") -> List[Dict[str, Any]]:
+   """Rules covered by an earlier rule of any action; only rules at position >= `start` are checked."""
+   return find_shadowed_redundant(records, start, vdom)[0]
+def find_redundant(records: List[PolicyRecord], start: int = 0, vdom: str = "root") -> List[Dict[str, Any]]:
+   """Allow rules covered by an earlier allow; only rules at position >= `start` are checked."""
+   return find_shadowed_redundant(records, start, vdom)[1]
+def segmentation_matrix(records: List[PolicyRecord], vdom: str = "root", roles: Optional[InterfaceRoles] = None) -> List[Dict[str, Any]]:
+   role = (roles or InterfaceRoles()).role
+   matrix = defaultdict(int)
+   for p in records:
+       if not p.accept:
+           continue
+       for s in p.srcintf:
+           for d in p.dstintf:
+               matrix[(s, d)] += 1
+   segmentation: List[Dict[str, Any]] = []
+   for (s, d), count in sorted(matrix.items(), key=lambda x: (-x[1], x[0][0], x[0][1])):
+       src_role, dst_role = role(s), role(d)
+       indicator = "Review"
+       if s == d:
+           indicator = "Hairpin / Same-Zone"
+       if dst_role == ROLE_WAN:
+           indicator = "Internet-Bound Traffic"
+       if src_role in INTERNAL_ROLES and dst_role in INTERNAL_ROLES:
+           indicator = "Internal East-West Exposure"
+       segmentation.append({"vdom": vdom, "srcintf": s, "dstintf": d, "src_role": src_role, "dst_role": dst_role,
+                            "policy_count": count, "indicator": indicator})
+   return segmentation
+def utm_coverage(records: List[PolicyRecord], roles: Optional[InterfaceRoles] = None) -> Dict[str, Any]:
+   """Internet-bound policies (any destination interface with the wan role) and how many carry UTM."""
+   is_wan = (roles or InterfaceRoles()).is_wan
+   internet_policies = 0
+   utm_attached = 0
+   for p in records:
+       if any(is_wan(x) for x in p.dstintf):
+           internet_policies += 1
+           if p.utm:
+               utm_attached += 1
+   return coverage_summary(len(records), internet_policies, utm_attached)
+def coverage_summary(total: int, internet_policies: int, utm_attached: int) -> Dict[str, Any]:
+   coverage_pct = (utm_attached / internet_policies * 100.0) if internet_policies else 0.0
+   return {
+       "total_policies": total,
+       "internet_bound_policies": internet_policies,
+       "internet_with_utm": utm_attached,
+       "utm_coverage_pct": round(coverage_pct, 2),
+   }
+# -------------------------
+# Per-VDOM policy analytics
+# -------------------------
+HYGIENE_LISTS = ("policies_raw", "permissive", "duplicates", "shadowed", "redundant", "union_shadowed", "segmentation", "reachability", "consolidation", "conflicts")
+def policy_hygiene(records: List[PolicyRecord], vdom: str = "root", roles: Optional[InterfaceRoles] = None) -> Dict[str, Any]:
+   """
+   Every policy-derived AnalysisResult field for one VDOM, keyed by field name.
+   `roles` is the VDOM's interface role index (InterfaceRoles.from_tables).
+   """
+   coverers = first_coverers(records, same_action=False)
+   shadowed, redundant = find_shadowed_redundant(records, vdom=vdom, coverers=coverers)
+   return {
+       "policies_raw": policy_rows(records, vdom),
+       "permissive": find_permissive(records, vdom),
+       "duplicates": find_duplicates(records, vdom),
+       "shadowed": shadowed,
+       "redundant": redundant,
+       "union_shadowed": find_union_shadowed(records, vdom=vdom, coverers=coverers),
+       "segmentation": segmentation_matrix(records, vdom, roles),
+       "reachability": zone_reachability(records, vdom),
+       "consolidation": find_consolidations(records, vdom),
+       "conflicts": find_conflicts(records, vdom),
+       "sec_profile_coverage": utm_coverage(records, roles),
+   }
+def vdom_summary(vdom: str, hygiene: Dict[str, Any]) -> Dict[str, Any]:
+   cov = hygiene["sec_profile_coverage"]
+   return {
+       "vdom": vdom,
+       "policies": cov["total_policies"],
+       "permissive": len(hygiene["permissive"]),
+       "critical": sum(1 for p in hygiene["permissive"] if p["severity"] == "CRITICAL"),
+       "duplicates": len(hygiene["duplicates"]),
+       "shadowed": len(hygiene["shadowed"]),
+       "redundant": len(hygiene["redundant"]),
+       "union_shadowed": len(hygiene["union_shadowed"]),
+       "transitive_paths": sum(1 for r in hygiene["reachability"] if r["hops"] > 1),
+       "mergeable": sum(g["removed"] for g in hygiene["consolidation"]),
+       "conflicts": sum(1 for c in hygiene["conflicts"] if c["type"] == "Conflict"),
+       "correlations": sum(1 for c in hygiene["conflicts"] if c["type"] == "Correlation"),
+       "internet_bound_policies": cov["internet_bound_policies"],
+       "utm_coverage_pct": cov["utm_coverage_pct"],
+   }
+def rollup_hygiene(per_vdom: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+   """
+   Global view over all VDOMs: row lists concatenated in VDOM order (permissive
+   re-ranked across VDOMs), UTM coverage summed, plus one summary row per VDOM.
+   """
+   out: Dict[str, Any] = {name: [row for h in per_vdom.values() for row in h[name]] for name in HYGIENE_LISTS}
+   out["permissive"].sort(key=permissive_order)
+   covs = [h["sec_profile_coverage"] for h in per_vdom.values()]
+   out["sec_profile_coverage"] = coverage_summary(
+       sum(c["total_policies"] for c in covs),
+       sum(c["internet_bound_policies"] for c in covs),
+       sum(c["internet_with_utm"] for c in covs),
    )
+   out["vdoms"] = [vdom_summary(name, h) for name, h in per_vdom.items()]
+   return out
+def policy_tables(scope: ConfigTree, global_scope: Optional[ConfigTree] = None) -> Dict[str, Dict[str, Dict[str, str]]]:
+   """
+   The POLICY_SECTIONS entries of one VDOM scope. Multi-VDOM exports keep
+   `system interface` under `config global`; pass `global_scope` to take it from there.
+   """
+   tables = {path: scope.items(path) for path in POLICY_SECTIONS}
+   if not tables["system interface"] and global_scope is not None:
+       tables["system interface"] = global_scope.items("system interface")
+   return tables
+def vdom_records(tables: Mapping[str, Mapping[str, Mapping[str, str]]]) -> List[PolicyRecord]:
+   return build_policy_records(tables["firewall policy"], PolicyObjects.from_tables(tables))
+def _vdom_worker(job: Tuple[str, Dict[str, Dict[str, Dict[str, str]]]]) -> Tuple[str, Dict[str, Any]]:
+   vdom, tables = job
+   return vdom, policy_hygiene(vdom_records(tables), vdom, InterfaceRoles.from_tables(tables))
+def analyze_vdoms(tree: ConfigTree, max_workers: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+   """
+   policy_hygiene() for every VDOM. VDOMs are independent, so on large multi-VDOM
+   exports they are spread over a process pool (largest first); `max_workers=1`
+   forces a serial run.
+   """
+   global_scope = tree.global_scope()
+   jobs = [(name, policy_tables(scope, global_scope)) for name, scope in tree.vdoms().items()]
+   workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+   if workers <= 1 or sum(len(t["firewall policy"]) for _, t in jobs) < PARALLEL_MIN_POLICIES:
+       return dict(_vdom_worker(job) for job in jobs)
+   # Empty settings are read-only proxies; hand workers plain dicts.
+   jobs = [(name, {path: {k: dict(v) for k, v in items.items()} for path, items in t.items()}) for name, t in jobs]
+   order = [name for name, _ in jobs]
+   jobs.sort(key=lambda job: -len(job[1]["firewall policy"]))
+   with ProcessPoolExecutor(max_workers=workers) as pool:
+       done = dict(pool.map(_vdom_worker, jobs))
+   return {name: done[name] for name in order}
 # -------------------------
 # Result Object
 # -------------------------
@@ -243,6 +550,21 @@ class AnalysisResult:
    segmentation: List[Dict[str, Any]]
    sec_profile_coverage: Dict[str, Any]
    lifecycle_assessment: Dict[str, Any]
+   # One summary row per VDOM (a single "root" row for non-VDOM exports); the fields above are the global rollup.
+   vdoms: List[Dict[str, Any]] = field(default_factory=list)
+   # Rules only reachable through several earlier rules or a different-action superset (policy_matrix).
+   union_shadowed: List[Dict[str, Any]] = field(default_factory=list)
+   # Filled by traffic_logs.apply_hits(): zero-hit removal candidates and the log scan summary.
+   unused: List[Dict[str, Any]] = field(default_factory=list)
+   traffic: Dict[str, Any] = field(default_factory=dict)
+   # Direct and multi-hop interface/zone reachability over accept policies (reachability).
+   reachability: List[Dict[str, Any]] = field(default_factory=list)
+   # Proposed rule merges with their CLI; "removed" is the rule-count reduction per group.
+   consolidation: List[Dict[str, Any]] = field(default_factory=list)
+   # Partially overlapping accept/deny (Conflict) and accept/accept (Correlation) pairs (policy_overlap).
+   conflicts: List[Dict[str, Any]] = field(default_factory=list)
+   # Every supported benchmark pack side by side: {"packs": per-pack scores, "controls": status per pack}.
+   benchmark_comparison: Dict[str, Any] = field(default_factory=dict)
 # -------------------------
 # Scoring helpers
 # -------------------------
@@ -274,201 +596,140 @@ def compute_scores(cis: List[Dict[str, Any]]) -> Dict[str, Any]:
 def analyze_config(
    text: str,
    benchmark_family: str = "Auto (from firmware)",
-   benchmark_version: str = "Auto"
+   benchmark_version: str = "Auto",
+   max_workers: Optional[int] = None,
+   stages: Collection[str] = STAGES,
+   compare_packs: bool = False
 ) -> AnalysisResult:
-   sys_global = parse_kv_block(extract_block("config system global", text))
-   pwd_policy = parse_kv_block(extract_block("config system password-policy", text))
-   interfaces = parse_config_edit_block("config system interface", text)
-   snmp_users = parse_config_edit_block("config system snmp user", text)
-   ntp = parse_kv_block(extract_block("config system ntp", text))
-   syslog = parse_kv_block(extract_block("config log syslogd setting", text))
-   faz = parse_kv_block(extract_block("config log fortianalyzer setting", text))
-   central_mgmt = parse_kv_block(extract_block("config system central-management", text))
-   policies = parse_config_edit_block("config firewall policy", text)
-   hostname = sys_global.get("hostname", "").strip('"').strip() or "Unknown"
-   platform, fw_ver, fw_build = extract_firmware_info(text)
-   benchmark_meta = select_benchmark_pack(fw_ver, benchmark_family, benchmark_version)
-   # CIS subset controls (extend as needed)
-   cis: List[Dict[str, Any]] = []
-   def add(cid, cat, name, status, observed, expected, weight, remediation):
-       cis.append({
-           "control_id": cid, "category": cat, "control_name": name, "status": status,
-           "observed": observed, "expected": expected, "weight": weight, "remediation": remediation
-       })
-   add("CIS-1.1", "System Hardening", "Hostname configured",
-       "PASS" if hostname != "Unknown" else "FAIL", hostname, "Non-empty", 6, "")
-   add("CIS-1.2", "System Hardening", "Pre-login banner enabled",
-       "PASS" if sys_global.get("pre-login-banner") == "enable" else "FAIL",
-       sys_global.get("pre-login-banner",""), "enable", 6,
-       "config system global\n set pre-login-banner enable\nend")
-   add("CIS-1.3", "System Hardening", "CLI audit logging enabled",
-       "PASS" if sys_global.get("cli-audit-log") == "enable" else "FAIL",
-       sys_global.get("cli-audit-log",""), "enable", 7,
-       "config system global\n set cli-audit-log enable\nend")
-   add("CIS-2.1", "Password & Auth", "Password policy enabled",
-       "PASS" if pwd_policy.get("status") == "enable" else "FAIL",
-       pwd_policy.get("status",""), "enable", 9,
-       "config system password-policy\n set status enable\nend")
-   min_len = int(re.sub(r"\D","", pwd_policy.get("minimum-length","0")) or 0)
-   add("CIS-2.2", "Password & Auth", "Minimum password length >= 14",
-       "PASS" if min_len >= 14 else "FAIL", str(min_len), ">= 14", 10,
-       "config system password-policy\n set minimum-length 14\nend")
-   # NOTE: port3 is a demo assumption. If you want, we can auto-detect TRUST interface.
-   trust_allow = interfaces.get("port3", {}).get("allowaccess", "")
-   add("CIS-3.1", "Network", "No HTTPS/SSH management on TRUST interface",
-       "FAIL" if ("https" in trust_allow or "ssh" in trust_allow) else "PASS",
-       f"port3 allowaccess: {trust_allow}", "No https/ssh on TRUST", 8,
-       "config system interface\n edit port3\n  set allowaccess ping snmp\n next\nend")
-   add("CIS-4.1", "Logging & Time", "NTP configured",
-       "PASS" if ntp else "UNKNOWN", "present" if ntp else "not found", "Configured NTP servers", 6,
-       "config system ntp\n set status enable\nend")
-   add("CIS-4.2", "Logging & Time", "Syslog configured",
-       "PASS" if syslog.get("status") == "enable" else ("UNKNOWN" if not syslog else "FAIL"),
-       syslog.get("status", "not found"), "enable", 7,
-       "config log syslogd setting\n set status enable\n set server <IP>\nend")
-   add("CIS-4.3", "Logging & Time", "FortiAnalyzer logging enabled",
-       "PASS" if faz.get("status") == "enable" else ("UNKNOWN" if not faz else "FAIL"),
-       faz.get("status", "not found"), "enable", 7,
-       "config log fortianalyzer setting\n set status enable\n set server <IP>\nend")
-   snmp_ok = False
-   snmp_obs = ""
-   for u, ud in snmp_users.items():
-       snmp_obs = f"{u}: {ud.get('security-level','')} {ud.get('auth-proto','')} {ud.get('priv-proto','')}"
-       if ud.get("security-level") == "auth-priv" and ud.get("auth-proto") == "sha512" and ud.get("priv-proto") == "aes256":
-           snmp_ok = True
-           break
-   add("CIS-5.1", "Monitoring", "SNMP uses v3 auth-priv with strong crypto",
-       "PASS" if snmp_ok else ("UNKNOWN" if not snmp_users else "FAIL"),
-       snmp_obs if snmp_users else "not configured", "auth-priv + sha512 + aes256", 5,
-       "config system snmp user\n edit <user>\n  set security-level auth-priv\n  set auth-proto sha512\n  set priv-proto aes256\n next\nend")
-   add("CIS-6.1", "Governance", "Central management configured (FortiManager)",
-       "PASS" if central_mgmt.get("type") == "fortimanager" else ("UNKNOWN" if not central_mgmt else "FAIL"),
-       f"type={central_mgmt.get('type','')}, fmg={central_mgmt.get('fmg','')}", "fortimanager + fmg IP", 5,
-       "config system central-management\n set type fortimanager\n set fmg <IP>\nend")
-   # Policies raw
-   ordered_ids = sorted([int(k) for k in policies.keys() if str(k).isdigit()])
-   policies_raw: List[Dict[str, Any]] = []
-   for pid in ordered_ids:
-       p = policies[str(pid)]
-       policies_raw.append({
-           "policy_id": pid,
-           "name": p.get("name",""),
-           "status": p.get("status","enable"),
-           "srcintf": " ".join(norm_list_val(p.get("srcintf"))),
-           "dstintf": " ".join(norm_list_val(p.get("dstintf"))),
-           "srcaddr": " ".join(norm_list_val(p.get("srcaddr"))),
-           "dstaddr": " ".join(norm_list_val(p.get("dstaddr"))),
-           "service": " ".join(norm_list_val(p.get("service"))),
-           "action": p.get("action",""),
-           "schedule": p.get("schedule",""),
-           "logtraffic": p.get("logtraffic",""),
-           "utm_detected": "YES" if has_utm(p) else "NO",
+   """Parses only the sections `stages` read (stage_sections), then runs analyze_tree."""
+   tree = parse_config_tree(text, stage_sections(stages))
+   return analyze_tree(tree, benchmark_family, benchmark_version, max_workers, stages, compare_packs)
+def analyze_file(
+   path: str,
+   benchmark_family: str = "Auto (from firmware)",
+   benchmark_version: str = "Auto",
+   max_workers: Optional[int] = None,
+   stages: Collection[str] = STAGES,
+   compare_packs: bool = False
+) -> AnalysisResult:
+   """Analyzes a config export on disk through the memory-mapped ingestion path."""
+   tree = load_config_tree(path, stage_sections(stages))
+   return analyze_tree(tree, benchmark_family, benchmark_version, max_workers, stages, compare_packs)
+def analyze_tree(
+   tree: ConfigTree,
+   benchmark_family: str = "Auto (from firmware)",
+   benchmark_version: str = "Auto",
+   max_workers: Optional[int] = None,
+   stages: Collection[str] = STAGES,
+   compare_packs: bool = False,
+   on_step: Optional[Callable[[str], None]] = None
+) -> AnalysisResult:
+   """
+   Runs the analyzers of `stages` against an already parsed config tree.
+   Firmware details come from the export's `#...` header lines; CIS controls
+   read the global scope and policy analytics run per VDOM (see analyze_vdoms).
+   Fields of a stage that is not run stay empty, as does benchmark_comparison
+   unless `compare_packs` is set. `on_step(step)` is called as each of
+   ANALYSIS_STEPS finishes, skipped stages included (batch_scan times them).
+   """
+   step = on_step or (lambda name: None)
+   hygiene = rollup_hygiene(analyze_vdoms(tree, max_workers) if STAGE_HYGIENE in stages else {})
+   step("hygiene")
+   scope = tree.global_scope()
+   cis, comparison = evaluate_benchmarks(tree, benchmark_family, benchmark_version, compare_packs) if STAGE_CIS in stages else ([], {})
+   step("cis")
+   result = assemble_result(scope, cis, hygiene, benchmark_family, benchmark_version, comparison)
+   step("report")
+   return result
+def pack_label(pack: BenchmarkPack) -> str:
+   return f"{pack.family} {pack.pack_version}"
+def benchmark_sections() -> Tuple[str, ...]:
+   """Every section a supported pack's controls declare (ControlDef.sections), in pack order."""
+   out: Dict[str, None] = {}
+   for pack in load_supported_packs().values():
+       out.update(dict.fromkeys(pack.sections))
+   return tuple(out)
+def stage_sections(stages: Collection[str] = STAGES) -> Tuple[str, ...]:
+   """
+   Sections a run of `stages` reads, for the `sections` filter of
+   parse_config_tree/load_config_tree: a CIS-only run leaves the policy and
+   object tables unparsed, a hygiene-only run the system sections.
+   """
+   unknown = set(stages) - set(STAGES)
+   if unknown:
+       raise ValueError(f"unknown analysis stage(s): {', '.join(sorted(unknown))}; expected {', '.join(STAGES)}")
+   out = dict.fromkeys(META_SECTIONS)
+   if STAGE_CIS in stages:
+       out.update(dict.fromkeys(benchmark_sections()))
+   if STAGE_HYGIENE in stages:
+       out.update(dict.fromkeys(POLICY_SECTIONS))
+   return tuple(out)
+def evaluate_benchmarks(
+   tree: ConfigTree,
+   benchmark_family: str = "Auto (from firmware)",
+   benchmark_version: str = "Auto",
+   compare_packs: bool = False
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+   """
+   (CIS rows of the selected pack, benchmark_comparison) from one rule context
+   over the whole `tree` (see control_engine.rule_context).
+   The pack is chosen from the export's firmware unless given; its controls
+   read only the sections they declare (pack.sections). Only the selected pack
+   is evaluated and the comparison is {} unless `compare_packs`: then every
+   supported pack runs, a rule several packs share once.
+   """
+   selected = select_benchmark_pack(extract_firmware_info(firmware_text(tree.global_scope()))[1], benchmark_family, benchmark_version)
+   if not compare_packs:
+       return evaluate_pack(selected.pack, rule_context(tree)), {}
+   packs = load_supported_packs()
+   selected_key = selected.key
+   by_pack, _ = evaluate_packs(packs, rule_context(tree))
+   summary = []
+   for key, pack in packs.items():
+       rows = by_pack[key]
+       statuses = [str(r["status"]).upper() for r in rows]
+       summary.append({
+           "pack": pack_label(pack), "pack_name": pack.pack_name, "selected": key == selected_key,
+           **compute_scores(rows),
+           "pass": statuses.count("PASS"), "fail": statuses.count("FAIL"),
+           "unknown": len(statuses) - statuses.count("PASS") - statuses.count("FAIL"),
        })
-   # Permissive rules
-   permissive: List[Dict[str, Any]] = []
-   for pid in ordered_ids:
-       p = policies[str(pid)]
-       score, sev, reasons = permissive_score(p)
-       if score >= 5:
-           permissive.append({
-               "policy_id": pid, "name": p.get("name",""),
-               "srcintf": " ".join(norm_list_val(p.get("srcintf"))),
-               "dstintf": " ".join(norm_list_val(p.get("dstintf"))),
-               "srcaddr": " ".join(norm_list_val(p.get("srcaddr"))),
-               "dstaddr": " ".join(norm_list_val(p.get("dstaddr"))),
-               "service": " ".join(norm_list_val(p.get("service"))),
-               "action": p.get("action",""),
-               "logtraffic": p.get("logtraffic",""),
-               "utm_detected": "YES" if has_utm(p) else "NO",
-               "risk_score": score, "severity": sev, "reasons": reasons
-           })
-   permissive.sort(key=lambda x: (-x["risk_score"], x["policy_id"]))
-   # Duplicates
-   sig_map = defaultdict(list)
-   for pid in ordered_ids:
-       sig_map[policy_signature(policies[str(pid)])].append(pid)
-   duplicates: List[Dict[str, Any]] = []
-   for sig, ids in sig_map.items():
-       if len(ids) > 1:
-           base = ids[0]
-           for other in ids[1:]:
-               duplicates.append({"policy_id": other, "duplicate_of": base, "criteria": "Exact signature match"})
-   duplicates.sort(key=lambda x: x["policy_id"])
-   # Shadowed / redundant (conservative)
-   shadowed: List[Dict[str, Any]] = []
-   redundant: List[Dict[str, Any]] = []
-   for idx, pid in enumerate(ordered_ids):
-       curr = policies[str(pid)]
-       for prev_id in ordered_ids[:idx]:
-           prev = policies[str(prev_id)]
-           if covers(prev, curr):
-               shadowed.append({"policy_id": pid, "shadowed_by": prev_id, "reason": "Superset/equal match above (conservative)"})
-               break
-   for idx, pid in enumerate(ordered_ids):
-       curr = policies[str(pid)]
-       if curr.get("action","").lower() != "accept":
-           continue
-       for prev_id in ordered_ids[:idx]:
-           prev = policies[str(prev_id)]
-           if prev.get("action","").lower() != "accept":
-               continue
-           if covers(prev, curr):
-               redundant.append({"policy_id": pid, "covered_by": prev_id, "reason": "Covered by broader/equal allow (conservative)"})
-               break
-   # Segmentation matrix
-   matrix = defaultdict(int)
-   for pid in ordered_ids:
-       p = policies[str(pid)]
-       if p.get("action","").lower() != "accept":
-           continue
-       for s in norm_list_val(p.get("srcintf")):
-           for d in norm_list_val(p.get("dstintf")):
-               matrix[(s, d)] += 1
-   segmentation: List[Dict[str, Any]] = []
-   for (s, d), count in sorted(matrix.items(), key=lambda x: (-x[1], x[0][0], x[0][1])):
-       indicator = "Review"
-       if s == d:
-           indicator = "Hairpin / Same-Zone"
-       if "untrust" in d.lower():
-           indicator = "Internet-Bound Traffic"
-       if "trust" in s.lower() and "trust" in d.lower():
-           indicator = "Internal East-West Exposure"
-       segmentation.append({"srcintf": s, "dstintf": d, "policy_count": count, "indicator": indicator})
-   # UTM coverage on internet-bound
-   internet_policies = 0
-   utm_attached = 0
-   for pid in ordered_ids:
-       p = policies[str(pid)]
-       dstintf = norm_list_val(p.get("dstintf"))
-       if any("untrust" in x.lower() for x in dstintf):
-           internet_policies += 1
-           if has_utm(p):
-               utm_attached += 1
-   coverage_pct = (utm_attached / internet_policies * 100.0) if internet_policies else 0.0
+   controls: Dict[str, Dict[str, Any]] = {}
+   for key, pack in packs.items():
+       for r in by_pack[key]:
+           row = controls.setdefault(r["control_id"], {"control_id": r["control_id"], "category": r["category"], "control_name": r["control_name"]})
+           row[pack_label(pack)] = r["status"]
+   labels = [pack_label(pack) for pack in packs.values()]
+   matrix = [{**row, **{label: row.get(label, "N/A") for label in labels}} for row in controls.values()]
+   return by_pack[selected_key], {"packs": summary, "controls": matrix}
+def assemble_result(
+   tree: ConfigTree,
+   cis: List[Dict[str, Any]],
+   hygiene: Dict[str, Any],
+   benchmark_family: str = "Auto (from firmware)",
+   benchmark_version: str = "Auto",
+   benchmark_comparison: Optional[Dict[str, Any]] = None
+) -> AnalysisResult:
+   """
+   Adds firmware, benchmark, lifecycle and score details to CIS results and the
+   rolled-up policy hygiene (see rollup_hygiene). `tree` is the global scope.
+   """
+   platform, fw_ver, fw_build = extract_firmware_info(firmware_text(tree))
+   selected = select_benchmark_pack(fw_ver, benchmark_family, benchmark_version)
    lifecycle_assessment = derive_lifecycle_assessment(platform, fw_ver, fw_build)
    scores = compute_scores(cis)
    meta = {
-       "hostname": hostname,
+       "hostname": config_hostname(tree),
        "platform": platform,
        "firmware_version": fw_ver,
        "firmware_build": fw_build,
    }
    return AnalysisResult(
        meta=meta,
-       benchmark_meta=benchmark_meta,
+       benchmark_meta=benchmark_meta(selected),
        scores=scores,
        cis=cis,
-       policies_raw=policies_raw,
-       permissive=permissive,
-       duplicates=duplicates,
-       shadowed=shadowed,
-       redundant=redundant,
-       segmentation=segmentation,
-       sec_profile_coverage={
-           "total_policies": len(ordered_ids),
-           "internet_bound_policies": internet_policies,
-           "internet_with_utm": utm_attached,
-           "utm_coverage_pct": round(coverage_pct, 2),
-       },
-       lifecycle_assessment=lifecycle_assessment
+       lifecycle_assessment=lifecycle_assessment,
+       benchmark_comparison=benchmark_comparison or {},
+       **hygiene
    )
@@ -1,6 +1,10 @@
 import streamlit as st
 import pandas as pd
-from analyzer import analyze_config
+from analysis_cache import AnalysisCache, content_hash
+from analyzer import permissive_view, stage_sections
+from config_tree import ConfigTree, parse_config_tree
+from policy_lookup import PolicyLookup
+from traffic_logs import PolicyHits, apply_hits, open_log, scan_stream
 from report_generator import build_excel_report
 # -----------------------------------
 # Page Config
@@ -211,6 +215,10 @@ with st.sidebar:
    elif pack == "FortiOS 7.4.x":
        pack_ver = st.selectbox("Version", ["v1.0.1", "v1.0.0"], index=0)
    st.markdown("---")
+   st.markdown("### Traffic Logs (optional)")
+   st.caption("FortiGate traffic logs (key=value, plain or .gz) add hit counts and flag unused rules.")
+   log_files = st.file_uploader("Traffic logs", type=["log","txt","gz"], accept_multiple_files=True)
+   st.markdown("---")
    st.markdown("### Output")
    st.caption("After analysis, download the executive Excel report from the Export tab.")
 if not uploaded:
@@ -252,13 +260,46 @@ st.markdown('<div class="hr"></div>', unsafe_allow_html=True)
 # -----------------------------------
 # Analyze
 # -----------------------------------
-raw_text = uploaded.read().decode("utf-8", errors="ignore")
+@st.cache_resource
+def get_analysis_cache() -> AnalysisCache:
+   # One cache per server process, shared by all sessions; reruns with the same upload and pack hit it.
+   return AnalysisCache(max_entries=16)
+@st.cache_resource(max_entries=2)
+def get_config_tree(digest: str, _data: memoryview) -> ConfigTree:
+   # Parsed in place, once per upload: an analysis cache miss and the Policy Lookup tab share it.
+   return parse_config_tree(_data, stage_sections())
+@st.cache_resource(max_entries=8)
+def get_policy_lookup(digest: str, vdom: str, _tree: ConfigTree) -> PolicyLookup:
+   # Keyed by content hash; the compiled rulebase is reused across reruns and sessions.
+   return PolicyLookup.from_tree(_tree, vdom)
+analysis_cache = get_analysis_cache()
+upload = uploaded.getbuffer()
+upload_digest = content_hash(upload)
 with st.spinner("Analyzing configuration…"):
-   result = analyze_config(
-       raw_text,
+   result = analysis_cache.analyze(
+       upload,
        benchmark_family=pack,
-       benchmark_version=pack_ver
+       benchmark_version=pack_ver,
+       # The CIS tab shows every supported pack side by side.
+       compare_packs=True,
+       load_tree=lambda: get_config_tree(upload_digest, upload)
    )
+def get_log_hits(files) -> PolicyHits:
+   # Per session and keyed by the uploads' content hashes: reruns reuse the replay, other sessions never see it.
+   key = tuple(content_hash(f.getbuffer()) for f in files)
+   cached = st.session_state.get("log_hits")
+   if cached is None or cached[0] != key:
+       hits = PolicyHits()
+       for f in files:
+           f.seek(0)
+           hits.merge(scan_stream(open_log(f)))
+       cached = st.session_state["log_hits"] = (key, hits)
+   return cached[1]
+if log_files:
+   with st.spinner("Replaying traffic logs…"):
+       result = apply_hits(result, get_log_hits(log_files))
+cache_stats = analysis_cache.stats
+st.sidebar.caption(f"Analysis cache: {cache_stats['hits']} hits • {cache_stats['misses']} misses • {cache_stats['entries']}/{cache_stats['max_entries']} entries")
 meta = result.meta or {}
 hostname = meta.get("hostname", "Unknown")
 platform = meta.get("platform", "Unknown")
@@ -269,7 +310,7 @@ bench = getattr(result, "benchmark_meta", {}) or {}
 scores = getattr(result, "scores", {}) or {}
 cis_df = pd.DataFrame(result.cis or [])
 if cis_df.empty:
-   cis_df = pd.DataFrame(columns=["control_id","category","control_name","status","observed","expected","weight","remediation"])
+   cis_df = pd.DataFrame(columns=["control_id","category","control_name","status","observed","expected","weight","remediation","level","why_failed"])
 # KPI computation
 status_upper = cis_df["status"].astype(str).str.upper()
 pass_count = int((status_upper == "PASS").sum())
@@ -361,8 +402,8 @@ st.markdown('<div class="hr"></div>', unsafe_allow_html=True)
 # -----------------------------------
 # Tabs
 # -----------------------------------
-tab_exec, tab_cis, tab_fail, tab_hyg, tab_seg, tab_life, tab_export = st.tabs(
-   ["Executive", "CIS Scorecard", "Failures & Why", "Policy Hygiene", "Segmentation", "Lifecycle", "Export"]
+tab_exec, tab_cis, tab_fail, tab_hyg, tab_seg, tab_lookup, tab_life, tab_export = st.tabs(
+   ["Executive", "CIS Scorecard", "Failures & Why", "Policy Hygiene", "Segmentation", "Policy Lookup", "Lifecycle", "Export"]
 )
 with tab_exec:
    st.markdown("### Executive Snapshot")
@@ -383,6 +424,12 @@ with tab_cis:
    st.markdown("### CIS Scorecard")
    st.caption("Subset of verifiable controls from configuration export.")
    st.dataframe(cis_df, use_container_width=True, hide_index=True)
+   comparison = getattr(result, "benchmark_comparison", {}) or {}
+   if comparison.get("controls"):
+       st.markdown("#### Benchmark Comparison")
+       st.caption("Every supported pack version evaluated against this config in the same pass.")
+       st.dataframe(pd.DataFrame(comparison["packs"]), use_container_width=True, hide_index=True)
+       st.dataframe(pd.DataFrame(comparison["controls"]), use_container_width=True, hide_index=True)
 with tab_fail:
    st.markdown("### Failures & Why")
    st.caption("Observed vs Expected + remediation CLI.")
@@ -390,12 +437,15 @@ with tab_fail:
    if fail_df.empty:
        st.success("No FAIL controls in the evaluated CIS subset.")
    else:
-       show_cols = ["control_id","category","control_name","observed","expected","remediation"]
+       show_cols = ["control_id","category","control_name","observed","expected","why_failed","remediation"]
        st.dataframe(fail_df[show_cols], use_container_width=True, hide_index=True)
 with tab_hyg:
    st.markdown("### Policy Hygiene")
+   if len(result.vdoms or []) > 1:
+       st.markdown("#### Per-VDOM Breakdown")
+       st.dataframe(pd.DataFrame(result.vdoms), use_container_width=True, hide_index=True)
    st.markdown("#### Permissive Rules (MEDIUM+)")
-   st.dataframe(pd.DataFrame(result.permissive or []), use_container_width=True, hide_index=True)
+   st.dataframe(pd.DataFrame(permissive_view(result)), use_container_width=True, hide_index=True)
    c1, c2 = st.columns(2, gap="large")
    with c1:
        st.markdown("#### Duplicate Rules")
@@ -405,13 +455,64 @@ with tab_hyg:
        st.dataframe(pd.DataFrame(result.shadowed or []), use_container_width=True, hide_index=True)
    st.markdown("#### Redundant Rules")
    st.dataframe(pd.DataFrame(result.redundant or []), use_container_width=True, hide_index=True)
-   st.caption("Note: Shadowed/Redundant is conservative for MVP (ALL/exact). For precision, expand object groups.")
+   st.markdown("#### Union-Shadowed Rules")
+   st.caption("Rules no single earlier rule covers, but that several earlier rules together match entirely.")
+   st.dataframe(pd.DataFrame(result.union_shadowed or []), use_container_width=True, hide_index=True)
+   st.markdown("#### Conflicts & Correlations")
+   st.caption("Rules that partially overlap an earlier rule: accept vs deny (Conflict) or two accepts (Correlation). "
+              "Full covers are listed under Shadowed/Union-Shadowed.")
+   st.dataframe(pd.DataFrame(result.conflicts or []), use_container_width=True, hide_index=True)
+   st.markdown("#### Consolidation Candidates")
+   removable = sum(g["removed"] for g in result.consolidation or [])
+   st.caption(f"Rules with identical settings that differ only in source, destination or service and can be merged in place: "
+              f"{removable:,} fewer rules to evaluate.")
+   st.dataframe(pd.DataFrame(result.consolidation or []), use_container_width=True, hide_index=True)
+   st.caption("Note: Shadowed/Redundant compare address and service objects and groups as expanded IP and port ranges.")
+   if result.traffic:
+       st.markdown("#### Unused Rules (removal candidates)")
+       t = result.traffic
+       st.caption(f"{t['traffic_lines']:,} logged sessions from {t['files']} file(s), {t['first_seen'] or '?'} .. {t['last_seen'] or '?'}. "
+                  "Only enabled rules with `logtraffic all` in logged VDOMs are flagged.")
+       st.dataframe(pd.DataFrame(result.unused or []), use_container_width=True, hide_index=True)
 with tab_seg:
    st.markdown("### Segmentation")
    st.caption("Interface-to-interface allow matrix and indicators.")
    st.dataframe(pd.DataFrame(result.segmentation or []), use_container_width=True, hide_index=True)
+   st.markdown("#### Zone Reachability")
+   st.caption("Interfaces/zones each one can reach through enabled accept policies, including multi-hop paths through intermediate zones. "
+              "Pivot Allowed: each hop's destinations overlap the next hop's sources.")
+   st.dataframe(pd.DataFrame(result.reachability or []), use_container_width=True, hide_index=True)
    st.markdown("#### Security Profile Coverage")
    st.json(result.sec_profile_coverage or {})
+with tab_lookup:
+   st.markdown("### Policy Lookup")
+   st.caption("First policy a flow would match, with expanded address and service objects. Leave an interface blank to match any.")
+   vdom_names = [v["vdom"] for v in result.vdoms or []] or ["root"]
+   with st.form("policy_lookup"):
+       l1, l2, l3 = st.columns(3, gap="large")
+       lookup_vdom = l1.selectbox("VDOM", vdom_names)
+       lookup_sif = l2.text_input("Source interface", "")
+       lookup_dif = l3.text_input("Destination interface", "")
+       l4, l5, l6, l7 = st.columns(4, gap="large")
+       lookup_src = l4.text_input("Source IP", "10.0.0.10")
+       lookup_dst = l5.text_input("Destination IP", "10.0.1.10")
+       lookup_proto = l6.selectbox("Protocol", ["tcp", "udp", "icmp", "sctp"])
+       lookup_port = l7.number_input("Port (ICMP: type*256+code)", min_value=0, max_value=65535, value=443)
+       submitted = st.form_submit_button("Look up")
+   if submitted:
+       engine = get_policy_lookup(upload_digest, lookup_vdom, get_config_tree(upload_digest, upload))
+       flow = (lookup_sif or None, lookup_dif or None, lookup_src, lookup_dst, lookup_proto, int(lookup_port))
+       try:
+           matches = engine.matching(*flow)
+       except (OSError, ValueError):
+           st.error("Enter IPv4 addresses such as 10.0.0.10.")
+       else:
+           if matches:
+               st.success(f"First match: policy {matches[0]}")
+               if len(matches) > 1:
+                   st.caption("Also matched (never reached for this flow): " + ", ".join(map(str, matches[1:50])))
+           else:
+               st.warning("No policy matches: implicit deny.")
 with tab_life:
    st.markdown("### Lifecycle Risk")
    st.caption("Offline lifecycle posture. Replace with vendor lifecycle + PSIRT feeds when permitted.")
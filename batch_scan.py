@@ -0,0 +1,281 @@
+# batch_scan.py
+"""
+Headless fleet analysis. Every config found under the given files, directories
+and glob patterns is analyzed in a process pool and written to a JSONL file as
+one line per device, in completion order; a summary (devices per second,
+per-stage timing) is printed and written next to it.
+   python batch_scan.py /exports/fgt --out fleet.jsonl
+   python batch_scan.py "/exports/**/*.conf" --stages cis --workers 16
+Memory stays flat whatever the fleet size: inputs are enumerated lazily,
+workers receive paths and return a compact device record (device_record)
+rather than the AnalysisResult, and at most `max_in_flight` files are queued
+or being analyzed at any time; the next file is submitted as one completes.
+Runs are resumable: every record carries the config's cache_key (content
+sha256 + benchmark selection + ANALYZER_VERSION + loaded pack contents) and
+its stages, and inputs whose key already has an "ok" line for the same stages
+in the output are skipped, as are byte-identical copies within a run. Failed
+devices are retried on the next run. Keys are computed before submission by
+HASH_THREADS threads of the submitting process, which read and hash ahead of
+the files in flight; that time is reported apart from the workers' steps.
+"""
+from __future__ import annotations
+import argparse
+import fnmatch
+import glob
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import IO, Any, Deque, Dict, Iterable, Iterator, Optional, Sequence, Set, Tuple
+from analysis_cache import cache_key, file_hash
+from analyzer import ANALYSIS_STEPS, ANALYZER_VERSION, HYGIENE_LISTS, STAGES, AnalysisResult, analyze_tree, stage_sections
+from config_tree import load_config_tree
+# File names a directory argument expands to.
+CONFIG_PATTERNS = ("*.conf", "*.cfg")
+# Timed steps of one device in its worker, in run order.
+STEPS = ("parse",) + ANALYSIS_STEPS
+# Threads hashing inputs in the submitting process (hashlib releases the GIL on large reads).
+HASH_THREADS = 4
+# -------------------------
+# Inputs
+# -------------------------
+def iter_configs(targets: Iterable[str], patterns: Sequence[str] = CONFIG_PATTERNS) -> Iterator[str]:
+   """
+   Config paths for files, directories (walked recursively, names matching
+   `patterns`) and glob patterns ("**" recurses), each in sorted order.
+   Other paths are passed through, so they are reported as unreadable.
+   """
+   for target in targets:
+       if os.path.isfile(target):
+           yield target
+       elif os.path.isdir(target):
+           for root, dirs, files in os.walk(target):
+               dirs.sort()
+               for name in sorted(files):
+                   if any(fnmatch.fnmatch(name, p) for p in patterns):
+                       yield os.path.join(root, name)
+       elif not glob.has_magic(target):
+           yield target
+       else:
+           for path in sorted(glob.iglob(target, recursive=True)):
+               if os.path.isfile(path):
+                   yield path
+def completed_keys(path: str, stages: Sequence[str] = STAGES) -> Set[str]:
+   """cache_key of every "ok" record of `stages` in an existing output file."""
+   done: Set[str] = set()
+   if not os.path.exists(path):
+       return done
+   with open(path, encoding="utf-8") as f:
+       for line in f:
+           try:
+               rec = json.loads(line)
+           except ValueError:
+               # A line cut short by an interrupted run; that device is analyzed again.
+               continue
+           if rec.get("status") == "ok" and set(rec.get("stages", ())) == set(stages):
+               done.add(rec["key"])
+   return done
+def hash_config(path: str) -> Tuple[int, str, float]:
+   """(size, sha256, seconds) of one input; OSError when it cannot be read."""
+   t0 = time.perf_counter()
+   size = os.path.getsize(path)
+   digest = file_hash(path)
+   return size, digest, time.perf_counter() - t0
+def iter_hashed(paths: Iterable[str], pool: ThreadPoolExecutor, ahead: int) -> Iterator[Tuple[str, Future]]:
+   """(path, hash_config future) in input order, with at most `ahead` paths read ahead."""
+   queue: Deque[Tuple[str, Future]] = deque()
+   for path in paths:
+       queue.append((path, pool.submit(hash_config, path)))
+       if len(queue) > ahead:
+           yield queue.popleft()
+   while queue:
+       yield queue.popleft()
+# -------------------------
+# Worker
+# -------------------------
+def device_record(result: AnalysisResult) -> Dict[str, Any]:
+   """The JSONL fields of one analyzed device: identity, scores, failing controls and finding counts."""
+   statuses = [(c["control_id"], str(c["status"]).upper()) for c in result.cis]
+   return {
+       **result.meta,
+       "pack_id": result.benchmark_meta["pack_id"],
+       "selection": result.benchmark_meta["selection"],
+       **result.scores,
+       "cis_fail": [cid for cid, st in statuses if st == "FAIL"],
+       "cis_unknown": [cid for cid, st in statuses if st not in ("PASS", "FAIL")],
+       "firmware_status": result.lifecycle_assessment["firmware_status"],
+       "vdoms": len(result.vdoms),
+       "policies": result.sec_profile_coverage["total_policies"],
+       "utm_coverage_pct": result.sec_profile_coverage["utm_coverage_pct"],
+       "findings": {name: len(getattr(result, name)) for name in HYGIENE_LISTS if name != "policies_raw"},
+   }
+def scan_device(job: Tuple[str, str, str, Tuple[str, ...]]) -> Dict[str, Any]:
+   """
+   analyze_file() for one config, timed per step through analyze_tree's
+   on_step hook, with VDOMs analyzed in this worker. Errors become an "error" record.
+   """
+   path, benchmark_family, benchmark_version, stages = job
+   timings: Dict[str, float] = {}
+   last = time.perf_counter()
+   def mark(step: str) -> None:
+       nonlocal last
+       now = time.perf_counter()
+       timings[step] = round(now - last, 4)
+       last = now
+   try:
+       tree = load_config_tree(path, stage_sections(stages))
+       mark("parse")
+       record = device_record(analyze_tree(tree, benchmark_family, benchmark_version, max_workers=1, stages=stages, on_step=mark))
+   except Exception as e:
+       return {"status": "error", "error": f"{type(e).__name__}: {e}"}
+   return {"status": "ok", **record, "timings": timings}
+# -------------------------
+# Scan
+# -------------------------
+def scan_fleet(
+   paths: Iterable[str],
+   out: IO[str],
+   benchmark_family: str = "Auto (from firmware)",
+   benchmark_version: str = "Auto",
+   stages: Sequence[str] = STAGES,
+   workers: Optional[int] = None,
+   max_in_flight: Optional[int] = None,
+   done: Optional[Set[str]] = None,
+   progress: Optional[IO[str]] = None,
+   progress_every: int = 100,
+) -> Dict[str, Any]:
+   """
+   Analyzes `paths` in a process pool, writing one JSON line per device to
+   `out` as results complete, and returns the run summary. Keys in `done`
+   (completed_keys of an earlier run) are skipped.
+   """
+   # Rejects unknown stages before any file is submitted.
+   stage_sections(stages)
+   stages = tuple(s for s in STAGES if s in stages)
+   workers = max(1, workers or os.cpu_count() or 1)
+   max_in_flight = max(workers, max_in_flight or 2 * workers)
+   done = set(done or ())
+   first_path: Dict[str, str] = {}
+   counts = {"ok": 0, "error": 0, "skipped": 0, "duplicate": 0}
+   totals = dict.fromkeys(STEPS, 0.0)
+   hash_seconds = 0.0
+   scores = []
+   analyzed_bytes = 0
+   started = time.perf_counter()
+   def emit(rec: Dict[str, Any]) -> None:
+       counts[rec["status"]] += 1
+       out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+       out.flush()
+       written = counts["ok"] + counts["error"]
+       if progress is not None and rec["status"] in ("ok", "error") and not written % progress_every:
+           rate = written / (time.perf_counter() - started)
+           progress.write(f"{written:,} devices  {rate:,.1f}/s  ({counts['error']:,} failed)\n")
+   def collect(fut: Future, path: str, key: str, digest: str, size: int) -> None:
+       nonlocal analyzed_bytes
+       try:
+           res = fut.result()
+       except Exception as e:
+           # The worker died (e.g. out of memory) rather than raising.
+           res = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+       rec = {"path": path, "key": key, "content_hash": digest, "analyzer_version": ANALYZER_VERSION,
+              "stages": list(stages), "bytes": size, **res}
+       if res["status"] == "ok":
+           for step, seconds in res["timings"].items():
+               totals[step] += seconds
+           scores.append(res["compliance_score"])
+           analyzed_bytes += size
+       emit(rec)
+   pending: Dict[Future, Tuple[str, str, str, int]] = {}
+   def drain(return_when: str) -> None:
+       finished, _ = wait(pending, return_when=return_when)
+       for fut in finished:
+           collect(fut, *pending.pop(fut))
+   with ProcessPoolExecutor(max_workers=workers) as pool, ThreadPoolExecutor(max_workers=HASH_THREADS) as hashers:
+       try:
+           for path, hashing in iter_hashed(paths, hashers, max_in_flight):
+               try:
+                   size, digest, hashed = hashing.result()
+               except OSError as e:
+                   emit({"path": path, "status": "error", "error": f"{type(e).__name__}: {e}"})
+                   continue
+               hash_seconds += hashed
+               key = cache_key(digest, benchmark_family, benchmark_version)
+               if key in done:
+                   counts["skipped"] += 1
+                   continue
+               if key in first_path:
+                   emit({"path": path, "key": key, "content_hash": digest, "status": "duplicate", "duplicate_of": first_path[key]})
+                   continue
+               first_path[key] = path
+               while len(pending) >= max_in_flight:
+                   drain(FIRST_COMPLETED)
+               fut = pool.submit(scan_device, (path, benchmark_family, benchmark_version, stages))
+               pending[fut] = (path, key, digest, size)
+           while pending:
+               drain(FIRST_COMPLETED)
+       except KeyboardInterrupt:
+           # Written lines are complete records; a rerun resumes from them.
+           pool.shutdown(wait=False, cancel_futures=True)
+           hashers.shutdown(wait=False, cancel_futures=True)
+           raise
+   elapsed = time.perf_counter() - started
+   analyzed = counts["ok"]
+   return {
+       "devices": sum(counts.values()),
+       "analyzed": analyzed,
+       "failed": counts["error"],
+       "skipped": counts["skipped"],
+       "duplicates": counts["duplicate"],
+       "stages": list(stages),
+       "workers": workers,
+       "elapsed_s": round(elapsed, 3),
+       "devices_per_s": round(analyzed / elapsed, 2) if elapsed else 0.0,
+       "mb_per_s": round(analyzed_bytes / 1e6 / elapsed, 2) if elapsed else 0.0,
+       # Summed over workers: each step's share of the CPU time spent per device.
+       "step_seconds": {step: round(totals[step], 3) for step in STEPS},
+       "step_ms_per_device": {step: round(1000 * totals[step] / analyzed, 2) if analyzed else 0.0 for step in STEPS},
+       # Summed over the hash threads of this process, for every readable input (skipped ones included).
+       "hash_seconds": round(hash_seconds, 3),
+       "compliance_score_mean": round(sum(scores) / len(scores), 2) if scores else 0.0,
+   }
+def format_summary(summary: Dict[str, Any]) -> str:
+   lines = [
+       f"{summary['analyzed']:,} analyzed, {summary['skipped']:,} already done, {summary['duplicates']:,} duplicates, "
+       f"{summary['failed']:,} failed in {summary['elapsed_s']:,.1f} s",
+       f"{summary['devices_per_s']:,.2f} devices/s, {summary['mb_per_s']:,.1f} MB/s ({summary['workers']} worker processes)",
+   ]
+   for step in STEPS:
+       lines.append(f"  {step:<8}{summary['step_ms_per_device'][step]:>12,.1f} ms/device")
+   lines.append(f"  hash    {1000 * summary['hash_seconds']:>12,.1f} ms in total, in this process ({HASH_THREADS} threads)")
+   return "\n".join(lines)
+def main(argv: Optional[Sequence[str]] = None) -> int:
+   ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+   ap.add_argument("targets", nargs="+", help="config files, directories or glob patterns")
+   ap.add_argument("--out", default="fleet_scan.jsonl", help="JSONL output, appended to (default: %(default)s)")
+   ap.add_argument("--summary", help="summary JSON path (default: <out>.summary.json)")
+   ap.add_argument("--pattern", nargs="+", default=list(CONFIG_PATTERNS), help="file names taken from directories")
+   ap.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+   ap.add_argument("--benchmark-family", default="Auto (from firmware)")
+   ap.add_argument("--benchmark-version", default="Auto")
+   ap.add_argument("--workers", type=int, default=os.cpu_count())
+   ap.add_argument("--max-in-flight", type=int, help="files queued or in analysis at once (default: 2 x workers)")
+   ap.add_argument("--no-resume", action="store_true", help="truncate --out instead of skipping devices it already holds")
+   ap.add_argument("--progress", type=int, default=100, help="print throughput every N devices")
+   args = ap.parse_args(argv)
+   if args.no_resume and os.path.exists(args.out):
+       os.remove(args.out)
+   done = completed_keys(args.out, args.stages)
+   paths = iter_configs(args.targets, args.pattern)
+   with open(args.out, "a", encoding="utf-8") as out:
+       summary = scan_fleet(
+           paths, out, args.benchmark_family, args.benchmark_version, args.stages,
+           args.workers, args.max_in_flight, done, sys.stderr, max(1, args.progress),
+       )
+   with open(args.summary or f"{args.out}.summary.json", "w", encoding="utf-8") as f:
+       json.dump(summary, f, indent=2)
+   print(format_summary(summary))
+   return 1 if summary["failed"] else 0
+if __name__ == "__main__":
+   sys.exit(main())
@@ -1,10 +1,71 @@
 # benchmark_loader.py
+"""
+Benchmark packs. A pack is a TOML (or JSON) file in benchmark_packs/: pack
+metadata plus one table per control. A control is either declarative, a
+setting of a config section and a comparator:
+   [[controls]]
+   id = "CIS-2.2"  ...  section = "system password-policy"
+   key = "minimum-length"  op = ">="  value = 14
+or names a function of the rule registry (benchmark_packs.rules) for checks
+a comparator cannot express (`rule = "snmp_strong"`). Loading compiles every
+declarative control to a Predicate, so a pack evaluates as one flat
+(control, callable) table over the context control_engine builds once.
+Every ControlDef declares the config sections it depends on: a Predicate's
+section, or the sections behind the context keys its registry rule reads
+(CONTEXT_KEYS), so callers parse only what the controls they run look at.
+Compiled packs are cached as plain JSON data in PACK_CACHE_DIR, a per-user
+directory that is only used while it is owned by this user and closed to
+others. Entries are keyed by the sha256 of the pack file, PACK_FORMAT and the
+rule registry's declared context keys, so editing benchmark_packs/rules.py
+also invalidates them.
+Packs are immutable and loaded at most once per process into a registry
+(get_pack), so threads and Streamlit sessions share them; which pack a run
+uses and how it was chosen is a separate PackSelection (load_pack).
+"""
 from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+import stat
+import tempfile
+import threading
 from dataclasses import dataclass
-from typing import Dict, Callable, Any, List, Optional
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Callable, Any, List, Mapping, Optional, Tuple
+try:
+   import tomllib
+except ModuleNotFoundError:  # Python < 3.11
+   import tomli as tomllib
+from interface_roles import ROLE_SECTIONS
 # A control is evaluated by a rule function: rule(ctx) -> dict
-RuleFn = Callable[[Dict[str, Any]], Dict[str, Any]]
-@dataclass
+RuleFn = Callable[[Mapping[str, Any]], Dict[str, Any]]
+# Context keys a rule may read -> the config sections each is built from (see control_engine.RuleContext).
+CONTEXT_KEYS: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+   "meta": ("system global",),
+   "sys_global": ("system global",),
+   "pwd_policy": ("system password-policy",),
+   "interfaces": ("system interface",),
+   # Per VDOM: {vdom: ...}, with one "root" entry for exports without VDOMs.
+   "zones": ("system zone",),
+   "routes": ("router static",),
+   "roles": ROLE_SECTIONS,
+   "snmp_users": ("system snmp user",),
+   "ntp": ("system ntp",),
+   "syslog": ("log syslogd setting",),
+   "faz": ("log fortianalyzer setting",),
+   "central_mgmt": ("system central-management",),
+   # Settings of any section by path; readers declare the paths themselves (Predicate.section).
+   "settings": (),
+})
+def context_sections(keys) -> Tuple[str, ...]:
+   """Config sections behind the given context keys, in first-use order."""
+   out: Dict[str, None] = {}
+   for key in keys:
+       out.update(dict.fromkeys(CONTEXT_KEYS[key]))
+   return tuple(out)
+@dataclass(frozen=True)
 class ControlDef:
    control_id: str
    category: str
@@ -12,27 +73,266 @@ class ControlDef:
    weight: int
    level: str  # L1/L2 etc (optional)
    rule_key: str  # maps to a rule function
-@dataclass
+   # Config sections the control's rule reads.
+   sections: Tuple[str, ...] = ()
+@dataclass(frozen=True, eq=False)
 class BenchmarkPack:
    pack_id: str
    pack_name: str
    pack_version: str
    family: str  # "7.0.x" / "7.4.x"
+   controls: Tuple[ControlDef, ...]
+   rules: Mapping[str, RuleFn]
+   # Config sections the pack's controls read (the union of ControlDef.sections).
+   sections: Tuple[str, ...] = ()
+   def __post_init__(self):
+       object.__setattr__(self, "controls", tuple(self.controls))
+       object.__setattr__(self, "rules", MappingProxyType(dict(self.rules)))
+   def __reduce__(self):
+       # Read-only mapping proxies do not pickle; packs sent to worker processes carry a plain dict.
+       return BenchmarkPack, (self.pack_id, self.pack_name, self.pack_version, self.family,
+                              self.controls, dict(self.rules), self.sections)
+@dataclass(frozen=True)
+class PackSelection:
+   """The pack one analysis evaluates and how it was chosen; the pack itself is shared."""
+   key: str  # list_supported_packs() key, e.g. "7.0.x|v1.4.0"
+   pack: BenchmarkPack
    selection: str  # "auto" / "manual"
-   controls: List[ControlDef]
-   rules: Dict[str, RuleFn]
-def _import_pack(module_path: str) -> BenchmarkPack:
-   mod = __import__(module_path, fromlist=["PACK"])
-   return getattr(mod, "PACK")
-def list_supported_packs() -> Dict[str, str]:
-   # key -> import path
-   return {
-       "7.0.x|v1.2.0": "benchmark_packs.cis_fgt_7_0_v1_2",
-       "7.0.x|v1.3.0": "benchmark_packs.cis_fgt_7_0_v1_3",
-       "7.0.x|v1.4.0": "benchmark_packs.cis_fgt_7_0_v1_4",
-       "7.4.x|v1.0.0": "benchmark_packs.cis_fgt_7_4_v1_0_0",
-       "7.4.x|v1.0.1": "benchmark_packs.cis_fgt_7_4_v1_0_1",
+# -------------------------
+# Declarative controls
+# -------------------------
+PACK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_packs")
+# Compiled-pack cache (JSON); per user, ignored unless owned by this user with no group/other access.
+PACK_CACHE_DIR = os.environ.get("FWGOV_PACK_CACHE") or os.path.join(
+   os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "fwgov", "packs")
+# Part of every compiled-pack cache key: bump when Predicate or the pack schema changes.
+PACK_FORMAT = "4"
+def _unquote(v: Any) -> str:
+   return str(v or "").strip('"').strip()
+def _number(v: str) -> int:
+   return int(re.sub(r"\D", "", v) or 0)
+# op -> (test(value, operand), operand from the pack's `value`, default expected text)
+COMPARATORS: Dict[str, Tuple[Callable[[str, Any], bool], Callable[[Any], Any], Callable[[Any], str]]] = {
+   "equals": (lambda v, x: v == x, str, str),
+   "not-equals": (lambda v, x: v != x, str, lambda x: f"not {x}"),
+   ">=": (lambda v, x: _number(v) >= x, int, lambda x: f">= {x}"),
+   "<=": (lambda v, x: _number(v) <= x, int, lambda x: f"<= {x}"),
+   "in": (lambda v, x: v in x, frozenset, lambda x: " / ".join(sorted(x))),
+   "regex": (lambda v, x: x.search(v) is not None, re.compile, lambda x: f"matches {x.pattern}"),
+   "exists": (lambda v, x: v != "", lambda x: None, lambda x: "Configured"),
+}
+class Predicate:
+   """
+   One declarative control: `op` applied to `key` of `section` (to the section
+   being present when there is no key). A section missing from the export
+   yields `missing` (e.g. UNKNOWN) when set, otherwise the comparison runs on "".
+   """
+   __slots__ = ("section", "key", "op", "operand", "missing", "observe", "expected", "remediation", "why_failed", "why_missing")
+   def __init__(self, section: str, key: str, op: str, operand: Any, missing: str, observe: Tuple[str, ...],
+                expected: str, remediation: str, why_failed: str, why_missing: str):
+       self.section = section
+       self.key = key
+       self.op = op
+       self.operand = operand
+       self.missing = missing
+       self.observe = observe
+       self.expected = expected
+       self.remediation = remediation
+       self.why_failed = why_failed
+       self.why_missing = why_missing
+   def signature(self) -> Tuple:
+       """Equal for predicates that produce the same result on any context (e.g. one control in several packs)."""
+       return tuple(getattr(self, name) for name in self.__slots__)
+   def __call__(self, ctx: Dict[str, Any]) -> Dict[str, Any]:
+       settings = ctx["settings"].get(self.section) or {}
+       if not settings and self.missing:
+           return {"status": self.missing, "observed": "not found", "expected": self.expected,
+                   "remediation": self.remediation, "why_failed": self.why_missing}
+       if self.key:
+           value = _unquote(settings.get(self.key))
+           observed = value or "not set"
+       else:
+           value = "present" if settings else ""
+           observed = value or "not found"
+       if self.observe:
+           observed = ", ".join(f"{k}={_unquote(settings.get(k))}" for k in self.observe)
+       ok = COMPARATORS[self.op][0](value, self.operand)
+       return {"status": "PASS" if ok else "FAIL", "observed": observed, "expected": self.expected,
+               "remediation": self.remediation, "why_failed": "" if ok else self.why_failed.format(observed=observed)}
+def compile_pack_doc(doc: Mapping[str, Any], source: str = "<pack>") -> BenchmarkPack:
+   """BenchmarkPack from a parsed pack file; declarative controls become Predicates."""
+   from benchmark_packs.rules import RULE_CONTEXT, RULES
+   meta = doc.get("pack", {})
+   controls: List[ControlDef] = []
+   rules: Dict[str, RuleFn] = {}
+   sections: Dict[str, None] = {}
+   for c in doc.get("controls", []):
+       cid = c.get("id", "?")
+       if "rule" in c:
+           key = c["rule"]
+           if key not in RULES:
+               raise ValueError(f"{source}: {cid}: unknown rule {key!r}")
+           rules[key] = RULES[key]
+           needs = context_sections(RULE_CONTEXT[key])
+       else:
+           op = c.get("op", "equals")
+           if op not in COMPARATORS or "section" not in c:
+               raise ValueError(f"{source}: {cid}: needs `rule`, or `section` and an op in {', '.join(COMPARATORS)}")
+           _, operand_of, expected_of = COMPARATORS[op]
+           try:
+               operand = operand_of(c.get("value"))
+           except (TypeError, ValueError, re.error) as e:
+               raise ValueError(f"{source}: {cid}: bad value for {op!r}: {e}") from None
+           section = c["section"]
+           key = f"check:{cid}"
+           rules[key] = Predicate(
+               section, c.get("key", ""), op, operand, c.get("missing", ""), tuple(c.get("observe", ())),
+               c.get("expected") or expected_of(operand), c.get("remediation", ""),
+               c.get("why_failed", f"{c.get('name', cid)}: observed {{observed}}."),
+               c.get("why_missing", f"config {section} not found in config export."),
+           )
+           needs = (section,)
+       sections.update(dict.fromkeys(needs))
+       controls.append(ControlDef(cid, c.get("category", ""), c.get("name", cid), int(c.get("weight", 1)), c.get("level", ""), key, needs))
+   return BenchmarkPack(
+       pack_id=meta["id"], pack_name=meta.get("name", meta["id"]), pack_version=meta.get("version", ""),
+       family=meta.get("family", ""), controls=tuple(controls), rules=rules, sections=tuple(sections),
+   )
+# -------------------------
+# Compiled-pack cache
+# -------------------------
+@lru_cache(maxsize=1)
+def _registry_fingerprint() -> bytes:
+   """Digest of what compiled ControlDef.sections derive from besides the pack file."""
+   from benchmark_packs.rules import RULE_CONTEXT, RULES
+   data = {
+       "rules": sorted(RULES),
+       "rule_context": {k: list(v) for k, v in RULE_CONTEXT.items()},
+       "context_keys": {k: list(v) for k, v in CONTEXT_KEYS.items()},
    }
+   return hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).digest()
+def _cache_path(raw: bytes, cache_dir: str) -> str:
+   digest = hashlib.sha256(PACK_FORMAT.encode("ascii") + b"\x00" + _registry_fingerprint() + b"\x00" + raw).hexdigest()
+   return os.path.join(cache_dir, f"{digest}.pack.json")
+def private_dir(path: str) -> bool:
+   """Creates `path` (mode 0700) if needed; True only for a directory this user owns that others cannot access."""
+   try:
+       os.makedirs(path, mode=0o700, exist_ok=True)
+       st = os.lstat(path)
+   except OSError:
+       return False
+   if not stat.S_ISDIR(st.st_mode):
+       return False
+   if hasattr(os, "getuid") and (st.st_uid != os.getuid() or st.st_mode & 0o077):
+       return False
+   return True
+def _operand_data(operand: Any) -> Any:
+   if isinstance(operand, frozenset):
+       return sorted(operand)
+   if isinstance(operand, re.Pattern):
+       return operand.pattern
+   return operand
+def pack_to_data(pack: BenchmarkPack) -> Dict[str, Any]:
+   """JSON-serializable form of a compiled pack; registry rules are kept by key."""
+   controls = []
+   for c in pack.controls:
+       rule = pack.rules[c.rule_key]
+       check = None
+       if isinstance(rule, Predicate):
+           check = {name: getattr(rule, name) for name in Predicate.__slots__}
+           check["operand"] = _operand_data(rule.operand)
+           check["observe"] = list(rule.observe)
+       controls.append({"id": c.control_id, "category": c.category, "name": c.name, "weight": c.weight,
+                        "level": c.level, "rule_key": c.rule_key, "sections": list(c.sections), "check": check})
+   return {"id": pack.pack_id, "name": pack.pack_name, "version": pack.pack_version, "family": pack.family,
+           "sections": list(pack.sections), "controls": controls}
+def pack_from_data(data: Mapping[str, Any]) -> BenchmarkPack:
+   """Inverse of pack_to_data; raises KeyError/ValueError/TypeError on malformed data."""
+   from benchmark_packs.rules import RULES
+   controls: List[ControlDef] = []
+   rules: Dict[str, RuleFn] = {}
+   for c in data["controls"]:
+       check = c["check"]
+       if check is None:
+           rules[c["rule_key"]] = RULES[c["rule_key"]]
+       else:
+           args = dict(check, observe=tuple(check["observe"]))
+           args["operand"] = COMPARATORS[check["op"]][1](check["operand"])
+           rules[c["rule_key"]] = Predicate(**args)
+       controls.append(ControlDef(c["id"], c["category"], c["name"], int(c["weight"]), c["level"], c["rule_key"], tuple(c["sections"])))
+   return BenchmarkPack(
+       pack_id=data["id"], pack_name=data["name"], pack_version=data["version"], family=data["family"],
+       controls=tuple(controls), rules=rules, sections=tuple(data["sections"]),
+   )
+def _store(path: str, pack: BenchmarkPack) -> None:
+   tmp = None
+   try:
+       fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+       with os.fdopen(fd, "w", encoding="utf-8") as f:
+           json.dump(pack_to_data(pack), f)
+       os.replace(tmp, path)
+   except OSError:
+       # Read-only or full cache directory: the compiled pack is still usable.
+       if tmp and os.path.exists(tmp):
+           os.remove(tmp)
+def load_pack_file(path: str, cache_dir: Optional[str] = PACK_CACHE_DIR) -> BenchmarkPack:
+   """Compiled pack for a .toml/.json pack file, from the on-disk cache when the file is unchanged."""
+   with open(path, "rb") as f:
+       raw = f.read()
+   cached = _cache_path(raw, cache_dir) if cache_dir and private_dir(cache_dir) else None
+   if cached:
+       try:
+           with open(cached, encoding="utf-8") as f:
+               return pack_from_data(json.load(f))
+       except (OSError, ValueError, KeyError, TypeError, re.error):
+           # Missing, truncated or stale entry: compile below, which (re)writes it.
+           pass
+   text = raw.decode("utf-8")
+   doc = json.loads(text) if path.endswith(".json") else tomllib.loads(text)
+   pack = compile_pack_doc(doc, os.path.basename(path))
+   if cached:
+       _store(cached, pack)
+   return pack
+# key -> pack file in PACK_DIR
+SUPPORTED_PACKS: Mapping[str, str] = MappingProxyType({
+   "7.0.x|v1.2.0": "cis_fgt_7_0_v1_2.toml",
+   "7.0.x|v1.3.0": "cis_fgt_7_0_v1_3.toml",
+   "7.0.x|v1.4.0": "cis_fgt_7_0_v1_4.toml",
+   "7.4.x|v1.0.0": "cis_fgt_7_4_v1_0_0.toml",
+   "7.4.x|v1.0.1": "cis_fgt_7_4_v1_0_1.toml",
+})
+_PACKS: Dict[str, BenchmarkPack] = {}
+_PACKS_LOCK = threading.Lock()
+def list_supported_packs() -> Dict[str, str]:
+   return dict(SUPPORTED_PACKS)
+def get_pack(key: str) -> BenchmarkPack:
+   """The shared, immutable pack for a list_supported_packs() key, loaded on first use."""
+   pack = _PACKS.get(key)
+   if pack is None:
+       # Only first loads serialize; later lookups are plain dict reads.
+       with _PACKS_LOCK:
+           pack = _PACKS.get(key)
+           if pack is None:
+               pack = _PACKS[key] = load_pack_file(os.path.join(PACK_DIR, SUPPORTED_PACKS[key]))
+   return pack
+def load_supported_packs() -> Dict[str, BenchmarkPack]:
+   """Every pack of list_supported_packs(), by key ("7.0.x|v1.4.0")."""
+   return {key: get_pack(key) for key in SUPPORTED_PACKS}
+@lru_cache(maxsize=1)
+def registry_digest() -> str:
+   """
+   Digest of every supported pack as loaded and of the rule registry's source
+   (benchmark_packs/rules.py): part of every analysis cache key, so editing a
+   pack or a rule function retires cached results. Packs load once per
+   process, so it is computed once too.
+   """
+   from benchmark_packs import rules
+   h = hashlib.sha256(PACK_FORMAT.encode("ascii") + b"\x00" + _registry_fingerprint())
+   with open(rules.__file__, "rb") as f:
+       h.update(f.read())
+   for key, pack in sorted(load_supported_packs().items()):
+       h.update(json.dumps([key, pack_to_data(pack)], sort_keys=True).encode("utf-8"))
+   return h.hexdigest()
 def detect_branch(version: str) -> str:
    import re
    m = re.match(r"^\s*(\d+)\.(\d+)\.", str(version).strip())
@@ -52,28 +352,25 @@ def auto_select_pack(fw_version: str) -> tuple[str, str]:
        return ("7.4.x", "v1.0.1")
    # fallback
    return ("7.0.x", "v1.4.0")
-def load_pack(
-   fw_version: str,
-   benchmark_family: str = "Auto (from firmware)",
-   benchmark_version: str = "Auto",
-) -> BenchmarkPack:
-   mapping = list_supported_packs()
+@lru_cache(maxsize=256)
+def resolve_pack(fw_version: str, benchmark_family: str = "Auto (from firmware)", benchmark_version: str = "Auto") -> Tuple[str, str]:
+   """(list_supported_packs() key, "auto"/"manual") for a firmware version and UI selection."""
    if benchmark_family.startswith("Auto"):
        fam, ver = auto_select_pack(fw_version)
-       key = f"{fam}|{ver}"
-       pack = _import_pack(mapping[key])
-       pack.selection = "auto"
-       return pack
+       return f"{fam}|{ver}", "auto"
    # UI values: "FortiOS 7.0.x" / "FortiOS 7.4.x"
    fam = "7.0.x" if "7.0" in benchmark_family else "7.4.x"
    ver = benchmark_version if benchmark_version and benchmark_version != "Auto" else ("v1.4.0" if fam == "7.0.x" else "v1.0.1")
    key = f"{fam}|{ver.replace(' (Archive)','')}".strip()
-   if key not in mapping:
+   if key not in SUPPORTED_PACKS:
        # fallback to auto if unsupported
        fam2, ver2 = auto_select_pack(fw_version)
-       pack = _import_pack(mapping[f"{fam2}|{ver2}"])
-       pack.selection = "auto"
-       return pack
-   pack = _import_pack(mapping[key])
-   pack.selection = "manual"
-   return pack
\ No newline at end of file
+       return f"{fam2}|{ver2}", "auto"
+   return key, "manual"
+def load_pack(
+   fw_version: str,
+   benchmark_family: str = "Auto (from firmware)",
+   benchmark_version: str = "Auto",
+) -> PackSelection:
+   key, selection = resolve_pack(fw_version, benchmark_family, benchmark_version)
+   return PackSelection(key, get_pack(key), selection)
@@ -0,0 +1,79 @@
+# benchmark_packs/rules.py
+"""
+Rule registry shared by every benchmark pack, for checks a declarative
+control (section + key + comparator, see benchmark_loader) cannot express.
+A rule reads the context control_engine.rule_context() builds once per
+analysis and returns {status, observed, expected, remediation, why_failed};
+pack files refer to rules by key (`rule = "snmp_strong"`). RULE_CONTEXT
+declares the context keys each rule reads; the loader turns them into the
+control's config sections.
+"""
+from __future__ import annotations
+from typing import Dict, Any, Mapping, Tuple
+from benchmark_loader import RuleFn
+from interface_roles import ROLE_LAN, InterfaceRoles
+def _lan_side(name: str, settings: Mapping[str, str], roles: Mapping[str, InterfaceRoles]) -> bool:
+   """
+   Whether the role index of the interface's VDOM (`set vdom`) puts it on the
+   LAN side; an interface assigned to no known VDOM counts if any VDOM does.
+   """
+   own = roles.get(settings.get("vdom", "").strip('"'))
+   if own is not None:
+       return own.role(name) == ROLE_LAN
+   return any(r.role(name) == ROLE_LAN for r in roles.values())
+def rule_trust_mgmt_access(ctx: Mapping[str, Any]) -> Dict[str, Any]:
+   interfaces = ctx["interfaces"]
+   roles = ctx["roles"]
+   # TRUST interfaces are the ones the role index puts on the LAN side.
+   trusted = [name for name, settings in interfaces.items() if _lan_side(name, settings, roles)]
+   exposed = [name for name in trusted if {"https", "ssh"} & set(interfaces[name].get("allowaccess", "").split())]
+   if not trusted:
+       return {
+           "status": "UNKNOWN",
+           "observed": "no LAN-role interface found",
+           "expected": "No https/ssh on TRUST",
+           "remediation": "config system interface\n edit <lan-interface>\n  set allowaccess ping snmp\n next\nend",
+           "why_failed": "No interface is declared or recognisable as LAN."
+       }
+   ok = not exposed
+   return {
+       "status": "PASS" if ok else "FAIL",
+       "observed": "; ".join(f"{name} allowaccess: {interfaces[name].get('allowaccess', '')}" for name in exposed)
+                   or f"LAN interfaces: {', '.join(trusted)}",
+       "expected": "No https/ssh on TRUST",
+       "remediation": "config system interface\n" + "".join(f" edit {name}\n  set allowaccess ping snmp\n next\n" for name in exposed or trusted) + "end",
+       "why_failed": "" if ok else f"HTTPS/SSH administrative access enabled on {', '.join(exposed)}."
+   }
+def rule_snmp_strong(ctx: Mapping[str, Any]) -> Dict[str, Any]:
+   snmp_users = ctx["snmp_users"]
+   if not snmp_users:
+       return {
+           "status": "UNKNOWN",
+           "observed": "not configured",
+           "expected": "auth-priv + sha512 + aes256",
+           "remediation": "config system snmp user\n edit <user>\n  set security-level auth-priv\n  set auth-proto sha512\n  set priv-proto aes256\n next\nend",
+           "why_failed": "SNMP users not present in config."
+       }
+   ok = False
+   obs = ""
+   for u, ud in snmp_users.items():
+       obs = f"{u}: {ud.get('security-level','')} {ud.get('auth-proto','')} {ud.get('priv-proto','')}"
+       if ud.get("security-level") == "auth-priv" and ud.get("auth-proto") == "sha512" and ud.get("priv-proto") == "aes256":
+           ok = True
+           break
+   return {
+       "status": "PASS" if ok else "FAIL",
+       "observed": obs,
+       "expected": "auth-priv + sha512 + aes256",
+       "remediation": "config system snmp user\n edit <user>\n  set security-level auth-priv\n  set auth-proto sha512\n  set priv-proto aes256\n next\nend",
+       "why_failed": "" if ok else "No SNMPv3 user found with auth-priv + sha512 + aes256."
+   }
+RULES: Dict[str, RuleFn] = {
+   "trust_mgmt_access": rule_trust_mgmt_access,
+   "snmp_strong": rule_snmp_strong,
+}
+# rule key -> context keys the rule reads (benchmark_loader.CONTEXT_KEYS)
+RULE_CONTEXT: Dict[str, Tuple[str, ...]] = {
+   "trust_mgmt_access": ("interfaces", "roles"),
+   "snmp_strong": ("snmp_users",),
+}
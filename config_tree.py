@@ -0,0 +1,288 @@
+# config_tree.py
+"""
+Streaming parser for FortiOS configuration exports.
+Reads line by line and builds a nested tree of `config` blocks and `edit` entries:
+   config firewall policy          -> ConfigNode("firewall policy")
+       edit 1                      ->   .entries["1"] = ConfigNode("1")
+           set action accept       ->     .settings["action"] = "accept"
+           config secondaryip      ->     .children["secondaryip"] = ConfigNode(...)
+               edit 1 ... next
+           end
+       next
+   end
+Repeated blocks with the same path (e.g. one `config vdom` per VDOM) are merged.
+Multi-VDOM exports keep global sections under `config global` and per-VDOM
+sections under `config vdom / edit <name>`; see ConfigTree.global_scope/vdoms.
+Given `sections`, only those section paths are materialized in each scope (the
+root, `config global` and every VDOM); other blocks are skipped while streaming
+by counting `config`/`end` lines, without tokenizing their contents.
+"""
+from __future__ import annotations
+import io
+import mmap
+import os
+import re
+import sys
+from types import MappingProxyType
+from typing import AbstractSet, Collection, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+ConfigSource = Union[str, Iterable[str], Iterable[bytes]]
+_EMPTY: Mapping = MappingProxyType({})
+# Values up to this length are pooled so repeated tokens ("enable", "\"all\"") share one string.
+_POOL_MAX_LEN = 64
+# Blocks that hold scopes rather than settings; never skipped by a section filter.
+_SCOPE_PATHS = ("global", "vdom")
+# One line with its newline, as readline() returns it; splits a buffer without copying it whole.
+_LINE_RE = re.compile(rb"[^\n]*\n|[^\n]+")
+class ConfigNode:
+   """
+   One `config` block or one `edit` entry. Empty containers share a read-only
+   mapping until the first item is added.
+   """
+   __slots__ = ("name", "settings", "entries", "children")
+   def __init__(self, name: str):
+       self.name = name
+       self.settings: Mapping[str, str] = _EMPTY
+       self.entries: Mapping[str, "ConfigNode"] = _EMPTY
+       self.children: Mapping[str, "ConfigNode"] = _EMPTY
+   def __repr__(self) -> str:
+       return f"ConfigNode({self.name!r}, settings={len(self.settings)}, entries={len(self.entries)}, children={len(self.children)})"
+   def child(self, path: str) -> Optional["ConfigNode"]:
+       return self.children.get(path)
+   def items(self) -> Dict[str, Dict[str, str]]:
+       """`edit` entries as {key: settings}, the shape perf_bench.parse_config_edit_block returns."""
+       return {k: e.settings for k, e in self.entries.items()}
+class ConfigTree:
+   """
+   Parsed config: the root node plus the `#key=value` header lines of the export.
+   Section paths are given without the `config ` prefix ("system global").
+   """
+   __slots__ = ("root", "header")
+   def __init__(self, root: ConfigNode, header: str = ""):
+       self.root = root
+       self.header = header
+   def node(self, path: str) -> Optional[ConfigNode]:
+       return self.root.children.get(path)
+   def settings(self, path: str) -> Mapping[str, str]:
+       n = self.root.children.get(path)
+       return n.settings if n is not None else _EMPTY
+   def items(self, path: str) -> Dict[str, Dict[str, str]]:
+       n = self.root.children.get(path)
+       return n.items() if n is not None else {}
+   def is_multi_vdom(self) -> bool:
+       n = self.root.children.get("vdom")
+       return n is not None and bool(n.entries)
+   def global_scope(self) -> "ConfigTree":
+       """Global sections: the `config global` block of a multi-VDOM export, otherwise the whole tree."""
+       n = self.root.children.get("global")
+       return ConfigTree(n, self.header) if n is not None else self
+   def vdoms(self) -> Dict[str, "ConfigTree"]:
+       """
+       One scope per `config vdom / edit <name>` in config order. Exports without
+       VDOM blocks have a single implicit "root" VDOM: the whole tree.
+       """
+       if not self.is_multi_vdom():
+           return {"root": self}
+       return {name: ConfigTree(e, self.header) for name, e in self.root.children["vdom"].entries.items()}
+# -------------------------
+# Line sources
+# -------------------------
+def _iter_text_lines(text: str) -> Iterator[str]:
+   start = 0
+   n = len(text)
+   find = text.find
+   while start < n:
+       end = find("\n", start)
+       if end < 0:
+           end = n
+       yield text[start:end]
+       start = end + 1
+def _iter_binary_lines(source: io.BufferedIOBase) -> Iterator[str]:
+   # Decode in chunks instead of line by line; detach so the caller's stream stays open.
+   wrapper = io.TextIOWrapper(source, encoding="utf-8", errors="ignore")
+   try:
+       yield from wrapper
+   finally:
+       wrapper.detach()
+def iter_lines(source: ConfigSource) -> Iterator[str]:
+   """Returns text lines from a string, a text/binary file handle or any iterable of lines."""
+   if isinstance(source, str):
+       return _iter_text_lines(source)
+   if isinstance(source, io.TextIOBase):
+       return iter(source)
+   if isinstance(source, io.BufferedIOBase):
+       return _iter_binary_lines(source)
+   return (line.decode("utf-8", "ignore") if isinstance(line, (bytes, bytearray)) else line for line in source)
+# -------------------------
+# Parser
+# -------------------------
+def _open_quote(value) -> bool:
+   q, esc = ('"', '\\"') if isinstance(value, str) else (b'"', b'\\"')
+   return (value.count(q) - value.count(esc)) % 2 == 1
+def parse_config_tree(source: ConfigSource, sections: Optional[Collection[str]] = None) -> ConfigTree:
+   """
+   Parses `config/edit/set/next/end` to any depth in one pass over `source`.
+   Only the tree is retained; each raw line is dropped as soon as it is consumed.
+   `bytes`/`bytearray`/`memoryview`/`mmap` sources are tokenized as bytes (see
+   load_config_tree); buffers are read in place, never copied whole.
+   With `sections`, every other section of each scope is skipped unparsed.
+   """
+   keep = frozenset(sections) if sections is not None else None
+   if isinstance(source, mmap.mmap):
+       return _parse_lines(iter(source.readline, b""), binary=True, keep=keep)
+   if isinstance(source, bytes):
+       # BytesIO shares an immutable bytes object instead of copying it.
+       return _parse_lines(iter(io.BytesIO(source).readline, b""), binary=True, keep=keep)
+   if isinstance(source, (bytearray, memoryview)):
+       return _parse_lines((m.group() for m in _LINE_RE.finditer(source)), binary=True, keep=keep)
+   return _parse_lines(iter_lines(source), binary=False, keep=keep)
+def load_config_tree(path: str, sections: Optional[Collection[str]] = None) -> ConfigTree:
+   """
+   Parses a config file through a read-only memory map. Lines are tokenized as
+   bytes and only the keys and values kept in the tree are decoded (short ones
+   once per distinct value), so no full bytes or str copy of the file is made.
+   `sections` restricts the tree as in parse_config_tree.
+   """
+   keep = frozenset(sections) if sections is not None else None
+   with open(path, "rb") as f:
+       if os.fstat(f.fileno()).st_size == 0:
+           return ConfigTree(ConfigNode(""))
+       with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+           if hasattr(mm, "madvise"):
+               mm.madvise(mmap.MADV_SEQUENTIAL)
+           return _parse_lines(_iter_mmap_lines(mm), binary=True, keep=keep)
+def _iter_mmap_lines(mm: mmap.mmap, window: int = 1 << 24) -> Iterator[bytes]:
+   """
+   Yields lines from a mapped file. Pages already consumed are handed back every
+   `window` bytes (MADV_DONTNEED where available), so the mapped file does not
+   accumulate in the process RSS while the tree is being built.
+   """
+   readline = mm.readline
+   dontneed = getattr(mmap, "MADV_DONTNEED", None) if hasattr(mm, "madvise") else None
+   released = 0
+   n = 0
+   while True:
+       line = readline()
+       if not line:
+           return
+       yield line
+       n += 1
+       if dontneed is not None and not n & 0xFFF:
+           cut = mm.tell() // mmap.PAGESIZE * mmap.PAGESIZE
+           if cut - released >= window:
+               mm.madvise(dontneed, released, cut - released)
+               released = cut
+def _skip_block(lines: Iterator, binary: bool) -> None:
+   """Consumes the rest of a `config` block whose header was just read, nested blocks included."""
+   if binary:
+       CONFIG, END, QUOTE = b"config ", b"end", b'"'
+   else:
+       CONFIG, END, QUOTE = "config ", "end", '"'
+   depth = 1
+   for raw in lines:
+       line = raw.strip()
+       if line == END:
+           depth -= 1
+           if not depth:
+               return
+       elif line.startswith(CONFIG):
+           depth += 1
+       elif line.count(QUOTE) & 1 and _open_quote(line):
+           # A multi-line quoted value may contain `end`/`config` lines.
+           for more in lines:
+               if _open_quote(more):
+                   break
+def _parse_lines(lines: Iterator, binary: bool, keep: Optional[AbstractSet[str]] = None) -> ConfigTree:
+   if binary:
+       SET, EDIT, NEXT, CONFIG, END, HASH, QUOTE, CR, NL = b"set", b"edit", b"next", b"config", b"end", b"#", b'"', b"\r", b"\n"
+   else:
+       SET, EDIT, NEXT, CONFIG, END, HASH, QUOTE, CR, NL = "set", "edit", "next", "config", "end", "#", '"', "\r", "\n"
+   root = ConfigNode("")
+   # Nodes whose child blocks are sections (keep applies to them): the root, `config global`, each VDOM.
+   scopes = {id(root)}
+   vdom_list = None
+   header: List[str] = []
+   # (node, is_edit_entry) for every open block; `node` mirrors the top of the stack.
+   stack: List[Tuple[ConfigNode, bool]] = [(root, False)]
+   node = root
+   # raw token -> kept str; in binary mode these double as the decode cache
+   pool: Dict = {}
+   keys: Dict = {}
+   intern = sys.intern
+   def text(raw) -> str:
+       return raw.decode("utf-8", "ignore") if binary else raw
+   for raw in lines:
+       line = raw.strip()
+       if not line:
+           continue
+       parts = line.split(None, 2)
+       tok = parts[0]
+       if tok == SET:
+           if len(parts) < 3:
+               continue
+           value = parts[2]
+           if value.count(QUOTE) & 1 and _open_quote(value):
+               buf = [value]
+               for more in lines:
+                   buf.append(more.rstrip(CR + NL))
+                   if _open_quote(more):
+                       break
+               value = text(NL.join(buf))
+           elif len(value) <= _POOL_MAX_LEN:
+               kept = pool.get(value)
+               if kept is None:
+                   kept = pool[value] = text(value)
+               value = kept
+           elif binary:
+               value = text(value)
+           key = keys.get(parts[1])
+           if key is None:
+               key = keys[parts[1]] = intern(text(parts[1]))
+           if node.settings is _EMPTY:
+               node.settings = {}
+           node.settings[key] = value
+       elif tok == EDIT:
+           if stack[-1][1]:
+               # `edit` without a preceding `next`
+               stack.pop()
+               node = stack[-1][0]
+           key = text(line[5:].strip().strip(QUOTE))
+           if node.entries is _EMPTY:
+               node.entries = {}
+           entry = node.entries.get(key)
+           if entry is None:
+               entry = node.entries[key] = ConfigNode(key)
+               if node is vdom_list:
+                   scopes.add(id(entry))
+           stack.append((entry, True))
+           node = entry
+       elif tok == NEXT:
+           if stack[-1][1]:
+               stack.pop()
+               node = stack[-1][0]
+       elif tok == CONFIG:
+           path = intern(text(line[7:].strip()))
+           if keep is not None and path not in keep and id(node) in scopes:
+               if node is not root or path not in _SCOPE_PATHS:
+                   _skip_block(lines, binary)
+                   continue
+           if node.children is _EMPTY:
+               node.children = {}
+           child = node.children.get(path)
+           if child is None:
+               child = node.children[path] = ConfigNode(path)
+               if keep is not None and node is root:
+                   if path == "global":
+                       scopes.add(id(child))
+                   elif path == "vdom":
+                       vdom_list = child
+           stack.append((child, False))
+           node = child
+       elif tok == END:
+           if len(stack) > 1 and stack[-1][1]:
+               stack.pop()
+           if len(stack) > 1:
+               stack.pop()
+           node = stack[-1][0]
+       elif len(stack) == 1 and tok.startswith(HASH):
+           header.append(text(line))
+   return ConfigTree(root, "\n".join(header))
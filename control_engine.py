@@ -0,0 +1,110 @@
+# control_engine.py
+"""
+Benchmark control evaluation.
+rule_context() wraps a parsed config in the mapping rule functions and
+Predicates receive. Keys read the global scope, except `zones`, `routes` and
+`roles`: those are {vdom: ...} over each VDOM scope (one "root" entry for
+exports without VDOMs), since multi-VDOM exports keep zones and static routes
+per VDOM. Each key (benchmark_loader.CONTEXT_KEYS) is built from its
+sections on first access, so a run reads only what its controls use and a
+tree parsed with just the packs' declared sections (ControlDef.sections)
+evaluates the same as a full one.
+compile_pack() resolves each ControlDef.rule_key against the pack's rule
+registry once per pack object, so a run is one pass over (control, rule) pairs:
+   rows = [row(control, rule(ctx)) for control, rule in compile_pack(pack)]
+evaluate_packs() runs several packs over one context; a rule shared by packs
+(the same registry function, or declarative controls with equal signatures)
+is evaluated once.
+"""
+from __future__ import annotations
+import weakref
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Tuple
+from benchmark_loader import CONTEXT_KEYS, BenchmarkPack, ControlDef, Predicate, RuleFn, context_sections
+from config_tree import ConfigTree
+from interface_roles import InterfaceRoles
+# Sections the named context keys read (paths without the "config " prefix).
+CONTEXT_SECTIONS = context_sections(CONTEXT_KEYS)
+CompiledPack = Tuple[Tuple[ControlDef, RuleFn], ...]
+# Keyed by the pack object itself (identity hash, BenchmarkPack is eq=False): two packs
+# sharing a pack_id, e.g. a pack file edited and reloaded, never see each other's rules.
+_COMPILED: "weakref.WeakKeyDictionary[BenchmarkPack, CompiledPack]" = weakref.WeakKeyDictionary()
+def config_hostname(tree: ConfigTree) -> str:
+   return tree.settings("system global").get("hostname", "").strip('"').strip() or "Unknown"
+# context key -> builder; one per benchmark_loader.CONTEXT_KEYS entry
+_BUILDERS: Dict[str, Callable[["RuleContext"], Any]] = {
+   "meta": lambda ctx: {"hostname": config_hostname(ctx.tree)},
+   "sys_global": lambda ctx: ctx.tree.settings("system global"),
+   "pwd_policy": lambda ctx: ctx.tree.settings("system password-policy"),
+   "interfaces": lambda ctx: ctx.tree.items("system interface"),
+   "zones": lambda ctx: {name: scope.items("system zone") for name, scope in ctx.vdoms.items()},
+   "routes": lambda ctx: {name: scope.items("router static") for name, scope in ctx.vdoms.items()},
+   # Interfaces live under `config global` in multi-VDOM exports, as for analyzer.policy_tables.
+   "roles": lambda ctx: {name: InterfaceRoles(ctx["interfaces"], ctx["zones"][name], ctx["routes"][name]) for name in ctx.vdoms},
+   "snmp_users": lambda ctx: ctx.tree.items("system snmp user"),
+   "ntp": lambda ctx: ctx.tree.settings("system ntp"),
+   "syslog": lambda ctx: ctx.tree.settings("log syslogd setting"),
+   "faz": lambda ctx: ctx.tree.settings("log fortianalyzer setting"),
+   "central_mgmt": lambda ctx: ctx.tree.settings("system central-management"),
+   "settings": lambda ctx: {path: n.settings for path, n in ctx.tree.root.children.items()},
+}
+assert set(_BUILDERS) == set(CONTEXT_KEYS)
+class RuleContext(Mapping[str, Any]):
+   """
+   Read-only rule context over a config's global scope (`tree`) and its VDOM
+   scopes. A key is built on first access and kept for the rest of the run
+   (packs share one context).
+   """
+   __slots__ = ("tree", "vdoms", "_values")
+   def __init__(self, tree: ConfigTree):
+       self.tree = tree.global_scope()
+       self.vdoms = tree.vdoms()
+       self._values: Dict[str, Any] = {}
+   def __getitem__(self, key: str) -> Any:
+       value = self._values.get(key, self)
+       if value is self:
+           value = self._values[key] = _BUILDERS[key](self)
+       return value
+   def __iter__(self) -> Iterator[str]:
+       return iter(_BUILDERS)
+   def __len__(self) -> int:
+       return len(_BUILDERS)
+   def built(self) -> Tuple[str, ...]:
+       """Keys read so far, in first-access order."""
+       return tuple(self._values)
+def rule_context(tree: ConfigTree) -> RuleContext:
+   """The context every rule function reads; `tree` is the whole config, not its global scope."""
+   return RuleContext(tree)
+def compile_pack(pack: BenchmarkPack) -> CompiledPack:
+   """(control, rule function) pairs of a pack in control order, cached per pack object."""
+   compiled = _COMPILED.get(pack)
+   if compiled is None:
+       missing = [c.rule_key for c in pack.controls if c.rule_key not in pack.rules]
+       if missing:
+           raise ValueError(f"{pack.pack_id}: no rule registered for {', '.join(missing)}")
+       compiled = _COMPILED[pack] = tuple((c, pack.rules[c.rule_key]) for c in pack.controls)
+   return compiled
+def _row(c: ControlDef, out: Dict[str, Any]) -> Dict[str, Any]:
+   return {
+       "control_id": c.control_id, "category": c.category, "control_name": c.name, "status": out["status"],
+       "observed": out.get("observed", ""), "expected": out.get("expected", ""), "weight": c.weight,
+       "remediation": out.get("remediation", ""), "level": c.level, "why_failed": out.get("why_failed", ""),
+   }
+def evaluate_pack(pack: BenchmarkPack, ctx: Mapping[str, Any]) -> List[Dict[str, Any]]:
+   """One CIS row per control of `pack`, in pack order."""
+   return [_row(c, rule(ctx)) for c, rule in compile_pack(pack)]
+def evaluate_packs(packs: Dict[str, BenchmarkPack], ctx: Mapping[str, Any]) -> Tuple[Dict[str, List[Dict[str, Any]]], int]:
+   """
+   ({key: evaluate_pack(pack, ctx)}, rule evaluations run). Results are
+   memoized per rule identity across packs.
+   """
+   done: Dict[Any, Dict[str, Any]] = {}
+   out: Dict[str, List[Dict[str, Any]]] = {}
+   for key, pack in packs.items():
+       rows = out[key] = []
+       for c, rule in compile_pack(pack):
+           ident = rule.signature() if isinstance(rule, Predicate) else rule
+           result = done.get(ident)
+           if result is None:
+               result = done[ident] = rule(ctx)
+           rows.append(_row(c, result))
+   return out, len(done)
@@ -0,0 +1,366 @@
+# fw_objects.py
+"""
+Firewall objects resolved to interval sets ("spans").
+A span is a flat tuple of sorted, merged, half-open intervals:
+   (start0, end0, start1, end1, ...)     with end_i < start_i+1
+Containment and overlap are checked by bisecting one span's bounds, so a test
+costs O(k log m) for spans of k and m intervals, however many objects a group expands to.
+Addresses live on the IPv4 line [0, 2**32). Services live on
+protocol * 65536 + port (ICMP: type * 256 + code). Objects that cannot be
+written as ranges on their line (fqdn, geography, wildcard, proxy services,
+undefined names, ...) each get a synthetic point above it, so they are only
+covered by themselves or by ANY.
+"""
+from __future__ import annotations
+import socket
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+from policy_model import norm_list_val
+Span = Tuple[int, ...]
+EMPTY: Span = ()
+# -------------------------
+# Span arithmetic
+# -------------------------
+def normalize(intervals: Iterable[Tuple[int, int]]) -> Span:
+   """Sorts and merges (start, end) pairs; empty and adjacent intervals are folded."""
+   out: List[int] = []
+   for s, e in sorted(intervals):
+       if s >= e:
+           continue
+       if out and s <= out[-1]:
+           if e > out[-1]:
+               out[-1] = e
+       else:
+           out.append(s)
+           out.append(e)
+   return tuple(out)
+def pairs(span: Span) -> Iterable[Tuple[int, int]]:
+   return zip(span[0::2], span[1::2])
+def union(spans: Iterable[Span]) -> Span:
+   spans = [s for s in spans if s]
+   if len(spans) <= 1:
+       return spans[0] if spans else EMPTY
+   return normalize(iv for s in spans for iv in pairs(s))
+def subtract(a: Span, b: Span) -> Span:
+   if not a or not b:
+       return a
+   out: List[int] = []
+   j = 0
+   nb = len(b)
+   for s, e in pairs(a):
+       while j < nb and b[j + 1] <= s:
+           j += 2
+       k = j
+       while s < e and k < nb and b[k] < e:
+           if b[k] > s:
+               out.append(s)
+               out.append(b[k])
+           s = max(s, b[k + 1])
+           k += 2
+       if s < e:
+           out.append(s)
+           out.append(e)
+   return tuple(out)
+def complement(span: Span, universe_end: int) -> Span:
+   return subtract((0, universe_end), span)
+def contains(outer: Span, inner: Span) -> bool:
+   """True if every value in `inner` is in `outer`."""
+   if outer is inner or not inner:
+       return True
+   if not outer:
+       return False
+   if len(outer) == 2:
+       return outer[0] <= inner[0] and inner[-1] <= outer[1]
+   for i in range(0, len(inner), 2):
+       k = bisect_right(outer, inner[i])
+       if not k & 1 or inner[i + 1] > outer[k]:
+           return False
+   return True
+def overlaps(a: Span, b: Span) -> bool:
+   if not a or not b:
+       return False
+   if len(a) > len(b):
+       a, b = b, a
+   for i in range(0, len(a), 2):
+       s, e = a[i], a[i + 1]
+       k = bisect_right(b, s)
+       if k & 1 or (k < len(b) and b[k] < e):
+           return True
+   return False
+# -------------------------
+# Addresses
+# -------------------------
+IPV4_END = 1 << 32
+# Synthetic points for opaque address names live in [IPV4_END, ADDR_END).
+ADDR_END = 1 << 40
+ANY_ADDRESS: Span = (0, ADDR_END)
+def _ip(value: str) -> Optional[int]:
+   try:
+       return int.from_bytes(socket.inet_aton(value), "big")
+   except (OSError, ValueError):
+       return None
+def _subnet(value: str) -> Optional[Tuple[int, int]]:
+   """'10.0.0.0 255.255.0.0' or '10.0.0.0/16' as [start, end); None if not a contiguous IPv4 mask."""
+   parts = value.replace("/", " ").split()
+   if len(parts) != 2:
+       return None
+   ip = _ip(parts[0])
+   if ip is None:
+       return None
+   if parts[1].isdigit() and int(parts[1]) <= 32:
+       bits = int(parts[1])
+   else:
+       mask = _ip(parts[1])
+       if mask is None:
+           return None
+       inv = ~mask & 0xFFFFFFFF
+       if inv & (inv + 1):
+           return None
+       bits = 32 - inv.bit_length()
+   size = 1 << (32 - bits)
+   start = ip & ~(size - 1) & 0xFFFFFFFF
+   return start, start + size
+def _ip_range(value: str) -> Optional[Tuple[int, int]]:
+   """'1.2.3.4' or '1.2.3.4-1.2.3.9' as [start, end)."""
+   lo, _, hi = value.partition("-")
+   start = _ip(lo.strip())
+   end = _ip(hi.strip()) if hi else start
+   if start is None or end is None or end < start:
+       return None
+   return start, end + 1
+def _unquote(value: Optional[str]) -> str:
+   return (value or "").strip().strip('"')
+class _Book:
+   """Name -> span resolution with memoized recursive group flattening."""
+   universe_end = 0
+   any: Span = EMPTY
+   opaque_base = 0
+   def __init__(self):
+       self._resolved: Dict[str, Span] = {}
+       self._resolving: Set[str] = set()
+       self._opaque: Dict[str, Span] = {}
+       self._fields: Dict[Tuple[Tuple[str, ...], bool], Span] = {}
+       self._spans: Dict[Span, Span] = {}
+   def opaque(self, name: str) -> Span:
+       """A synthetic point only this (case-insensitive) name maps to."""
+       key = name.lower()
+       span = self._opaque.get(key)
+       if span is None:
+           v = self.opaque_base + len(self._opaque)
+           span = self._opaque[key] = (v, v + 1)
+       return span
+   def keep_opaque(self, other: "_Book") -> None:
+       """Give opaque names the points `other` gave them, so spans from either book compare."""
+       self._opaque = dict(other._opaque)
+   def is_any(self, span: Span) -> bool:
+       return span == self.any
+   def intern(self, span: Span) -> Span:
+       return self._spans.setdefault(span, span)
+   def resolve(self, name: str) -> Span:
+       span = self._resolved.get(name)
+       if span is not None:
+           return span
+       if name in self._resolving:
+           # Group cycle: the member adds nothing beyond what is already being expanded.
+           return EMPTY
+       self._resolving.add(name)
+       try:
+           span = self._lookup(name)
+       finally:
+           self._resolving.discard(name)
+       span = self._resolved[name] = self.intern(span)
+       return span
+   def field(self, names: Sequence[str], negate: bool = False) -> Span:
+       """Union of a policy field's objects, complemented when the field is negated."""
+       key = (tuple(names), negate)
+       span = self._fields.get(key)
+       if span is None:
+           span = union(self.resolve(n) for n in names) if names else self.opaque("<unset>")
+           if negate:
+               span = complement(span, self.universe_end)
+           span = self._fields[key] = self.intern(span)
+       return span
+   def _lookup(self, name: str) -> Span:
+       raise NotImplementedError
+class AddressBook(_Book):
+   """
+   Resolves `firewall address`, `firewall addrgrp` (including exclude-member),
+   `firewall vip` and `firewall vipgrp` names. A 0.0.0.0/0 object, and the
+   predefined "all", are ANY.
+   """
+   universe_end = ADDR_END
+   any = ANY_ADDRESS
+   opaque_base = IPV4_END
+   def __init__(self, addresses: Mapping[str, Mapping[str, str]] = None,
+                groups: Mapping[str, Mapping[str, str]] = None,
+                vips: Mapping[str, Mapping[str, str]] = None,
+                vip_groups: Mapping[str, Mapping[str, str]] = None):
+       super().__init__()
+       self.addresses = addresses or {}
+       self.groups = groups or {}
+       self.vips = vips or {}
+       self.vip_groups = vip_groups or {}
+   def _lookup(self, name: str) -> Span:
+       a = self.addresses.get(name)
+       if a is not None:
+           return self._address(name, a)
+       g = self.groups.get(name)
+       if g is None:
+           g = self.vip_groups.get(name)
+       if g is not None:
+           span = union(self.resolve(m) for m in norm_list_val(g.get("member")))
+           if _unquote(g.get("exclude")) == "enable":
+               span = subtract(span, union(self.resolve(m) for m in norm_list_val(g.get("exclude-member"))))
+           return span
+       v = self.vips.get(name)
+       if v is not None:
+           ranges = [_ip_range(r) for r in norm_list_val(v.get("extip"))]
+           if ranges and all(ranges):
+               return normalize(ranges)
+           return self.opaque(name)
+       if name.lower() == "all":
+           return ANY_ADDRESS
+       return self.opaque(name)
+   def _address(self, name: str, a: Mapping[str, str]) -> Span:
+       kind = _unquote(a.get("type")) or "ipmask"
+       if kind in ("ipmask", "interface-subnet"):
+           subnet = _unquote(a.get("subnet")) or "0.0.0.0 0.0.0.0"
+           iv = _subnet(subnet)
+           if iv == (0, IPV4_END):
+               return ANY_ADDRESS
+           return iv if iv is not None else self.opaque(name)
+       if kind == "iprange":
+           start, end = _ip(_unquote(a.get("start-ip"))), _ip(_unquote(a.get("end-ip")))
+           if start is not None and end is not None and start <= end:
+               return (start, end + 1)
+       return self.opaque(name)
+# -------------------------
+# Services
+# -------------------------
+PROTO_ICMP, PROTO_TCP, PROTO_UDP, PROTO_UDPLITE, PROTO_SCTP = 1, 6, 17, 136, 132
+PORT_SPACE = 1 << 16
+SERVICE_IP_END = 256 * PORT_SPACE
+# Synthetic points for opaque service names live in [SERVICE_IP_END, SERVICE_END).
+SERVICE_END = 1 << 40
+ANY_SERVICE: Span = (0, SERVICE_END)
+# Every TCP or every UDP destination port: a service covering either is broad (ServiceBook.is_broad).
+ALL_TCP_PORTS: Span = (PROTO_TCP * PORT_SPACE + 1, (PROTO_TCP + 1) * PORT_SPACE)
+ALL_UDP_PORTS: Span = (PROTO_UDP * PORT_SPACE + 1, (PROTO_UDP + 1) * PORT_SPACE)
+_PORTRANGE_KEYS = (
+   ("tcp-portrange", PROTO_TCP), ("udp-portrange", PROTO_UDP),
+   ("udplite-portrange", PROTO_UDPLITE), ("sctp-portrange", PROTO_SCTP),
+)
+def _port_range(value: str) -> Optional[Tuple[int, int]]:
+   """'80' or '1000-2000' as [lo, hi + 1)."""
+   lo, _, hi = value.partition("-")
+   if not lo.isdigit() or (hi and not hi.isdigit()):
+       return None
+   lo_i = int(lo)
+   hi_i = int(hi) if hi else lo_i
+   if hi_i < lo_i or hi_i >= PORT_SPACE:
+       return None
+   return lo_i, hi_i + 1
+class ServiceBook(_Book):
+   """
+   Resolves `firewall service custom` and `firewall service group` names.
+   Port ranges map to (protocol, destination port) intervals; a service that
+   also restricts source ports or destination addresses is kept opaque.
+   """
+   universe_end = SERVICE_END
+   any = ANY_SERVICE
+   opaque_base = SERVICE_IP_END
+   def __init__(self, custom: Mapping[str, Mapping[str, str]] = None,
+                groups: Mapping[str, Mapping[str, str]] = None):
+       super().__init__()
+       self.custom = custom or {}
+       self.groups = groups or {}
+   def is_broad(self, span: Span) -> bool:
+       """
+       ANY, or every TCP or every UDP destination port (a custom 1-65535
+       service): ANY-SVC for risk scoring only. is_any() is strictly ANY.
+       """
+       return span == ANY_SERVICE or contains(span, ALL_TCP_PORTS) or contains(span, ALL_UDP_PORTS)
+   def _lookup(self, name: str) -> Span:
+       c = self.custom.get(name)
+       if c is not None:
+           span = self._custom(c)
+           return span if span is not None else self.opaque(name)
+       g = self.groups.get(name)
+       if g is not None:
+           return union(self.resolve(m) for m in norm_list_val(g.get("member")))
+       if name.lower() == "all":
+           return ANY_SERVICE
+       return self.opaque(name)
+   def _custom(self, c: Mapping[str, str]) -> Optional[Span]:
+       if _unquote(c.get("iprange")) not in ("", "0.0.0.0") or _unquote(c.get("fqdn")):
+           return None
+       protocol = (_unquote(c.get("protocol")) or "TCP/UDP/SCTP").upper()
+       if protocol == "ALL":
+           return ANY_SERVICE
+       if protocol == "IP":
+           number = _unquote(c.get("protocol-number")) or "0"
+           if not number.isdigit() or int(number) > 255:
+               return None
+           n = int(number)
+           return ANY_SERVICE if n == 0 else (n * PORT_SPACE, (n + 1) * PORT_SPACE)
+       if protocol == "ICMP":
+           icmp_type = _unquote(c.get("icmptype"))
+           icmp_code = _unquote(c.get("icmpcode"))
+           base = PROTO_ICMP * PORT_SPACE
+           if not icmp_type:
+               return (base, base + PORT_SPACE)
+           if not icmp_type.isdigit() or int(icmp_type) > 255:
+               return None
+           base += int(icmp_type) * 256
+           if not icmp_code:
+               return (base, base + 256)
+           if not icmp_code.isdigit() or int(icmp_code) > 255:
+               return None
+           return (base + int(icmp_code), base + int(icmp_code) + 1)
+       if protocol.startswith("TCP/UDP"):
+           intervals: List[Tuple[int, int]] = []
+           for key, proto in _PORTRANGE_KEYS:
+               for token in norm_list_val(c.get(key)):
+                   dst, _, src = token.partition(":")
+                   if src and _port_range(src) not in ((0, PORT_SPACE), (1, PORT_SPACE)):
+                       return None
+                   iv = _port_range(dst)
+                   if iv is None:
+                       return None
+                   intervals.append((proto * PORT_SPACE + iv[0], proto * PORT_SPACE + iv[1]))
+           return normalize(intervals) if intervals else None
+       # ICMP6 and explicit-proxy protocols (HTTP, FTP, CONNECT, SOCKS-*)
+       return None
+# -------------------------
+# Object tables
+# -------------------------
+# Per-VDOM sections policy objects resolve against.
+OBJECT_SECTIONS = (
+   "firewall address", "firewall addrgrp", "firewall vip", "firewall vipgrp",
+   "firewall service custom", "firewall service group",
+)
+class PolicyObjects:
+   """The object books one VDOM's policies resolve against."""
+   __slots__ = ("addresses", "services")
+   def __init__(self, addresses: Optional[AddressBook] = None, services: Optional[ServiceBook] = None):
+       self.addresses = addresses or AddressBook()
+       self.services = services or ServiceBook()
+   @classmethod
+   def from_tables(cls, tables: Mapping[str, Mapping[str, Mapping[str, str]]],
+                   prior: Optional["PolicyObjects"] = None) -> "PolicyObjects":
+       """
+       `tables` maps section paths (OBJECT_SECTIONS) to their `edit` entries.
+       Records built against `prior` stay comparable with the new book's:
+       opaque names keep their synthetic points.
+       """
+       objects = cls(
+           AddressBook(
+               tables.get("firewall address"), tables.get("firewall addrgrp"),
+               tables.get("firewall vip"), tables.get("firewall vipgrp"),
+           ),
+           ServiceBook(tables.get("firewall service custom"), tables.get("firewall service group")),
+       )
+       if prior is not None:
+           objects.addresses.keep_opaque(prior.addresses)
+           objects.services.keep_opaque(prior.services)
+       return objects
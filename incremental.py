@@ -0,0 +1,223 @@
+# incremental.py
+"""
+Incremental re-analysis of a changed config.
+A snapshot keeps what a run needs to be compared against later: one digest per
+global CIS section and, per VDOM, one (policy id, digest) key per policy in
+evaluation order, one digest per address/service object, the object books,
+the PolicyRecords and that VDOM's hygiene rows. `reanalyze` then re-evaluates
+only what changed:
+   - CIS controls and the benchmark comparison when the selected benchmark pack
+     or any section a supported pack reads differs
+   - nothing for a VDOM whose policies, interface roles and the objects its
+     policies use are unchanged: its records and every hygiene field are reused
+   - otherwise records from the first changed position on, that position being
+     the first policy edited, added, removed or moved, or the first one naming
+     a changed object (directly or through a group). Rows about earlier rules
+     only (permissive, shadowed, redundant, union-shadowed, conflicts) are reused.
+Duplicates, consolidation, reachability and segmentation of a changed VDOM are
+whole-rulebase results and are recomputed in full, and the rows that are
+reused still cost a check of every later rule against the earlier ones. The
+saving therefore follows the position of the change: an edit near the end of
+the rulebase is cheap, an edit near the top, or to an object the first rules
+use, costs about a full run.
+The result is identical to analyze_tree() on the new config (tests/test_incremental.py).
+"""
+from __future__ import annotations
+import hashlib
+from typing import Any, Dict, List, Mapping, Optional, Set, Tuple
+from analyzer import (
+   AnalysisResult, assemble_result, benchmark_sections, evaluate_benchmarks, extract_firmware_info, firmware_text,
+   find_consolidations, find_duplicates, find_permissive, find_shadowed_redundant, permissive_order,
+   policy_hygiene, policy_rows, policy_tables, rollup_hygiene, segmentation_matrix, select_benchmark_pack, utm_coverage,
+)
+from config_tree import ConfigNode, ConfigTree
+from fw_objects import OBJECT_SECTIONS, PolicyObjects
+from interface_roles import ROLE_SECTIONS, InterfaceRoles
+from policy_engine import first_coverers
+from policy_matrix import find_union_shadowed
+from policy_overlap import OVERLAP_MAX_ROWS, find_conflicts
+from policy_model import PolicyRecord, TokenPool, build_policy_record, norm_list_val
+from reachability import zone_reachability
+PolicyKey = Tuple[int, bytes]
+# -------------------------
+# Digests
+# -------------------------
+def _feed(h, node: ConfigNode) -> None:
+   h.update(repr(tuple(node.settings.items())).encode("utf-8"))
+   for key, entry in node.entries.items():
+       h.update(b"\x00edit " + key.encode("utf-8") + b"\x00")
+       _feed(h, entry)
+       h.update(b"\x00next\x00")
+   for path, child in node.children.items():
+       h.update(b"\x00config " + path.encode("utf-8") + b"\x00")
+       _feed(h, child)
+       h.update(b"\x00end\x00")
+def node_digest(node: Optional[ConfigNode]) -> bytes:
+   """Digest of a block's settings, entries and nested blocks; b"" for a missing block."""
+   if node is None:
+       return b""
+   h = hashlib.blake2b(digest_size=16)
+   _feed(h, node)
+   return h.digest()
+def section_digests(tree: ConfigTree, paths) -> Dict[str, bytes]:
+   return {path: node_digest(tree.node(path)) for path in paths}
+def _entry_digest(entry: Mapping[str, str]) -> bytes:
+   return hashlib.blake2b(repr(tuple(entry.items())).encode("utf-8"), digest_size=16).digest()
+# Group tables and the settings naming the objects a group's span is built from.
+_GROUP_MEMBERS = (
+   ("firewall addrgrp", ("member", "exclude-member")),
+   ("firewall vipgrp", ("member",)),
+   ("firewall service group", ("member",)),
+)
+# Policy settings naming address or service objects.
+_OBJECT_FIELDS = ("srcaddr", "dstaddr", "service")
+ObjectDigests = Dict[str, Dict[str, bytes]]
+def object_digests(tables: Mapping[str, Mapping[str, Mapping[str, str]]]) -> ObjectDigests:
+   """One digest per entry of every OBJECT_SECTIONS table."""
+   return {path: {name: _entry_digest(entry) for name, entry in tables[path].items()} for path in OBJECT_SECTIONS}
+def changed_objects(old: ObjectDigests, new: ObjectDigests, tables: Mapping[str, Mapping[str, Mapping[str, str]]]) -> Set[str]:
+   """
+   Lower-cased names that may resolve differently: objects added, removed or
+   edited, and every group reaching one of them. Address and service names
+   are pooled, which can only over-report.
+   """
+   changed: Set[str] = set()
+   for path in OBJECT_SECTIONS:
+       a, b = old.get(path, {}), new[path]
+       changed.update(name.lower() for name in a.keys() ^ b.keys())
+       changed.update(name.lower() for name in a.keys() & b.keys() if a[name] != b[name])
+   if not changed:
+       return changed
+   groups = [
+       (name.lower(), {m.lower() for key in keys for m in norm_list_val(entry.get(key))})
+       for path, keys in _GROUP_MEMBERS for name, entry in tables[path].items()
+   ]
+   while True:
+       more = {name for name, members in groups if name not in changed and not members.isdisjoint(changed)}
+       if not more:
+           return changed
+       changed |= more
+def first_reference(settings: List[Mapping[str, str]], names: Set[str]) -> int:
+   """Position of the first policy naming one of `names` (lower-cased); len(settings) if none does."""
+   if names:
+       pool = TokenPool()
+       for k, p in enumerate(settings):
+           if any(t.lower() in names for field in _OBJECT_FIELDS for t in pool.tokens(p.get(field))):
+               return k
+   return len(settings)
+def policy_keys(policies: Mapping[str, Mapping[str, str]]) -> Tuple[List[PolicyKey], List[Mapping[str, str]]]:
+   """
+   (id, digest) per numbered policy plus the settings, both in config sequence
+   (build_policy_records' order): a `move` that only reorders rules changes the keys.
+   """
+   ordered = [(int(k), p) for k, p in policies.items() if str(k).isdigit()]
+   blake2b = hashlib.blake2b
+   keys = [(pid, blake2b(repr(tuple(p.items())).encode("utf-8"), digest_size=16).digest()) for pid, p in ordered]
+   return keys, [p for _, p in ordered]
+def first_difference(old: List[PolicyKey], new: List[PolicyKey]) -> int:
+   n = min(len(old), len(new))
+   k = 0
+   while k < n and old[k] == new[k]:
+       k += 1
+   return k
+# -------------------------
+# Snapshot
+# -------------------------
+class VdomSnapshot:
+   """Per-VDOM state: role section and object digests, policy keys, object books, records and unrolled hygiene fields."""
+   __slots__ = ("sections", "object_digests", "policy_keys", "objects", "records", "hygiene")
+   def __init__(self, sections: Dict[str, bytes], digests: ObjectDigests, keys: List[PolicyKey],
+                objects: PolicyObjects, records: List[PolicyRecord], hygiene: Dict[str, Any]):
+       self.sections = sections
+       self.object_digests = digests
+       self.policy_keys = keys
+       self.objects = objects
+       self.records = records
+       self.hygiene = hygiene
+class AnalysisSnapshot:
+   """
+   Parsed-model summary of one analysis run. `reused` reports what the run took
+   from its predecessor: {"cis": bool, "first_changed_policy": {vdom: position}}.
+   """
+   __slots__ = ("sections", "vdoms", "result", "reused")
+   def __init__(self, sections: Dict[str, bytes], vdoms: Dict[str, VdomSnapshot],
+                result: AnalysisResult, reused: Dict[str, Any]):
+       self.sections = sections
+       self.vdoms = vdoms
+       self.result = result
+       self.reused = reused
+def _reuse_hygiene(prior: Dict[str, Any], records: List[PolicyRecord], k: int, vdom: str, roles: InterfaceRoles) -> Dict[str, Any]:
+   """Policy hygiene fields given that records[:k] equal the prior run's first k records."""
+   prefix = {r.policy_id for r in records[:k]}
+   suffix = records[k:]
+   permissive = [row for row in prior["permissive"] if row["policy_id"] in prefix] + find_permissive(suffix, vdom)
+   permissive.sort(key=permissive_order)
+   coverers = first_coverers(records, k, same_action=False)
+   shadowed, redundant = find_shadowed_redundant(records, k, vdom, coverers)
+   conflicts = [row for row in prior["conflicts"] if row["policy_id"] in prefix]
+   return {
+       "policies_raw": prior["policies_raw"][:k] + policy_rows(suffix, vdom),
+       "permissive": permissive,
+       "duplicates": find_duplicates(records, vdom),
+       "shadowed": [row for row in prior["shadowed"] if row["policy_id"] in prefix] + shadowed,
+       "redundant": [row for row in prior["redundant"] if row["policy_id"] in prefix] + redundant,
+       "union_shadowed": [row for row in prior["union_shadowed"] if row["policy_id"] in prefix] + find_union_shadowed(records, k, vdom, coverers),
+       "segmentation": segmentation_matrix(records, vdom, roles),
+       "reachability": zone_reachability(records, vdom),
+       "consolidation": find_consolidations(records, vdom),
+       "conflicts": conflicts + find_conflicts(records, vdom, k, OVERLAP_MAX_ROWS - len(conflicts)),
+       "sec_profile_coverage": utm_coverage(records, roles),
+   }
+def _reanalyze_vdom(prior: Optional[VdomSnapshot], vdom: str, scope: ConfigTree, global_scope: ConfigTree) -> Tuple[VdomSnapshot, int]:
+   # Records do not depend on interface roles, so a change to these only re-runs the role-based hygiene.
+   sections = section_digests(scope, ROLE_SECTIONS)
+   # Interface roles also read the global interface table of multi-VDOM exports.
+   sections["global system interface"] = node_digest(global_scope.node("system interface"))
+   tables = policy_tables(scope, global_scope)
+   keys, settings = policy_keys(tables["firewall policy"])
+   digests = object_digests(tables)
+   objects = PolicyObjects.from_tables(tables, prior.objects if prior is not None else None)
+   k = 0
+   if prior is not None:
+       k = first_difference(prior.policy_keys, keys)
+       if digests != prior.object_digests:
+           k = min(k, first_reference(settings, changed_objects(prior.object_digests, digests, tables)))
+       if k == len(keys) == len(prior.policy_keys) and sections == prior.sections:
+           return VdomSnapshot(sections, digests, keys, objects, prior.records, prior.hygiene), k
+   pool = TokenPool()
+   records = (prior.records[:k] if k else []) + [build_policy_record(pid, p, pool, objects) for (pid, _), p in zip(keys[k:], settings[k:])]
+   roles = InterfaceRoles.from_tables(tables)
+   hygiene = _reuse_hygiene(prior.hygiene, records, k, vdom, roles) if k else policy_hygiene(records, vdom, roles)
+   return VdomSnapshot(sections, digests, keys, objects, records, hygiene), k
+def reanalyze(
+   prior: Optional[AnalysisSnapshot],
+   tree: ConfigTree,
+   benchmark_family: str = "Auto (from firmware)",
+   benchmark_version: str = "Auto",
+   compare_packs: bool = False
+) -> AnalysisSnapshot:
+   """
+   Analyzes `tree`, reusing whatever `prior` (a snapshot of an earlier version
+   of the same device config) already computed. With prior=None this is a full run.
+   VDOMs are matched by name and re-analyzed in-process.
+   """
+   scope = tree.global_scope()
+   selected = select_benchmark_pack(extract_firmware_info(firmware_text(scope))[1], benchmark_family, benchmark_version)
+   sections = section_digests(scope, benchmark_sections())
+   # Zones and static routes feed the benchmark rules per VDOM.
+   for name, vscope in tree.vdoms().items():
+       if vscope is not scope:
+           sections.update({f"vdom {name} {path}": node_digest(vscope.node(path)) for path in benchmark_sections()})
+   sections["benchmark pack"] = f"{selected.key}|{selected.selection}|{compare_packs}".encode("utf-8")
+   cis_same = prior is not None and prior.sections == sections
+   if cis_same:
+       cis, comparison = prior.result.cis, prior.result.benchmark_comparison
+   else:
+       cis, comparison = evaluate_benchmarks(tree, benchmark_family, benchmark_version, compare_packs)
+   vdoms: Dict[str, VdomSnapshot] = {}
+   first_changed: Dict[str, int] = {}
+   for name, vscope in tree.vdoms().items():
+       vdoms[name], first_changed[name] = _reanalyze_vdom(prior.vdoms.get(name) if prior else None, name, vscope, scope)
+   hygiene = rollup_hygiene({name: v.hygiene for name, v in vdoms.items()})
+   result = assemble_result(scope, cis, hygiene, benchmark_family, benchmark_version, comparison)
+   return AnalysisSnapshot(sections, vdoms, result, {"cis": cis_same, "first_changed_policy": first_changed})
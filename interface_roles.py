@@ -0,0 +1,93 @@
+# interface_roles.py
+"""
+Interface/zone role index: wan, lan, dmz or undefined per interface and zone
+name, built once per VDOM so analyzers look roles up instead of scanning names.
+An interface's role comes from, in order:
+   - its `set role wan|lan|dmz` attribute ("undefined" is the FortiOS default
+     and carries no information)
+   - carrying a default route (`router static` to 0.0.0.0/0, or an SD-WAN zone
+     used by one): wan
+   - a naming hint (untrust/wan/internet/outside ..., dmz, trust/lan/inside ...)
+A zone takes the strongest role among its members (wan > dmz > lan), or its own
+naming hint when no member has one. Names no section declares (policies can
+reference interfaces of a trimmed export) fall back to the naming hint, which
+is memoized per name.
+"""
+from __future__ import annotations
+import re
+from typing import Dict, List, Mapping, Optional
+ROLE_WAN = "wan"
+ROLE_LAN = "lan"
+ROLE_DMZ = "dmz"
+ROLE_UNDEFINED = "undefined"
+# Roles that count as inside the perimeter for east-west checks.
+INTERNAL_ROLES = frozenset((ROLE_LAN, ROLE_DMZ))
+# Sections the index reads ("system interface" lives in the global scope of multi-VDOM exports).
+ROLE_SECTIONS = ("system interface", "system zone", "router static")
+# Strongest first: a zone with any WAN member is internet-facing.
+_ROLE_RANK = {ROLE_WAN: 0, ROLE_DMZ: 1, ROLE_LAN: 2}
+# Name hints: a word starting the name or following a non-letter ("port1-untrust", "wan2", not "vlan10").
+_NAME_HINTS = (
+   (ROLE_WAN, re.compile(r"(?<![a-z])(?:untrust|wan|internet|outside|isp|external)")),
+   (ROLE_DMZ, re.compile(r"(?<![a-z])dmz")),
+   (ROLE_LAN, re.compile(r"(?<![a-z])(?:trust|lan|inside|internal)")),
+)
+_DEFAULT_ROUTES = ("", "0.0.0.0 0.0.0.0", "0.0.0.0/0")
+def _value(settings: Mapping[str, str], key: str) -> str:
+   return settings.get(key, "").strip('"').strip()
+def _names(settings: Mapping[str, str], key: str) -> List[str]:
+   return [a or b for a, b in re.findall(r'"([^"]*)"|(\S+)', settings.get(key, ""))]
+def name_role(name: str) -> str:
+   """Role suggested by an interface or zone name alone."""
+   lowered = name.lower()
+   for role, pattern in _NAME_HINTS:
+       if pattern.search(lowered):
+           return role
+   return ROLE_UNDEFINED
+class InterfaceRoles:
+   """Lower-cased interface/zone name -> role for one VDOM."""
+   __slots__ = ("roles",)
+   def __init__(self, interfaces: Optional[Mapping[str, Mapping[str, str]]] = None,
+                zones: Optional[Mapping[str, Mapping[str, str]]] = None,
+                routes: Optional[Mapping[str, Mapping[str, str]]] = None):
+       self.roles: Dict[str, str] = {}
+       default_route = set()
+       for r in (routes or {}).values():
+           if _value(r, "dst") in _DEFAULT_ROUTES and _value(r, "status") != "disable":
+               for key in ("device", "sdwan-zone"):
+                   default_route.update(n.lower() for n in _names(r, key))
+               if _value(r, "virtual-wan-link") == "enable" or _value(r, "sdwan") == "enable":
+                   default_route.add("virtual-wan-link")
+       for name, i in (interfaces or {}).items():
+           key = name.strip('"').lower()
+           role = _value(i, "role").lower()
+           if role in _ROLE_RANK:
+               self.roles[key] = role
+           elif key in default_route:
+               self.roles[key] = ROLE_WAN
+           else:
+               self.roles[key] = name_role(key)
+       for name, z in (zones or {}).items():
+           key = name.strip('"').lower()
+           members = [self.role(n) for n in _names(z, "interface")]
+           ranked = sorted((r for r in members if r in _ROLE_RANK), key=_ROLE_RANK.__getitem__)
+           if key in default_route:
+               self.roles[key] = ROLE_WAN
+           elif ranked:
+               self.roles[key] = ranked[0]
+           else:
+               self.roles[key] = name_role(key)
+       for key in default_route:
+           if key not in self.roles:
+               self.roles[key] = ROLE_WAN
+   @classmethod
+   def from_tables(cls, tables: Mapping[str, Mapping[str, Mapping[str, str]]]) -> "InterfaceRoles":
+       return cls(tables.get("system interface"), tables.get("system zone"), tables.get("router static"))
+   def role(self, name: str) -> str:
+       key = name.lower()
+       role = self.roles.get(key)
+       if role is None:
+           role = self.roles[key] = name_role(key)
+       return role
+   def is_wan(self, name: str) -> bool:
+       return self.role(name) == ROLE_WAN
@@ -0,0 +1,981 @@
+# perf_bench.py
+"""
+Performance benchmarks on synthetic FortiGate configs.
+Usage:
+   python perf_bench.py sections --policies 100000
+   python perf_bench.py tree --policies 100000
+   python perf_bench.py ingest --policies 650000     # ~200 MB export
+   python perf_bench.py records --policies 100000
+   python perf_bench.py cache --policies 2000
+   python perf_bench.py incremental --policies 5000    # also checks output == full run
+   python perf_bench.py objects --hosts 50000 --groups 5000
+   python perf_bench.py shadow --sizes 1000 10000 50000 100000
+   python perf_bench.py matrix --sizes 1000 2000 5000
+   python perf_bench.py lookup --policies 100000 --flows 1000000
+   python perf_bench.py logs --files 4 --lines 500000
+   python perf_bench.py permissive --policies 100000
+   python perf_bench.py reach --zones 100 300 600
+   python perf_bench.py consolidate --sizes 10000 50000 100000
+   python perf_bench.py overlap --sizes 2000 10000 50000
+   python perf_bench.py duplicates --sizes 2000 20000 100000 --depth 8
+   python perf_bench.py packs --controls 10 250 2000
+   python perf_bench.py vdoms --vdoms 20 --policies 2000
+   python perf_bench.py lazy --policies 100000 --vdoms 10   # also checks output == full parse
+"""
+from __future__ import annotations
+import argparse
+import gzip
+import multiprocessing
+import os
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+import analyzer
+from analysis_cache import AnalysisCache
+from benchmark_loader import load_pack_file, load_supported_packs
+from control_engine import evaluate_pack, evaluate_packs, rule_context
+from policy_model import PolicyRecord, build_policy_records, has_utm, norm_list_val
+from config_tree import ConfigNode, load_config_tree, parse_config_tree
+from incremental import reanalyze
+from policy_engine import first_coverers
+from policy_matrix import PolicyMatrix, find_union_shadowed
+from policy_overlap import find_conflicts, overlapping_pairs
+from policy_lookup import PolicyLookup
+from reachability import ZoneGraph
+from traffic_logs import apply_hits, scan_logs
+from fw_objects import PORT_SPACE, contains, overlaps, union
+# -------------------------
+# Synthetic config
+# -------------------------
+SERVICES = ["HTTP", "HTTPS", "SSH", "DNS", "NTP", "SMTP", "RDP", "ALL", "PING"]
+INTERFACES = ["port1", "port2", "port3", "port4"]
+def synthetic_config(n_policies: int, n_hosts: int = 2000, n_groups: int = 200, seed: int = 7) -> str:
+   """
+   Builds a single-VDOM FortiOS export with system sections, address objects,
+   groups, custom services and `n_policies` firewall policies.
+   """
+   rnd = random.Random(seed)
+   out: List[str] = [
+       "#config-version=FGVM64-7.00-FW-build0231-210201:opmode=0:vdom=0:user=admin\n",
+       "#conf_file_ver=1\n#buildno=0231\n#global_vdom=1\n",
+       "config system global\n    set hostname \"FGT-BENCH\"\n    set pre-login-banner enable\n"
+       "    set admintimeout 10\nend\n",
+       "config system password-policy\n    set status enable\n    set minimum-length 12\nend\n",
+       "config system interface\n",
+   ]
+   for i, name in enumerate(INTERFACES, 1):
+       role = "wan" if name == "port1" else "lan"
+       out.append(f"    edit \"{name}\"\n        set vdom \"root\"\n        set ip 10.{i}.0.1 255.255.255.0\n"
+                  f"        set allowaccess ping https ssh\n        set role {role}\n    next\n")
+   out.append("end\n")
+   out.append("config system ntp\n    set ntpsync enable\n    set type custom\nend\n")
+   out.append("config log syslogd setting\n    set status enable\n    set server \"10.9.9.9\"\nend\n")
+   _policy_sections(out, rnd, n_policies, n_hosts, n_groups)
+   out.append(SNMP_SECTION)
+   return "".join(out)
+SNMP_SECTION = ("config system snmp user\n    edit \"mon\"\n        set security-level auth-priv\n"
+                "        set auth-proto sha256\n        set priv-proto aes\n    next\nend\n")
+def _policy_sections(out: List[str], rnd: random.Random, n_policies: int, n_hosts: int, n_groups: int) -> None:
+   """Address objects, groups, custom services and policies: the per-VDOM part of an export."""
+   out.append("config firewall address\n    edit \"all\"\n    next\n")
+   for h in range(n_hosts):
+       out.append(f"    edit \"h{h}\"\n        set subnet 10.{(h >> 8) & 255}.{h & 255}.10 255.255.255.255\n    next\n")
+   for n in range(n_hosts // 50):
+       out.append(f"    edit \"net{n}\"\n        set subnet 10.{n}.0.0 255.255.0.0\n    next\n")
+   out.append("end\n")
+   out.append("config firewall addrgrp\n")
+   for g in range(n_groups):
+       members = " ".join(f"\"h{rnd.randrange(n_hosts)}\"" for _ in range(rnd.randint(2, 6)))
+       out.append(f"    edit \"grp{g}\"\n        set member {members}\n    next\n")
+   out.append("end\n")
+   out.append("config firewall service custom\n"
+              "    edit \"ALL\"\n        set protocol IP\n    next\n"
+              "    edit \"HTTP\"\n        set tcp-portrange 80\n    next\n"
+              "    edit \"HTTPS\"\n        set tcp-portrange 443\n    next\n"
+              "    edit \"SSH\"\n        set tcp-portrange 22\n    next\n"
+              "    edit \"DNS\"\n        set tcp-portrange 53\n        set udp-portrange 53\n    next\n"
+              "    edit \"NTP\"\n        set udp-portrange 123\n    next\n"
+              "    edit \"SMTP\"\n        set tcp-portrange 25\n    next\n"
+              "    edit \"RDP\"\n        set tcp-portrange 3389\n    next\n"
+              "    edit \"PING\"\n        set protocol ICMP\n        set icmptype 8\n    next\n"
+              "end\n")
+   out.append("config firewall policy\n")
+   for pid in range(1, n_policies + 1):
+       src_i, dst_i = rnd.sample(INTERFACES, 2)
+       r = rnd.random()
+       if r < 0.02:
+           src, dst = "\"all\"", "\"all\""
+       elif r < 0.30:
+           src, dst = f"\"grp{rnd.randrange(n_groups)}\"", f"\"h{rnd.randrange(n_hosts)}\""
+       elif r < 0.45:
+           src, dst = f"\"net{rnd.randrange(n_hosts // 50)}\"", "\"all\""
+       else:
+           src, dst = f"\"h{rnd.randrange(n_hosts)}\"", f"\"h{rnd.randrange(n_hosts)}\" \"h{rnd.randrange(n_hosts)}\""
+       svc = " ".join(f"\"{s}\"" for s in rnd.sample(SERVICES[:7], rnd.randint(1, 2)))
+       if rnd.random() < 0.01:
+           svc = "\"ALL\""
+       action = "deny" if rnd.random() < 0.1 else "accept"
+       out.append(f"    edit {pid}\n        set name \"rule-{pid}\"\n        set srcintf \"{src_i}\"\n"
+                  f"        set dstintf \"{dst_i}\"\n        set srcaddr {src}\n        set dstaddr {dst}\n"
+                  f"        set action {action}\n        set schedule \"always\"\n        set service {svc}\n")
+       if rnd.random() < 0.6:
+           out.append("        set logtraffic all\n")
+       if action == "accept" and rnd.random() < 0.4:
+           out.append("        set utm-status enable\n        set av-profile \"default\"\n"
+                      "        set ips-sensor \"default\"\n")
+       out.append("    next\n")
+   out.append("end\n")
+def multi_vdom_config(n_vdoms: int, n_policies: int, n_hosts: int = 500, n_groups: int = 50, seed: int = 7) -> str:
+   """
+   Builds a multi-VDOM export: system sections under `config global` and
+   `n_policies` policies (with their own objects) in each of `n_vdoms` VDOMs.
+   """
+   rnd = random.Random(seed)
+   names = [f"vd{i}" for i in range(n_vdoms)]
+   out: List[str] = [
+       "#config-version=FGVM64-7.00-FW-build0231-210201:opmode=0:vdom=1:user=admin\n",
+       "#conf_file_ver=1\n#buildno=0231\n#global_vdom=1\n",
+       "config vdom\n", *(f"edit {name}\nnext\n" for name in names), "end\n",
+       "config global\n",
+       "config system global\n    set hostname \"FGT-VDOM-BENCH\"\n    set pre-login-banner enable\nend\n",
+       "config system interface\n",
+   ]
+   for i, name in enumerate(INTERFACES, 1):
+       out.append(f"    edit \"{name}\"\n        set vdom \"{names[i % n_vdoms]}\"\n        set ip 10.{i}.0.1 255.255.255.0\n    next\n")
+   out.append("end\n")
+   out.append(SNMP_SECTION)
+   out.append("end\n")
+   for name in names:
+       out.append(f"config vdom\nedit {name}\n")
+       _policy_sections(out, rnd, n_policies, n_hosts, n_groups)
+       out.append("next\nend\n")
+   return "".join(out)
+# -------------------------
+# Helpers
+# -------------------------
+def best_of(fn: Callable[[], object], repeat: int = 3) -> float:
+   best = float("inf")
+   for _ in range(repeat):
+       t0 = time.perf_counter()
+       fn()
+       best = min(best, time.perf_counter() - t0)
+   return best
+def report(label: str, seconds: float, baseline: float | None = None) -> None:
+   speedup = f"  x{baseline / seconds:,.1f}" if baseline else ""
+   print(f"  {label:<34}{seconds * 1000:>12,.1f} ms{speedup}")
+def peak_mb(fn: Callable[[], object]) -> Tuple[float, float]:
+   """(peak, retained) Python heap in MB while running `fn` and holding its result."""
+   tracemalloc.start()
+   result = fn()
+   retained, peak = tracemalloc.get_traced_memory()
+   tracemalloc.stop()
+   del result
+   return peak / 1e6, retained / 1e6
+def write_traffic_log(path: str, n_lines: int, n_policies: int, seed: int = 3) -> int:
+   """
+   FortiOS 7 style traffic log lines for policies 1..n_policies (skewed towards
+   low ids), gzipped for *.gz. Returns the uncompressed size.
+   """
+   rnd = random.Random(seed)
+   opener = gzip.open if path.endswith(".gz") else open
+   size = 0
+   with opener(path, "wt", encoding="utf-8") as f:
+       for i in range(n_lines):
+           pid = min(int(rnd.paretovariate(0.6)), n_policies)
+           line = (f'<189>date=2024-05-01 time=12:00:00 devname="FGT-BENCH" devid="FGVM01" '
+                   f'eventtime={1714564800000000000 + i * 1000000} tz="+0000" logid="0000000013" type="traffic" '
+                   f'subtype="forward" level="notice" vd="root" srcip=10.0.{i & 255}.10 srcport={1024 + i % 60000} '
+                   f'srcintf="port2" srcintfrole="lan" dstip=10.1.2.10 dstport=443 dstintf="port1" dstintfrole="wan" '
+                   f'sessionid={i} proto=6 action="close" policyid={pid} policytype="policy" service="HTTPS" '
+                   f'duration=3 sentbyte={rnd.randrange(100000)} rcvdbyte={rnd.randrange(100000)} sentpkt=5 rcvdpkt=6\n')
+           size += f.write(line)
+   return size
+def config_file(n_policies: int) -> str:
+   fd, path = tempfile.mkstemp(suffix=".conf")
+   with os.fdopen(fd, "w", encoding="utf-8") as f:
+       f.write(synthetic_config(n_policies))
+   return path
+# -------------------------
+# Reference parsers (the flat-text path parse_config_tree replaced)
+# -------------------------
+# Column-0 `config ...` / `end` lines. The leading "\n" literal lets the regex engine
+# jump between newlines instead of probing every offset for "^".
+_SECTION_LINE_RE = re.compile(r"\n(config [^\r\n]*|end)(?=[ \t\r]*(?:\n|\Z))")
+_FIRST_LINE_RE = re.compile(r"(config [^\r\n]*|end)(?=[ \t\r]*(?:\n|\Z))")
+class SectionIndex:
+   """
+   Offset index of every `config ... end` section that starts at column 0,
+   built in a single sweep over the text. Lookups slice the original string.
+   """
+   __slots__ = ("text", "spans")
+   def __init__(self, text: str):
+       self.text = text
+       self.spans: Dict[str, List[Tuple[int, int]]] = {}
+       stack: List[Tuple[str, int]] = []
+       m = _FIRST_LINE_RE.match(text)
+       first = [(m.group(1), m.start(1), m.end(1))] if m else []
+       rest = ((m.group(1), m.start(1), m.end(1)) for m in _SECTION_LINE_RE.finditer(text))
+       for matches in (first, rest):
+           for token, start, end in matches:
+               if token == "end":
+                   if stack:
+                       header, hstart = stack.pop()
+                       self.spans.setdefault(header, []).append((hstart, end))
+               else:
+                   stack.append((token.rstrip(), start))
+   def headers(self) -> List[str]:
+       return list(self.spans)
+   def block(self, section_header: str) -> str:
+       spans = self.spans.get(section_header)
+       if not spans:
+           return ""
+       start, end = spans[0]
+       return self.text[start:end]
+def parse_config_edit_block(section_header: str, text: str) -> Dict[str, Dict[str, str]]:
+   """
+   Parse:
+     config X
+       edit "name" / edit 1
+         set k v
+       next
+     end
+   """
+   block = SectionIndex(text).block(section_header)
+   if not block:
+       return {}
+   items: Dict[str, Dict[str, str]] = {}
+   cur_key = None
+   cur: Dict[str, str] = {}
+   for raw in block.splitlines():
+       line = raw.strip()
+       if line.startswith("edit "):
+           if cur_key is not None:
+               items[cur_key] = cur
+           cur_key = line[5:].strip().strip('"')
+           cur = {}
+       elif line.startswith("set ") and cur_key is not None:
+           parts = line.split(None, 2)
+           if len(parts) == 3:
+               cur[parts[1]] = parts[2].strip()
+       elif line == "next":
+           if cur_key is not None:
+               items[cur_key] = cur
+               cur_key = None
+               cur = {}
+       elif line == "end":
+           break
+   if cur_key is not None:
+       items[cur_key] = cur
+   return items
+# -------------------------
+# Benchmarks
+# -------------------------
+ANALYZER_SECTIONS = [
+   "config system global", "config system password-policy", "config system interface",
+   "config system snmp user", "config system ntp", "config log syslogd setting",
+   "config log fortianalyzer setting", "config system central-management", "config firewall policy",
+]
+def _legacy_extract_block(section_header: str, text: str) -> str:
+   m = re.search(rf"(?ms)^{re.escape(section_header)}\s*(.*?)^end\s*$", text)
+   return m.group(0) if m else ""
+def bench_sections(args) -> None:
+   text = synthetic_config(args.policies)
+   print(f"sections: {args.policies:,} policies, {len(text) / 1e6:.1f} MB")
+   def legacy():
+       return [_legacy_extract_block(h, text) for h in ANALYZER_SECTIONS]
+   def indexed():
+       index = SectionIndex(text)
+       return [index.block(h) for h in ANALYZER_SECTIONS]
+   assert [b.rstrip() for b in legacy()] == indexed()
+   base = best_of(legacy, args.repeat)
+   report("regex extract_block x9", base)
+   report("SectionIndex + 9 slices", best_of(indexed, args.repeat), base)
+def bench_tree(args) -> None:
+   path = config_file(args.policies)
+   print(f"tree: {args.policies:,} policies, {os.path.getsize(path) / 1e6:.1f} MB file")
+   def flat():
+       with open(path, encoding="utf-8", errors="ignore") as f:
+           text = f.read()
+       return parse_config_edit_block("config firewall policy", text)
+   def streamed():
+       with open(path, encoding="utf-8", errors="ignore") as f:
+           return parse_config_tree(f)
+   try:
+       for label, fn in (("read() + parse_config_edit_block", flat), ("parse_config_tree(file)", streamed)):
+           peak, kept = peak_mb(fn)
+           print(f"  {label:<34}peak {peak:>8,.1f} MB   retained {kept:>8,.1f} MB")
+       base = best_of(flat, args.repeat)
+       report("read() + parse_config_edit_block", base)
+       report("parse_config_tree(file)", best_of(streamed, args.repeat), base)
+   finally:
+       os.remove(path)
+def _peak_rss_kb() -> int:
+   # VmHWM is reset by exec; ru_maxrss is inherited from the parent and would hide the growth.
+   with open("/proc/self/status") as f:
+       for line in f:
+           if line.startswith("VmHWM:"):
+               return int(line.split()[1])
+   return 0
+def _ingest_child(mode: str, path: str, out) -> None:
+   before = _peak_rss_kb()
+   if mode == "read":
+       with open(path, "rb") as f:
+           tree = parse_config_tree(f.read().decode("utf-8", errors="ignore"))
+   else:
+       tree = load_config_tree(path)
+   out.put(((_peak_rss_kb() - before) / 1024, len(tree.items("firewall policy"))))
+def bench_ingest(args) -> None:
+   path = config_file(args.policies)
+   size = os.path.getsize(path) / 1e6
+   print(f"ingest: {args.policies:,} policies, {size:.1f} MB file (peak RSS growth per fresh process, Linux)")
+   try:
+       _, model = peak_mb(lambda: load_config_tree(path))
+       print(f"  {'parsed model (tracemalloc)':<34}{model:>10,.1f} MB")
+       ctx = multiprocessing.get_context("spawn")
+       for mode, label in (("read", "read().decode() + parse"), ("mmap", "load_config_tree (mmap)")):
+           q = ctx.Queue()
+           proc = ctx.Process(target=_ingest_child, args=(mode, path, q))
+           proc.start()
+           rss, n = q.get()
+           proc.join()
+           print(f"  {label:<34}{rss:>10,.1f} MB   x{rss / model:.1f} model")
+   finally:
+       os.remove(path)
+# Dict-based policy analytics as they were before PolicyRecord, kept as the baseline.
+def _legacy_is_all(vals) -> bool:
+   return any(x.lower() == "all" for x in (vals or []))
+def _legacy_score(p) -> int:
+   src, dst, svc = norm_list_val(p.get("srcaddr")), norm_list_val(p.get("dstaddr")), norm_list_val(p.get("service"))
+   score = 0
+   if p.get("action", "").strip('"').lower() == "accept":
+       if _legacy_is_all(src) and _legacy_is_all(dst) and _legacy_is_all(svc):
+           score += 10
+       elif (_legacy_is_all(src) and _legacy_is_all(dst)) or (_legacy_is_all(dst) and _legacy_is_all(svc)) \
+               or (_legacy_is_all(src) and _legacy_is_all(svc)):
+           score += 7
+   if p.get("logtraffic", "").strip('"').lower() in ("disable", "none", ""):
+       score += 2
+   if not has_utm(p):
+       score += 2
+   return score
+def _legacy_signature(p) -> tuple:
+   return tuple(tuple(sorted(norm_list_val(p.get(k)))) for k in ("srcintf", "dstintf", "srcaddr", "dstaddr", "service")) \
+       + (p.get("schedule", ""), p.get("action", ""), p.get("status", "enable"))
+def _legacy_covers(prev, curr) -> bool:
+   def covers_list(a, b):
+       sp, sc = {x.lower() for x in a}, {x.lower() for x in b}
+       return "all" in sp or sp == sc
+   return all(covers_list(norm_list_val(prev.get(k)), norm_list_val(curr.get(k))) for k in ("srcaddr", "dstaddr", "service")) \
+       and prev.get("action", "").lower() == curr.get("action", "").lower()
+def _legacy_linear(policies) -> None:
+   ids = sorted(int(k) for k in policies if k.isdigit())
+   rows = [{k: " ".join(norm_list_val(policies[str(i)].get(k))) for k in ("srcintf", "dstintf", "srcaddr", "dstaddr", "service")} for i in ids]
+   perm = [i for i in ids if _legacy_score(policies[str(i)]) >= 5]
+   perm_rows = [{k: " ".join(norm_list_val(policies[str(i)].get(k))) for k in ("srcintf", "dstintf", "srcaddr", "dstaddr", "service")} for i in perm]
+   sigs = {}
+   for i in ids:
+       sigs.setdefault(_legacy_signature(policies[str(i)]), []).append(i)
+   seg = {}
+   for i in ids:
+       p = policies[str(i)]
+       if p.get("action", "").lower() == "accept":
+           for s_ in norm_list_val(p.get("srcintf")):
+               for d in norm_list_val(p.get("dstintf")):
+                   seg[(s_, d)] = seg.get((s_, d), 0) + 1
+   inet = [i for i in ids if any("untrust" in x.lower() for x in norm_list_val(policies[str(i)].get("dstintf")))]
+   return rows, perm_rows, sigs, seg, inet
+def _legacy_shadow(policies) -> list:
+   ids = sorted(int(k) for k in policies if k.isdigit())
+   out = []
+   for idx, pid in enumerate(ids):
+       for prev in ids[:idx]:
+           if _legacy_covers(policies[str(prev)], policies[str(pid)]):
+               out.append(pid)
+               break
+   return out
+def _legacy_permissive(records) -> list:
+   """Per-policy scoring with one full row copy per permissive policy, as find_permissive was."""
+   out = []
+   for p in records:
+       score, reasons = 0, []
+       if p.accept:
+           if p.any_src and p.any_dst and p.broad_svc:
+               score += 10; reasons.append("ANY-ANY-ANY ACCEPT")
+           elif p.any_src and p.any_dst:
+               score += 7; reasons.append("ANY-ANY ACCEPT")
+           elif p.any_dst and p.broad_svc:
+               score += 7; reasons.append("ANY-DST + ANY-SVC")
+           elif p.any_src and p.broad_svc:
+               score += 7; reasons.append("ANY-SRC + ANY-SVC")
+       if not p.logged:
+           score += 2; reasons.append("Logging not enabled")
+       if not p.utm:
+           score += 2; reasons.append("No UTM profiles detected")
+       sev = "CRITICAL" if score >= 10 else "HIGH" if score >= 8 else "MEDIUM" if score >= 5 else "LOW"
+       if score >= 5:
+           out.append({
+               "vdom": "root", "policy_id": p.policy_id, "name": p.name,
+               "srcintf": " ".join(p.srcintf), "dstintf": " ".join(p.dstintf), "srcaddr": " ".join(p.srcaddr),
+               "dstaddr": " ".join(p.dstaddr), "service": " ".join(p.service), "action": p.action,
+               "logtraffic": p.logtraffic, "utm_detected": "YES" if p.utm else "NO",
+               "risk_score": score, "severity": sev, "reasons": ", ".join(reasons),
+           })
+   out.sort(key=analyzer.permissive_order)
+   return out
+def bench_permissive(args) -> None:
+   records = analyzer.vdom_records(analyzer.policy_tables(parse_config_tree(synthetic_config(args.policies))))
+   print(f"permissive: {len(records):,} policies")
+   legacy = _legacy_permissive(records)
+   columnar = analyzer.find_permissive(records)
+   legacy_mb = peak_mb(lambda: _legacy_permissive(records))[1]
+   columnar_mb = peak_mb(lambda: analyzer.find_permissive(records))[1]
+   base = best_of(lambda: _legacy_permissive(records), args.repeat)
+   report("per-policy scoring + row copies", base)
+   report("columnar scoring + key rows", best_of(lambda: analyzer.find_permissive(records), args.repeat), base)
+   print(f"  rows: {legacy_mb:,.1f} MB -> {columnar_mb:,.1f} MB ({len(columnar):,} permissive)")
+   result = analyzer.AnalysisResult({}, {}, {}, [], analyzer.policy_rows(records), columnar, [], [], [], [], {}, {})
+   assert [{k: row[k] for k in legacy[0]} for row in analyzer.permissive_view(result)] == legacy
+def _record_linear(records) -> None:
+   return (analyzer.policy_rows(records), analyzer.find_permissive(records), analyzer.find_duplicates(records),
+           analyzer.segmentation_matrix(records), analyzer.utm_coverage(records))
+def bench_records(args) -> None:
+   tree = parse_config_tree(synthetic_config(args.policies))
+   policies = tree.items("firewall policy")
+   print(f"records: {args.policies:,} policies")
+   _, dict_mb = peak_mb(lambda: parse_config_tree(synthetic_config(args.policies)).items("firewall policy"))
+   _, rec_mb = peak_mb(lambda: build_policy_records(policies))
+   print(f"  {'policy dicts (parsed settings)':<34}{dict_mb:>10,.1f} MB")
+   print(f"  {'PolicyRecord list':<34}{rec_mb:>10,.1f} MB")
+   base = best_of(lambda: _legacy_linear(policies), args.repeat)
+   report("dict analytics (linear passes)", base)
+   records = build_policy_records(policies)
+   report("build records", best_of(lambda: build_policy_records(policies), args.repeat))
+   report("record analytics (linear passes)", best_of(lambda: _record_linear(records), args.repeat), base)
+   small = dict(list(policies.items())[:args.shadow_policies])
+   small_records = build_policy_records(small)
+   base = best_of(lambda: _legacy_shadow(small), 1)
+   report(f"dict shadowed ({args.shadow_policies:,})", base)
+   report(f"record shadowed ({args.shadow_policies:,})", best_of(lambda: analyzer.find_shadowed(small_records), 1), base)
+def bench_cache(args) -> None:
+   data = synthetic_config(args.policies).encode("utf-8")
+   print(f"cache: {args.policies:,} policies, {len(data) / 1e6:,.1f} MB")
+   with tempfile.TemporaryDirectory() as disk_dir:
+       cache = AnalysisCache(max_entries=4, disk_dir=disk_dir)
+       t0 = time.perf_counter()
+       cache.analyze(data)
+       miss = time.perf_counter() - t0
+       report("miss (parse + analyze + store)", miss)
+       report("memory hit", best_of(lambda: cache.analyze(data), args.repeat), miss)
+       report("disk hit (fresh cache)", best_of(lambda: AnalysisCache(disk_dir=disk_dir).analyze(data), args.repeat), miss)
+       print(f"  stats {cache.stats}")
+def _edit_policy(pos: float, key: str, value: str):
+   def mutate(tree):
+       entries = tree.node("firewall policy").entries
+       pid = sorted(entries, key=int)[int(pos * (len(entries) - 1))]
+       entries[pid].settings[key] = value
+   return mutate
+def _drop_policy(pos: float):
+   def mutate(tree):
+       entries = tree.node("firewall policy").entries
+       del entries[sorted(entries, key=int)[int(pos * (len(entries) - 1))]]
+   return mutate
+def _append_policy(tree) -> None:
+   entries = tree.node("firewall policy").entries
+   template = entries[max(entries, key=int)]
+   node = ConfigNode(str(max(map(int, entries)) + 1))
+   node.settings = dict(template.settings, action="accept", srcaddr='"all"', dstaddr='"all"')
+   entries[node.name] = node
+def _edit_address(tree) -> None:
+   tree.node("firewall address").entries["net3"].settings["subnet"] = "10.3.0.0 255.255.255.0"
+def _edit_service(tree) -> None:
+   tree.node("firewall service custom").entries["HTTP"].settings["tcp-portrange"] = "80 8080"
+def _edit_global(tree) -> None:
+   tree.node("system global").settings["admintimeout"] = "5"
+INCREMENTAL_SCENARIOS = [
+   ("unchanged", lambda tree: None),
+   ("edit policy at 95%", _edit_policy(0.95, "action", "deny")),
+   ("edit policy at 50%", _edit_policy(0.50, "service", '"ALL"')),
+   ("drop policy at 90%", _drop_policy(0.90)),
+   ("append any-any policy", _append_policy),
+   ("system global change", _edit_global),
+   ("address object change", _edit_address),
+   ("service object change", _edit_service),
+   ("edit first policy", _edit_policy(0.0, "logtraffic", "disable")),
+]
+def bench_incremental(args) -> None:
+   text = synthetic_config(args.policies)
+   print(f"incremental: {args.policies:,} policies")
+   base = reanalyze(None, parse_config_tree(text))
+   for label, mutate in INCREMENTAL_SCENARIOS:
+       tree = parse_config_tree(text)
+       mutate(tree)
+       t0 = time.perf_counter()
+       full = analyzer.analyze_tree(tree)
+       full_s = time.perf_counter() - t0
+       t0 = time.perf_counter()
+       snap = reanalyze(base, tree)
+       inc_s = time.perf_counter() - t0
+       assert asdict(snap.result) == asdict(full), label
+       print(f"  {label:<24} full {full_s * 1000:>9,.1f} ms   incremental {inc_s * 1000:>9,.1f} ms  x{full_s / inc_s:,.1f}"
+             f"   (cis reused={snap.reused['cis']}, first changed={snap.reused['first_changed_policy']['root']:,})")
+   print("  outputs identical to full runs")
+def bench_vdoms(args) -> None:
+   tree = parse_config_tree(multi_vdom_config(args.vdoms, args.policies))
+   print(f"vdoms: {args.vdoms} VDOMs x {args.policies:,} policies, {os.cpu_count()} CPUs")
+   serial = analyzer.analyze_tree(tree, max_workers=1)
+   base = best_of(lambda: analyzer.analyze_tree(tree, max_workers=1), args.repeat)
+   report("serial", base)
+   parallel = analyzer.analyze_tree(tree, max_workers=args.workers)
+   report(f"process pool (max_workers={args.workers})", best_of(lambda: analyzer.analyze_tree(tree, max_workers=args.workers), args.repeat), base)
+   assert asdict(serial) == asdict(parallel)
+   print(f"  policies analyzed {serial.sec_profile_coverage['total_policies']:,}, outputs identical")
+def bench_logs(args) -> None:
+   with tempfile.TemporaryDirectory() as tmp:
+       paths = [os.path.join(tmp, f"traffic{i}.log" + (".gz" if i % 2 else "")) for i in range(args.files)]
+       raw = sum(write_traffic_log(path, args.lines, args.policies, seed=i) for i, path in enumerate(paths))
+       print(f"logs: {args.files} files x {args.lines:,} lines (~{raw / 1e6:,.0f} MB uncompressed), {os.cpu_count()} CPUs")
+       t0 = time.perf_counter()
+       serial = scan_logs(paths, max_workers=1)
+       base = time.perf_counter() - t0
+       report(f"serial ({raw / base / 1e6:,.0f} MB/s)", base)
+       t0 = time.perf_counter()
+       pooled = scan_logs(paths, max_workers=args.workers)
+       elapsed = time.perf_counter() - t0
+       report(f"process pool (max_workers={args.workers})", elapsed, base)
+       assert serial.policies == pooled.policies and serial.lines == pooled.lines == args.files * args.lines
+   result = apply_hits(analyzer.analyze_tree(parse_config_tree(synthetic_config(args.policies))), serial)
+   print(f"  {len(serial.policies):,} policies hit, {len(result.unused):,} zero-hit removal candidates, outputs identical")
+def bench_objects(args) -> None:
+   tree = parse_config_tree(synthetic_config(args.policies, n_hosts=args.hosts, n_groups=args.groups))
+   tables = analyzer.policy_tables(tree)
+   print(f"objects: {args.hosts:,} hosts, {args.groups:,} groups, {args.policies:,} policies")
+   report("resolve objects + build records", best_of(lambda: analyzer.vdom_records(tables), args.repeat))
+   records = analyzer.vdom_records(tables)
+   pairs = [(records[i], records[j]) for i in range(0, len(records), 7) for j in range(0, len(records), 11)]
+   t = best_of(lambda: [analyzer.covers(a, b) for a, b in pairs], args.repeat)
+   report(f"covers() x {len(pairs):,}", t)
+   print(f"  {t / len(pairs) * 1e9:,.0f} ns per covers()")
+def _naive_coverers(records) -> List[int]:
+   out = [-1] * len(records)
+   for i, curr in enumerate(records):
+       for j in range(i):
+           if analyzer.covers(records[j], curr):
+               out[i] = j
+               break
+   return out
+def bench_shadow(args) -> None:
+   print("shadow: pairwise covers() scan vs policy_engine sweep")
+   for n in args.sizes:
+       records = analyzer.vdom_records(analyzer.policy_tables(parse_config_tree(synthetic_config(n))))
+       t0 = time.perf_counter()
+       fast = first_coverers(records)
+       engine = time.perf_counter() - t0
+       found = sum(1 for x in fast if x >= 0)
+       if n <= args.naive_max:
+           t0 = time.perf_counter()
+           assert _naive_coverers(records) == fast, n
+           naive = time.perf_counter() - t0
+           report(f"{n:>7,} pairwise", naive)
+           report(f"{n:>7,} engine ({found:,} shadowed)", engine, naive)
+       else:
+           report(f"{n:>7,} engine ({found:,} shadowed)", engine)
+def bench_matrix(args) -> None:
+   print("matrix: NumPy policy matrix and the union-shadow pass")
+   for n in args.sizes:
+       records = analyzer.vdom_records(analyzer.policy_tables(parse_config_tree(synthetic_config(n))))
+       coverers = first_coverers(records, same_action=False)
+       t0 = time.perf_counter()
+       PolicyMatrix(records)
+       build = time.perf_counter() - t0
+       t0 = time.perf_counter()
+       rows = find_union_shadowed(records, coverers=coverers)
+       union = time.perf_counter() - t0
+       report(f"{n:>7,} matrix build", build)
+       report(f"{n:>7,} union pass ({len(rows):,} union-shadowed)", union)
+def random_flows(n: int, n_hosts: int = 2000, seed: int = 11) -> Tuple[np.ndarray, ...]:
+   """(srcintf, dstintf, src, dst, protocol, port) columns over synthetic_config()'s hosts."""
+   rng = np.random.default_rng(seed)
+   hosts = rng.integers(0, n_hosts, size=(2, n))
+   ips = (10 << 24) + ((hosts >> 8) & 255) * 65536 + (hosts & 255) * 256 + 10
+   ips[:, rng.random(n) < 0.1] = rng.integers(0, 1 << 32, size=(2, 1))
+   ports = np.array([22, 25, 53, 80, 123, 443, 3389, 8080])[rng.integers(0, 8, size=n)]
+   names = np.array(INTERFACES, dtype=object)
+   return (names[rng.integers(0, len(INTERFACES), size=n)], names[rng.integers(0, len(INTERFACES), size=n)],
+           ips[0], ips[1], np.where(rng.random(n) < 0.8, 6, 17), ports)
+def _scan_lookup(records, flow) -> int:
+   sif, dif, src, dst, proto, port = flow
+   point = proto * PORT_SPACE + port
+   for r in records:
+       if (r.status != "disable" and ("any" in r.sif or sif in r.sif) and ("any" in r.dif or dif in r.dif)
+               and contains(r.src, (src, src + 1)) and contains(r.dst, (dst, dst + 1)) and contains(r.svc, (point, point + 1))):
+           return r.policy_id
+   return -1
+def bench_lookup(args) -> None:
+   records = analyzer.vdom_records(analyzer.policy_tables(parse_config_tree(synthetic_config(args.policies))))
+   print(f"lookup: {len(records):,} policies, {args.flows:,} flows")
+   t0 = time.perf_counter()
+   engine = PolicyLookup(records)
+   report("compile", time.perf_counter() - t0)
+   columns = random_flows(args.flows)
+   flows = [tuple(int(x) if not isinstance(x, str) else x for x in f) for f in zip(*(c[:args.check] for c in columns))]
+   t0 = time.perf_counter()
+   expected = [_scan_lookup(records, f) for f in flows]
+   scan = (time.perf_counter() - t0) / len(flows)
+   t0 = time.perf_counter()
+   single = [engine.lookup(*f) for f in flows]
+   each = (time.perf_counter() - t0) / len(flows)
+   assert [-1 if x is None else x for x in single] == expected
+   print(f"  per flow: linear scan {scan * 1e6:,.1f} us   compiled {each * 1e6:,.1f} us   x{scan / each:.1f}")
+   t0 = time.perf_counter()
+   batch = engine.lookup_arrays(columns[2], columns[3], columns[4], columns[5], columns[0], columns[1])
+   elapsed = time.perf_counter() - t0
+   assert batch[:args.check].tolist() == expected
+   report(f"batch ({args.flows / elapsed / 1e6:.2f} M flows/s, {(batch >= 0).mean():.0%} matched)", elapsed)
+def zone_records(n_zones: int, n_policies: int, seed: int = 5):
+   """Accept policies between `n_zones` zones: mostly sparse zone pairs, a few any-source rules."""
+   rnd = random.Random(seed)
+   out = ["config firewall policy\n"]
+   for pid in range(1, n_policies + 1):
+       src = "any" if rnd.random() < 0.002 else f"z{rnd.randrange(n_zones)}"
+       out.append(f"    edit {pid}\n        set srcintf \"{src}\"\n        set dstintf \"z{rnd.randrange(n_zones)}\"\n"
+                  f"        set srcaddr \"all\"\n        set dstaddr \"all\"\n        set action accept\n"
+                  f"        set service \"ALL\"\n    next\n")
+   out.append("end\n")
+   return analyzer.vdom_records(analyzer.policy_tables(parse_config_tree("".join(out))))
+def _bfs_hops(graph: ZoneGraph) -> np.ndarray:
+   n = len(graph.nodes)
+   succ = [[] for _ in range(n)]
+   for s, d in graph.edges:
+       succ[s].append(d)
+   hops = np.zeros((n, n), dtype=np.int32)
+   for src in range(n):
+       level, frontier, seen = 0, [src], {src}
+       while frontier:
+           level += 1
+           nxt = []
+           for u in frontier:
+               for v in succ[u]:
+                   if not hops[src, v]:
+                       hops[src, v] = level
+                   if v not in seen:
+                       seen.add(v)
+                       nxt.append(v)
+           frontier = nxt
+   return hops
+def bench_reach(args) -> None:
+   print("reach: zone reachability closure (boolean matmul levels) vs per-source BFS (checks equality)")
+   for n in args.zones:
+       records = zone_records(n, n * args.degree)
+       t0 = time.perf_counter()
+       graph = ZoneGraph(records)
+       build = time.perf_counter() - t0
+       t0 = time.perf_counter()
+       expected = _bfs_hops(graph)
+       bfs = time.perf_counter() - t0
+       assert (graph.hops == expected).all(), n
+       t0 = time.perf_counter()
+       rows = graph.rows()
+       listing = time.perf_counter() - t0
+       report(f"{n:>5} zones per-source BFS", bfs)
+       report(f"{n:>5} zones graph + closure ({int(graph.hops.max())} levels)", build, bfs)
+       report(f"{n:>5} zones rows ({len(rows):,} reachable pairs)", listing)
+def _apply_merges(records, groups):
+   """The rulebase after the proposed merges: each group's first rule takes the union span, the rest go."""
+   span = {"srcaddr": "src", "dstaddr": "dst", "service": "svc"}
+   by_id = {r.policy_id: r for r in records}
+   merged, dropped = {}, set()
+   for g in groups:
+       ids = [int(x) for x in g["policy_ids"].split()]
+       keep = PolicyRecord()
+       for slot in PolicyRecord.__slots__:
+           setattr(keep, slot, getattr(by_id[ids[0]], slot))
+       attr = span[g["field"]]
+       setattr(keep, attr, union(getattr(by_id[i], attr) for i in ids))
+       merged[ids[0]] = keep
+       dropped.update(ids[1:])
+   return [merged.get(r.policy_id, r) for r in records if r.policy_id not in dropped]
+def bench_consolidate(args) -> None:
+   print("consolidate: rule-merge proposals (checks first-match settings are unchanged after merging)")
+   for n in args.sizes:
+       records = analyzer.vdom_records(analyzer.policy_tables(parse_config_tree(synthetic_config(n))))
+       t0 = time.perf_counter()
+       groups = analyzer.find_consolidations(records)
+       elapsed = time.perf_counter() - t0
+       removed = sum(g["removed"] for g in groups)
+       merged = _apply_merges(records, groups)
+       columns = random_flows(args.flows)
+       flows = (columns[2], columns[3], columns[4], columns[5], columns[0], columns[1])
+       settings = {r.policy_id: r.settings for r in records}
+       before = [settings.get(i) for i in PolicyLookup(records).lookup_arrays(*flows).tolist()]
+       after = [settings.get(i) for i in PolicyLookup(merged).lookup_arrays(*flows).tolist()]
+       assert before == after, n
+       report(f"{n:>7,} policies: {len(groups):,} groups, {removed:,} rules removable ({removed / n:.2%})", elapsed)
+def _naive_overlaps(records) -> set:
+   def meets(a, b):
+       return bool(a and b) and ("any" in a or "any" in b or not a.isdisjoint(b))
+   return {(x, y) for y, b in enumerate(records) for x, a in enumerate(records[:y])
+           if meets(a.sif, b.sif) and meets(a.dif, b.dif) and overlaps(a.src, b.src)
+           and overlaps(a.dst, b.dst) and overlaps(a.svc, b.svc)}
+def bench_overlap(args) -> None:
+   print("overlap: partial-overlap pairs, pairwise scan vs interval sweep (checks equality)")
+   for n in args.sizes:
+       records = analyzer.vdom_records(analyzer.policy_tables(parse_config_tree(synthetic_config(n))))
+       t0 = time.perf_counter()
+       i, j = overlapping_pairs(records)
+       sweep = time.perf_counter() - t0
+       t0 = time.perf_counter()
+       rows = find_conflicts(records)
+       conflicts = time.perf_counter() - t0
+       if n <= args.naive_max:
+           t0 = time.perf_counter()
+           assert _naive_overlaps(records) == set(zip(i.tolist(), j.tolist())), n
+           report(f"{n:>7,} pairwise", time.perf_counter() - t0)
+       report(f"{n:>7,} sweep ({len(i):,} overlapping pairs)", sweep)
+       report(f"{n:>7,} conflicts + correlations ({len(rows):,} rows)", conflicts)
+def nested_records(n_policies: int, depth: int, n_hosts: int = 500, seed: int = 13):
+   """
+   Policies naming each host directly, through a chain of `depth` single-member
+   groups, or in a two-host group listed either way round: many semantic duplicates.
+   """
+   rnd = random.Random(seed)
+   out = ["config firewall address\n"]
+   for h in range(n_hosts):
+       out.append(f"    edit \"h{h}\"\n        set subnet 10.1.{h >> 8}.{h & 255} 255.255.255.255\n    next\n")
+   out.append("end\nconfig firewall addrgrp\n")
+   for h in range(n_hosts):
+       for d in range(1, depth + 1):
+           member = f"g{h}.{d - 1}" if d > 1 else f"h{h}"
+           out.append(f"    edit \"g{h}.{d}\"\n        set member \"{member}\"\n    next\n")
+       out.append(f"    edit \"p{h}\"\n        set member \"h{h}\" \"h{(h + 1) % n_hosts}\"\n    next\n")
+   out.append("end\nconfig firewall policy\n")
+   def name(h: int) -> str:
+       r = rnd.random()
+       if r < 0.4:
+           return f"\"h{h}\""
+       if r < 0.8:
+           return f"\"g{h}.{depth}\""
+       return f"\"p{h}\"" if r < 0.9 else f"\"h{(h + 1) % n_hosts}\" \"g{h}.{depth}\""
+   for pid in range(1, n_policies + 1):
+       src, dst = rnd.randrange(n_hosts), rnd.randrange(20)
+       out.append(f"    edit {pid}\n        set srcintf \"port1\"\n        set dstintf \"port2\"\n"
+                  f"        set srcaddr {name(src)}\n        set dstaddr {name(dst)}\n        set action accept\n"
+                  f"        set schedule \"always\"\n        set service \"ALL\"\n    next\n")
+   out.append("end\n")
+   return analyzer.vdom_records(analyzer.policy_tables(parse_config_tree("".join(out))))
+def _naive_duplicates(records) -> List[Tuple[int, int]]:
+   def same(a, b):
+       return (a.sif == b.sif and a.dif == b.dif and a.src == b.src and a.dst == b.dst and a.svc == b.svc
+               and a.schedule == b.schedule and a.action_key == b.action_key and a.status == b.status)
+   out = []
+   for y, b in enumerate(records):
+       for a in records[:y]:
+           if same(a, b):
+               out.append((b.policy_id, a.policy_id))
+               break
+   return out
+def bench_duplicates(args) -> None:
+   print(f"duplicates: expanded-object signatures through {args.depth}-deep group chains (checks equality)")
+   for n in args.sizes:
+       t0 = time.perf_counter()
+       records = nested_records(n, args.depth)
+       build = time.perf_counter() - t0
+       t0 = time.perf_counter()
+       rows = analyzer.find_duplicates(records)
+       elapsed = time.perf_counter() - t0
+       named = sum(1 for r in rows if r["criteria"] == "Exact signature match")
+       if n <= args.naive_max:
+           t0 = time.perf_counter()
+           assert _naive_duplicates(records) == [(r["policy_id"], r["duplicate_of"]) for r in rows], n
+           report(f"{n:>7,} pairwise", time.perf_counter() - t0)
+       report(f"{n:>7,} parse + expand objects", build)
+       report(f"{n:>7,} hash pass ({len(rows):,} dups, {named:,} by name)", elapsed)
+def synthetic_pack(n_controls: int) -> str:
+   """A TOML pack cycling through every comparator over system sections synthetic_config() sets."""
+   checks = [
+       'section = "system global"\nkey = "pre-login-banner"\nop = "equals"\nvalue = "enable"',
+       'section = "system global"\nkey = "admintimeout"\nop = "<="\nvalue = 15',
+       'section = "system password-policy"\nkey = "minimum-length"\nop = ">="\nvalue = 14',
+       'section = "system ntp"\nkey = "type"\nop = "in"\nvalue = ["custom", "fortiguard"]',
+       'section = "system global"\nkey = "hostname"\nop = "regex"\nvalue = \'^FGT-\'',
+       'section = "log fortianalyzer setting"\nkey = "status"\nop = "equals"\nvalue = "enable"\nmissing = "UNKNOWN"',
+       'section = "log syslogd setting"\nop = "exists"',
+       'rule = "snmp_strong"',
+   ]
+   out = ['[pack]\nid = "bench_%d"\nname = "Synthetic"\nversion = "v0"\nfamily = "7.0.x"\n' % n_controls]
+   for i in range(n_controls):
+       out.append(f'[[controls]]\nid = "B-{i}"\ncategory = "Bench"\nname = "Control {i}"\nweight = 5\n{checks[i % len(checks)]}\n')
+   return "\n".join(out)
+def bench_packs(args) -> None:
+   print("packs: declarative pack compile, cached load and one-pass evaluation")
+   tree = parse_config_tree(synthetic_config(10))
+   with tempfile.TemporaryDirectory() as tmp:
+       for n in args.controls:
+           path = os.path.join(tmp, f"bench_{n}.toml")
+           with open(path, "w", encoding="utf-8") as f:
+               f.write(synthetic_pack(n))
+           cache_dir = os.path.join(tmp, "cache")
+           t0 = time.perf_counter()
+           pack = load_pack_file(path, cache_dir)
+           cold = time.perf_counter() - t0
+           warm = best_of(lambda: load_pack_file(path, cache_dir), args.repeat)
+           assert [c.rule_key for c in load_pack_file(path, cache_dir).controls] == [c.rule_key for c in pack.controls]
+           ctx = rule_context(tree)
+           rows = evaluate_pack(pack, ctx)
+           report(f"{n:>6,} controls: parse + compile", cold)
+           report(f"{n:>6,} controls: cached load", warm, cold)
+           t = best_of(lambda: evaluate_pack(pack, rule_context(tree)), args.repeat)
+           passed = sum(1 for r in rows if r["status"] == "PASS")
+           report(f"{n:>6,} controls: evaluate ({passed:,} PASS)", t)
+   packs = load_supported_packs()
+   ctx = rule_context(tree)
+   separate = best_of(lambda: [evaluate_pack(pack, ctx) for pack in packs.values()], args.repeat)
+   together = best_of(lambda: evaluate_packs(packs, ctx), args.repeat)
+   by_pack, evaluated = evaluate_packs(packs, ctx)
+   assert by_pack == {key: evaluate_pack(pack, ctx) for key, pack in packs.items()}
+   total = sum(len(pack.controls) for pack in packs.values())
+   report(f"{len(packs)} supported packs, one by one", separate)
+   report(f"{len(packs)} packs, shared rules ({evaluated}/{total} run)", together, separate)
+   # Concurrent runs with different selections share the registry's packs and must not see each other's choice.
+   choices = [("Auto (from firmware)", "Auto"), ("FortiOS 7.4.x", "v1.0.0"), ("FortiOS 7.0.x", "v1.2.0"), ("FortiOS 7.4.x", "Auto")]
+   def run(i: int):
+       family, version = choices[i % len(choices)]
+       return (family, version), analyzer.benchmark_meta(analyzer.select_benchmark_pack("7.0.12", family, version))
+   expected = {c: analyzer.benchmark_meta(analyzer.select_benchmark_pack("7.0.12", *c)) for c in choices}
+   t0 = time.perf_counter()
+   with ThreadPoolExecutor(max_workers=8) as pool:
+       results = list(pool.map(run, range(args.threaded)))
+       cis = list(pool.map(lambda c: analyzer.evaluate_benchmarks(tree, *c)[0], choices * 4))
+   elapsed = time.perf_counter() - t0
+   assert all(meta == expected[c] for c, meta in results)
+   assert cis == [analyzer.evaluate_benchmarks(tree, *c)[0] for c in choices * 4]
+   report(f"{args.threaded:,} threaded selections (8 threads)", elapsed)
+# AnalysisResult fields each stage fills; the rest come from the header and `system global`.
+STAGE_FIELDS = {
+   analyzer.STAGE_CIS: ("cis", "scores", "benchmark_comparison"),
+   analyzer.STAGE_HYGIENE: analyzer.HYGIENE_LISTS + ("sec_profile_coverage", "vdoms"),
+}
+def bench_lazy(args) -> None:
+   print("lazy: parsing only the sections the selected stages declare (checks output == full parse)")
+   runs = (("all stages", analyzer.STAGES), ("CIS only", (analyzer.STAGE_CIS,)), ("hygiene only", (analyzer.STAGE_HYGIENE,)))
+   configs = (("1 VDOM", synthetic_config(args.policies)),
+              (f"{args.vdoms} VDOMs", multi_vdom_config(args.vdoms, args.policies // args.vdoms)))
+   with tempfile.TemporaryDirectory() as tmp:
+       for label, text in configs:
+           path = os.path.join(tmp, "fgt.conf")
+           with open(path, "w", encoding="utf-8") as f:
+               f.write(text)
+           del text
+           parse = best_of(lambda: load_config_tree(path), args.repeat)
+           t0 = time.perf_counter()
+           full = asdict(analyzer.analyze_tree(load_config_tree(path), max_workers=1))
+           analyze = time.perf_counter() - t0
+           print(f"  {label}")
+           report("parse: every section", parse)
+           report("parse + analysis: every section", analyze)
+           for name, stages in runs:
+               sections = analyzer.stage_sections(stages)
+               t = best_of(lambda: load_config_tree(path, sections), args.repeat)
+               t0 = time.perf_counter()
+               result = asdict(analyzer.analyze_file(path, max_workers=1, stages=stages))
+               elapsed = time.perf_counter() - t0
+               ran = {"meta", "benchmark_meta", "lifecycle_assessment"}.union(*(STAGE_FIELDS[s] for s in stages))
+               assert all(result[k] == full[k] for k in ran), (label, name)
+               report(f"parse: {name} ({len(sections)} sections)", t, parse)
+               report(f"parse + analysis: {name}", elapsed, analyze)
+def main() -> None:
+   ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+   sub = ap.add_subparsers(dest="bench", required=True)
+   p = sub.add_parser("sections", help="section extraction: regex scans vs one-pass index")
+   p.add_argument("--policies", type=int, default=100000)
+   p.add_argument("--repeat", type=int, default=3)
+   p.set_defaults(fn=bench_sections)
+   p = sub.add_parser("tree", help="peak memory: whole-text parsing vs streaming tree parser")
+   p.add_argument("--policies", type=int, default=100000)
+   p.add_argument("--repeat", type=int, default=1)
+   p.set_defaults(fn=bench_tree)
+   p = sub.add_parser("ingest", help="peak RSS: read().decode() vs memory-mapped ingestion")
+   p.add_argument("--policies", type=int, default=650000)
+   p.set_defaults(fn=bench_ingest)
+   p = sub.add_parser("records", help="policy dicts vs PolicyRecord: memory and analytics time")
+   p.add_argument("--policies", type=int, default=100000)
+   p.add_argument("--shadow-policies", type=int, default=2000)
+   p.add_argument("--repeat", type=int, default=3)
+   p.set_defaults(fn=bench_records)
+   p = sub.add_parser("cache", help="repeat analysis: cache miss vs memory and disk hits")
+   p.add_argument("--policies", type=int, default=2000)
+   p.add_argument("--repeat", type=int, default=5)
+   p.set_defaults(fn=bench_cache)
+   p = sub.add_parser("incremental", help="changed config: full re-analysis vs reanalyze() (checks equality)")
+   p.add_argument("--policies", type=int, default=5000)
+   p.set_defaults(fn=bench_incremental)
+   p = sub.add_parser("shadow", help="shadowed/redundant scaling: pairwise scan vs engine (checks equality)")
+   p.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000, 100000])
+   p.add_argument("--naive-max", type=int, default=10000)
+   p.set_defaults(fn=bench_shadow)
+   p = sub.add_parser("matrix", help="NumPy policy matrix: build and union-shadow pass")
+   p.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 5000])
+   p.set_defaults(fn=bench_matrix)
+   p = sub.add_parser("lookup", help="first-match lookup: linear scan vs compiled bitsets, single and batch (checks equality)")
+   p.add_argument("--policies", type=int, default=100000)
+   p.add_argument("--flows", type=int, default=1000000)
+   p.add_argument("--check", type=int, default=2000)
+   p.set_defaults(fn=bench_lookup)
+   p = sub.add_parser("logs", help="traffic-log replay: serial vs per-file process pool (checks equality)")
+   p.add_argument("--files", type=int, default=4)
+   p.add_argument("--lines", type=int, default=500000)
+   p.add_argument("--policies", type=int, default=2000)
+   p.add_argument("--workers", type=int, default=os.cpu_count())
+   p.set_defaults(fn=bench_logs)
+   p = sub.add_parser("permissive", help="permissive scoring: per-policy rows vs columnar scores (checks equality)")
+   p.add_argument("--policies", type=int, default=100000)
+   p.add_argument("--repeat", type=int, default=3)
+   p.set_defaults(fn=bench_permissive)
+   p = sub.add_parser("reach", help="zone reachability: matrix closure vs per-source BFS (checks equality)")
+   p.add_argument("--zones", type=int, nargs="+", default=[100, 300, 600])
+   p.add_argument("--degree", type=int, default=3)
+   p.set_defaults(fn=bench_reach)
+   p = sub.add_parser("consolidate", help="consolidation optimizer: merge proposals, scaling and first-match equality")
+   p.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 100000])
+   p.add_argument("--flows", type=int, default=200000)
+   p.set_defaults(fn=bench_consolidate)
+   p = sub.add_parser("overlap", help="conflict/correlation detection: pairwise scan vs interval sweep (checks equality)")
+   p.add_argument("--sizes", type=int, nargs="+", default=[2000, 10000, 50000])
+   p.add_argument("--naive-max", type=int, default=2000)
+   p.set_defaults(fn=bench_overlap)
+   p = sub.add_parser("duplicates", help="semantic duplicates: pairwise comparison vs one hash pass over expanded objects (checks equality)")
+   p.add_argument("--sizes", type=int, nargs="+", default=[2000, 20000, 100000])
+   p.add_argument("--depth", type=int, default=8)
+   p.add_argument("--naive-max", type=int, default=2000)
+   p.set_defaults(fn=bench_duplicates)
+   p = sub.add_parser("packs", help="declarative benchmark packs: compile vs cached load, evaluation time per control count")
+   p.add_argument("--controls", type=int, nargs="+", default=[10, 250, 2000])
+   p.add_argument("--threaded", type=int, default=20000)
+   p.add_argument("--repeat", type=int, default=5)
+   p.set_defaults(fn=bench_packs)
+   p = sub.add_parser("objects", help="address expansion: record build and span containment cost")
+   p.add_argument("--policies", type=int, default=20000)
+   p.add_argument("--hosts", type=int, default=50000)
+   p.add_argument("--groups", type=int, default=5000)
+   p.add_argument("--repeat", type=int, default=3)
+   p.set_defaults(fn=bench_objects)
+   p = sub.add_parser("vdoms", help="multi-VDOM export: serial vs process-pool policy analytics")
+   p.add_argument("--vdoms", type=int, default=20)
+   p.add_argument("--policies", type=int, default=2000)
+   p.add_argument("--workers", type=int, default=os.cpu_count())
+   p.add_argument("--repeat", type=int, default=1)
+   p.set_defaults(fn=bench_vdoms)
+   p = sub.add_parser("lazy", help="stage-scoped parsing: CIS-only and hygiene-only runs vs a full parse (checks equality)")
+   p.add_argument("--policies", type=int, default=100000)
+   p.add_argument("--vdoms", type=int, default=10)
+   p.add_argument("--repeat", type=int, default=3)
+   p.set_defaults(fn=bench_lazy)
+   args = ap.parse_args()
+   args.fn(args)
+if __name__ == "__main__":
+   main()
@@ -0,0 +1,137 @@
+# policy_engine.py
+"""
+Near-linear shadowed/redundant detection.
+A rule is covered by an earlier rule whose source and destination interfaces,
+addresses and services each contain the rule's own; with `same_action` the
+earlier rule must also have the rule's action (analyzer.covers). Instead of
+testing every earlier rule:
+   1. Every field's distinct values get ids, and each id the set of ids whose
+      value contains it: spans through the elementary segments their bounds
+      cut the line into, interface sets through a name -> ids index.
+   2. One sweep in policy order files each rule, per action or all in one, in a trie
+      (srcintf, dstintf) -> src -> dst -> svc -> first position. A rule's
+      earliest coverer is the smallest position reachable through its fields'
+      superset ids; at each level only the smaller of the superset ids and the
+      existing branches is walked.
+Typical rulebases have a handful of supersets per value, so the sweep is close
+to linear in the number of rules.
+"""
+from __future__ import annotations
+from bisect import bisect_left
+from typing import Dict, FrozenSet, Hashable, List, Sequence, Set, Tuple
+from fw_objects import Span, contains, pairs
+from policy_model import PolicyRecord
+ANY_INTERFACE = "any"
+def interface_contains(outer: FrozenSet[str], inner: FrozenSet[str]) -> bool:
+   return ANY_INTERFACE in outer or inner <= outer
+def _ids(values: Sequence[Hashable]) -> Tuple[List[int], List[Hashable]]:
+   """Per-record value ids plus the distinct values in id order."""
+   index: Dict[Hashable, int] = {}
+   ids = [index.setdefault(v, len(index)) for v in values]
+   return ids, list(index)
+def span_supersets(values: List[Span]) -> List[FrozenSet[int]]:
+   """
+   For each distinct span, the ids of all spans that contain it (itself included).
+   Every span covers an elementary segment entirely or not at all, so a superset
+   must cover the segment each interval starts in; candidates are the
+   intersection of those segments' covers, verified only when an interval
+   stretches over several segments.
+   """
+   bounds = sorted({b for v in values for b in v})
+   segments: List[Set[int]] = [set() for _ in bounds]
+   for u, span in enumerate(values):
+       for s, e in pairs(span):
+           for seg in range(bisect_left(bounds, s), bisect_left(bounds, e)):
+               segments[seg].add(u)
+   everything = frozenset(range(len(values)))
+   out: List[FrozenSet[int]] = []
+   for span in values:
+       if not span:
+           out.append(everything)
+           continue
+       firsts = [bisect_left(bounds, s) for s in span[0::2]]
+       covers = sorted((segments[k] for k in firsts), key=len)
+       candidates = covers[0].intersection(*covers[1:])
+       if any(bounds[k + 1] != e for k, e in zip(firsts, span[1::2])):
+           candidates = [u for u in candidates if contains(values[u], span)]
+       out.append(frozenset(candidates))
+   return out
+def interface_supersets(values: List[FrozenSet[str]]) -> List[FrozenSet[int]]:
+   by_name: Dict[str, List[int]] = {}
+   for u, names in enumerate(values):
+       for name in names:
+           by_name.setdefault(name, []).append(u)
+   wildcard = by_name.get(ANY_INTERFACE, [])
+   everything = frozenset(range(len(values)))
+   out: List[FrozenSet[int]] = []
+   for names in values:
+       if not names:
+           out.append(everything)
+           continue
+       first = next(iter(names))
+       candidates = set(wildcard)
+       candidates.update(u for u in by_name.get(first, ()) if names <= values[u])
+       out.append(frozenset(candidates))
+   return out
+def _walk(level: Dict, sup: FrozenSet[int]):
+   """Branches of a trie level whose key is in `sup`, walking whichever side is smaller."""
+   if len(level) < len(sup):
+       return [node for key, node in level.items() if key in sup]
+   return [level[key] for key in sup if key in level]
+def first_coverers(records: List[PolicyRecord], start: int = 0, same_action: bool = True) -> List[int]:
+   """
+   For every position >= `start`, the position of the earliest rule covering it
+   (-1 when none); positions before `start` are -1. Rules before `start` are
+   still indexed as potential coverers. `same_action=False` accepts a coverer
+   of any action: the rule then never matches a packet first.
+   """
+   n = len(records)
+   sif_ids, sif_vals = _ids([r.sif for r in records])
+   dif_ids, dif_vals = _ids([r.dif for r in records])
+   src_ids, src_vals = _ids([r.src for r in records])
+   dst_ids, dst_vals = _ids([r.dst for r in records])
+   svc_ids, svc_vals = _ids([r.svc for r in records])
+   sif_sup = interface_supersets(sif_vals)
+   dif_sup = interface_supersets(dif_vals)
+   src_sup = span_supersets(src_vals)
+   dst_sup = span_supersets(dst_vals)
+   svc_sup = span_supersets(svc_vals)
+   pair_sup: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+   tries: Dict[str, Dict] = {}
+   out = [-1] * n
+   for i, r in enumerate(records):
+       action = r.action_key if same_action else ""
+       trie = tries.get(action)
+       if trie is None:
+           trie = tries[action] = {}
+       pair = (sif_ids[i], dif_ids[i])
+       s, d, c = src_ids[i], dst_ids[i], svc_ids[i]
+       if i >= start and trie:
+           pairs_up = pair_sup.get(pair)
+           if pairs_up is None:
+               pairs_up = pair_sup[pair] = [(a, b) for a in sif_sup[pair[0]] for b in dif_sup[pair[1]]]
+           best = i
+           sup_s, sup_d, sup_c = src_sup[s], dst_sup[d], svc_sup[c]
+           for key in pairs_up:
+               by_src = trie.get(key)
+               if by_src is None:
+                   continue
+               for by_dst in _walk(by_src, sup_s):
+                   for by_svc in _walk(by_dst, sup_d):
+                       for pos in _walk(by_svc, sup_c):
+                           if pos < best:
+                               best = pos
+           if best < i:
+               out[i] = best
+       by_src = trie.get(pair)
+       if by_src is None:
+           by_src = trie[pair] = {}
+       by_dst = by_src.get(s)
+       if by_dst is None:
+           by_dst = by_src[s] = {}
+       by_svc = by_dst.get(d)
+       if by_svc is None:
+           by_svc = by_dst[d] = {}
+       if c not in by_svc:
+           by_svc[c] = i
+   return out
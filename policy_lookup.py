@@ -0,0 +1,231 @@
+# policy_lookup.py
+"""
+Compiled first-match policy lookup: "which policy would this flow hit?"
+The ordered rulebase of one VDOM is compiled into one sorted boundary array per
+match field. Every elementary segment between boundaries (and every interface
+name) carries a bitset of the enabled policies matching it, bit k standing for
+the k-th policy in evaluation order: config sequence, not policy id. A lookup
+is one binary search per field, the AND of five bitsets and its lowest set bit.
+Flows are (srcintf, dstintf, src ip, dst ip, protocol, port): `port` is the
+destination port for TCP/UDP/SCTP/UDP-Lite and type * 256 + code for ICMP.
+A srcintf/dstintf of None matches any interface. Objects that cannot be
+expanded (FQDN, geography, ISDB, ...) never match, nor do schedules apply.
+Batch lookups map whole columns to segment ids with numpy and evaluate each
+distinct segment combination once, so repeated flows cost a gather.
+"""
+from __future__ import annotations
+import socket
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from fw_objects import (
+   PORT_SPACE, PROTO_ICMP, PROTO_SCTP, PROTO_TCP, PROTO_UDP, PROTO_UDPLITE, Span, pairs,
+)
+from policy_engine import ANY_INTERFACE
+from policy_model import PolicyRecord
+PROTOCOLS = {"icmp": PROTO_ICMP, "tcp": PROTO_TCP, "udp": PROTO_UDP, "sctp": PROTO_SCTP, "udplite": PROTO_UDPLITE}
+# Bounds where more spans start or end than this get their delta packed with numpy
+# (_mask, O(policies)); fewer are XORed in one `1 << pos` at a time.
+XOR_EVENTS = 64
+Flow = Tuple[Optional[str], Optional[str], Union[str, int], Union[str, int], Union[str, int], int]
+def ip_value(value: Union[str, int]) -> int:
+   if isinstance(value, (int, np.integer)):
+       return int(value)
+   return int.from_bytes(socket.inet_aton(value.strip()), "big")
+def protocol_number(value: Union[str, int]) -> int:
+   if isinstance(value, (int, np.integer)):
+       return int(value)
+   key = value.strip().lower()
+   return PROTOCOLS[key] if key in PROTOCOLS else int(key)
+def _mask(positions: np.ndarray, n: int) -> int:
+   bits = np.zeros(n, dtype=bool)
+   bits[positions] = True
+   return int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
+class _SpanField:
+   """Sorted segment starts and, per segment, an index into the distinct policy bitsets."""
+   __slots__ = ("starts", "_starts", "mask_ids")
+   def __init__(self, spans: List[Span], enabled: np.ndarray, masks: List[int], mask_index: Dict[int, int]):
+       n = len(spans)
+       events: Dict[int, List[int]] = {}
+       for pos, span in enumerate(spans):
+           if not enabled[pos]:
+               continue
+           for s, e in pairs(span):
+               events.setdefault(s, []).append(pos)
+               events.setdefault(e, []).append(pos)
+       # Points below every bound match nothing (mask 0).
+       starts: List[int] = [-1]
+       mask_ids: List[int] = [0]
+       # The running bitset is an int updated by each bound's events; only distinct bitsets are stored.
+       m = 0
+       for bound in sorted(events):
+           positions = events[bound]
+           if len(positions) > XOR_EVENTS:
+               # Spans are normalized, so a policy starts or ends at most once per bound.
+               m ^= _mask(np.array(positions, dtype=np.int64), n)
+           else:
+               for pos in positions:
+                   m ^= 1 << pos
+           mid = mask_index.get(m)
+           if mid is None:
+               mid = mask_index[m] = len(masks)
+               masks.append(m)
+           if mask_ids[-1] == mid:
+               continue
+           starts.append(bound)
+           mask_ids.append(mid)
+       self._starts = starts
+       self.starts = np.array(starts, dtype=np.int64)
+       self.mask_ids = np.array(mask_ids, dtype=np.int64)
+   def segment(self, point: int) -> int:
+       return int(self.mask_ids[bisect_right(self._starts, point) - 1])
+   def segments(self, points: np.ndarray) -> np.ndarray:
+       return self.mask_ids[np.searchsorted(self.starts, points, side="right") - 1]
+class PolicyLookup:
+   """First-match lookup over one VDOM's PolicyRecords (disabled policies never match)."""
+   def __init__(self, records: Sequence[PolicyRecord]):
+       self.policy_ids = np.array([r.policy_id for r in records], dtype=np.int64)
+       n = len(records)
+       enabled = np.array([r.status.strip('"').lower() != "disable" for r in records], dtype=bool)
+       # masks[0] is the empty set: points no enabled policy matches.
+       self.masks: List[int] = [0]
+       index: Dict[int, int] = {0: 0}
+       self.src = _SpanField([r.src for r in records], enabled, self.masks, index)
+       self.dst = _SpanField([r.dst for r in records], enabled, self.masks, index)
+       self.svc = _SpanField([r.svc for r in records], enabled, self.masks, index)
+       self.sif = self._interfaces([r.sif for r in records], enabled)
+       self.dif = self._interfaces([r.dif for r in records], enabled)
+   @classmethod
+   def from_tree(cls, tree, vdom: Optional[str] = None) -> "PolicyLookup":
+       """Lookup for one VDOM of a parsed config (the only/root VDOM by default)."""
+       from analyzer import policy_tables, vdom_records
+       scopes = tree.vdoms()
+       scope = scopes[vdom] if vdom is not None else scopes.get("root", next(iter(scopes.values())))
+       return cls(vdom_records(policy_tables(scope)))
+   def _interfaces(self, values: List[frozenset], enabled: np.ndarray) -> Dict[Optional[str], int]:
+       """Interface name -> bitset of policies matching it; None (any interface) and "" (unlisted names) included."""
+       n = len(values)
+       by_name: Dict[str, List[int]] = {}
+       wildcard: List[int] = []
+       listed: List[int] = []
+       for pos, names in enumerate(values):
+           if not enabled[pos] or not names:
+               continue
+           listed.append(pos)
+           if ANY_INTERFACE in names:
+               wildcard.append(pos)
+           else:
+               for name in names:
+                   by_name.setdefault(name, []).append(pos)
+       any_mask = _mask(np.array(wildcard, dtype=np.int64), n)
+       out: Dict[Optional[str], int] = {name: _mask(np.array(p, dtype=np.int64), n) | any_mask for name, p in by_name.items()}
+       out[""] = any_mask
+       out[None] = _mask(np.array(listed, dtype=np.int64), n)
+       return out
+   # -------------------------
+   # Single flows
+   # -------------------------
+   def _interface_mask(self, table: Dict[Optional[str], int], name: Optional[str]) -> int:
+       if name is None:
+           return table[None]
+       key = name.strip().strip('"').lower()
+       return table[None] if key == ANY_INTERFACE else table.get(key, table[""])
+   def match(self, srcintf: Optional[str], dstintf: Optional[str], src: Union[str, int], dst: Union[str, int],
+             protocol: Union[str, int], port: int = 0) -> int:
+       """Bitset of every enabled policy matching the flow (bit k = k-th policy in order)."""
+       masks = self.masks
+       hits = self._interface_mask(self.sif, srcintf) & self._interface_mask(self.dif, dstintf)
+       if hits:
+           hits &= masks[self.src.segment(ip_value(src))]
+       if hits:
+           hits &= masks[self.dst.segment(ip_value(dst))]
+       if hits:
+           hits &= masks[self.svc.segment(protocol_number(protocol) * PORT_SPACE + int(port))]
+       return hits
+   def lookup(self, srcintf: Optional[str], dstintf: Optional[str], src: Union[str, int], dst: Union[str, int],
+              protocol: Union[str, int], port: int = 0) -> Optional[int]:
+       """Policy id of the first matching policy, or None (implicit deny)."""
+       hits = self.match(srcintf, dstintf, src, dst, protocol, port)
+       if not hits:
+           return None
+       return int(self.policy_ids[(hits & -hits).bit_length() - 1])
+   def matching(self, srcintf: Optional[str], dstintf: Optional[str], src: Union[str, int], dst: Union[str, int],
+                protocol: Union[str, int], port: int = 0) -> List[int]:
+       """Ids of all matching policies in evaluation order (first one wins)."""
+       hits = self.match(srcintf, dstintf, src, dst, protocol, port)
+       out = []
+       while hits:
+           low = hits & -hits
+           out.append(int(self.policy_ids[low.bit_length() - 1]))
+           hits ^= low
+       return out
+   # -------------------------
+   # Batches
+   # -------------------------
+   def _interface_ids(self, table: Dict[Optional[str], int], names) -> Tuple[np.ndarray, List[int]]:
+       """Per-flow ids into a local list of interface bitsets."""
+       if names is None:
+           return np.zeros(1, dtype=np.int64), [table[None]]
+       index: Dict[Optional[str], int] = {}
+       ids = np.fromiter((index.setdefault(v, len(index)) for v in names), dtype=np.int64)
+       return ids, [self._interface_mask(table, v) for v in index]
+   def lookup_arrays(self, src, dst, protocol, port, srcintf=None, dstintf=None) -> np.ndarray:
+       """
+       First-match policy ids for columns of flows (-1 = implicit deny). `src`,
+       `dst`, `protocol` and `port` are integer arrays (or sequences convertible
+       to them); `srcintf`/`dstintf` are name sequences or None for any.
+       """
+       src = np.asarray(src, dtype=np.int64)
+       dst = np.asarray(dst, dtype=np.int64)
+       svc = np.asarray(protocol, dtype=np.int64) * PORT_SPACE + np.asarray(port, dtype=np.int64)
+       sif_ids, sif_masks = self._interface_ids(self.sif, srcintf)
+       dif_ids, dif_masks = self._interface_ids(self.dif, dstintf)
+       n = max(len(src), len(dst), len(svc))
+       # Coarse fields first: consecutive sorted combinations then share their prefix AND.
+       columns = [sif_ids, dif_ids, self.svc.segments(svc), self.src.segments(src), self.dst.segments(dst)]
+       radix = [len(sif_masks), len(dif_masks)] + [len(self.masks)] * 3
+       if np.prod(np.array(radix, dtype=float)) < 2.0 ** 62:
+           key = np.zeros(n, dtype=np.int64)
+           for col, r in zip(columns, radix):
+               key = key * r + col
+           uniq, inverse = np.unique(key, return_inverse=True)
+           combos = np.empty((len(uniq), 5), dtype=np.int64)
+           for k in range(4, -1, -1):
+               uniq, combos[:, k] = np.divmod(uniq, radix[k])
+       else:
+           keys = np.empty((n, 5), dtype=np.int64)
+           for k, col in enumerate(columns):
+               keys[:, k] = col
+           combos, inverse = np.unique(keys, axis=0, return_inverse=True)
+       masks = self.masks
+       first = np.full(len(combos), -1, dtype=np.int64)
+       prefix, head, last = None, 0, None
+       for k, (a, b, c, s, d) in enumerate(combos.tolist()):
+           if (a, b, c, s) != prefix:
+               if (a, b, c) != last:
+                   last = (a, b, c)
+                   head = sif_masks[a] & dif_masks[b] & masks[c]
+               prefix = (a, b, c, s)
+               partial = head & masks[s] if head else 0
+           hits = partial & masks[d] if partial else 0
+           if hits:
+               first[k] = self.policy_ids[(hits & -hits).bit_length() - 1]
+       return first[inverse.reshape(-1)]
+   def lookup_many(self, flows: Iterable[Flow], chunk_size: int = 1 << 18) -> np.ndarray:
+       """First-match policy ids (-1 = implicit deny) for an iterable of flow tuples, converted in chunks."""
+       out: List[np.ndarray] = []
+       chunk: List[Flow] = []
+       for flow in flows:
+           chunk.append(flow)
+           if len(chunk) >= chunk_size:
+               out.append(self._lookup_chunk(chunk))
+               chunk = []
+       if chunk:
+           out.append(self._lookup_chunk(chunk))
+       return np.concatenate(out) if out else np.empty(0, dtype=np.int64)
+   def _lookup_chunk(self, chunk: List[Flow]) -> np.ndarray:
+       sif, dif, src, dst, proto, port = zip(*chunk)
+       return self.lookup_arrays(
+           [ip_value(x) for x in src], [ip_value(x) for x in dst],
+           [protocol_number(x) for x in proto], port, list(sif), list(dif),
+       )
@@ -0,0 +1,183 @@
+# policy_matrix.py
+"""
+NumPy view of a rulebase for rulebase-wide questions.
+Each match dimension (source/destination interface, source/destination
+address, service) is cut into atoms: the elementary segments between all span
+bounds, or the interface names plus one "other" atom only `any` matches. Every
+distinct value becomes a boolean row over its dimension's atoms, so
+
+   overlap(u, v)   = rows share an atom       = (R @ R.T) > 0
+
+for all pairs at once. Per-policy questions gather this distinct-value
+matrix by each policy's value ids. Single-rule coverage is the sweep in
+policy_engine.first_coverers; its result is passed in, not recomputed.
+A rule is union-shadowed when every combination of atoms it matches is matched
+by some earlier rule (any action), even though no single earlier rule covers
+it. The check multiplies, over the earlier rules that overlap it, the
+source x destination atom grid by the service x interface atom grid:
+cells with a zero count are traffic only this rule can see.
+"""
+from __future__ import annotations
+from bisect import bisect_left
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+import numpy as np
+from fw_objects import Span, pairs
+from policy_engine import ANY_INTERFACE, first_coverers
+from policy_model import PolicyRecord
+# Distinct values x atoms per dimension above which the matrix is not built.
+MATRIX_MAX_CELLS = 1 << 26
+# Atom grid cells one union-shadow check may evaluate.
+UNION_MAX_CELLS = 1 << 22
+# Policies per VDOM up to which analyze_tree runs the union-shadow check.
+UNION_SHADOW_MAX_POLICIES = 5000
+# Covering policy ids listed per union-shadowed rule.
+UNION_SHOWN_IDS = 25
+def _ids(values: Sequence) -> Tuple[np.ndarray, List]:
+   index: Dict = {}
+   ids = np.fromiter((index.setdefault(v, len(index)) for v in values), dtype=np.int64, count=len(values))
+   return ids, list(index)
+def _distinct_columns(rows: np.ndarray) -> np.ndarray:
+   """Atoms every row treats alike act as one atom; keep one column per pattern."""
+   packed = np.ascontiguousarray(np.packbits(rows, axis=0).T)
+   keys = packed.view(np.dtype((np.void, packed.shape[1]))).ravel()
+   return rows[:, np.unique(keys, return_index=True)[1]]
+def span_rows(values: List[Span]) -> np.ndarray:
+   """Boolean rows of distinct spans over their elementary segments."""
+   bounds = sorted({b for v in values for b in v})
+   rows = np.zeros((len(values), max(len(bounds) - 1, 0)), dtype=bool)
+   for u, span in enumerate(values):
+       for s, e in pairs(span):
+           rows[u, bisect_left(bounds, s):bisect_left(bounds, e)] = True
+   return rows
+def interface_rows(values: List[FrozenSet[str]]) -> np.ndarray:
+   names = sorted({n for v in values for n in v if n != ANY_INTERFACE})
+   col = {n: k for k, n in enumerate(names)}
+   rows = np.zeros((len(values), len(names) + 1), dtype=bool)
+   for u, v in enumerate(values):
+       if ANY_INTERFACE in v:
+           rows[u] = True
+       else:
+           rows[u, [col[n] for n in v]] = True
+   return rows
+class Dimension:
+   """One match field: per-policy value ids and distinct-value rows over atoms."""
+   __slots__ = ("ids", "rows", "_overlap")
+   def __init__(self, ids: np.ndarray, rows: np.ndarray):
+       self.ids = ids
+       self.rows = rows
+       self._overlap: Optional[np.ndarray] = None
+   @property
+   def overlap(self) -> np.ndarray:
+       """[u, v]: distinct values u and v share an atom."""
+       if self._overlap is None:
+           r = self.rows.astype(np.float32)
+           self._overlap = (r @ r.T) > 0
+       return self._overlap
+class PolicyMatrix:
+   """Rulebase encoded as per-dimension atom rows; see the module docstring."""
+   FIELDS = ("sif", "dif", "src", "dst", "svc")
+   def __init__(self, records: List[PolicyRecord]):
+       self.records = records
+       self.n = len(records)
+       self.dims: List[Dimension] = []
+       for name in self.FIELDS:
+           ids, values = _ids([getattr(r, name) for r in records])
+           rows = interface_rows(values) if name in ("sif", "dif") else span_rows(values)
+           self.dims.append(Dimension(ids, rows))
+   @classmethod
+   def fits(cls, records: List[PolicyRecord]) -> bool:
+       """Whether every dimension's distinct-value x atom matrix stays under MATRIX_MAX_CELLS."""
+       for name in cls.FIELDS:
+           values = {getattr(r, name) for r in records}
+           if name in ("sif", "dif"):
+               atoms = len({n for v in values for n in v}) + 1
+           else:
+               atoms = len({b for v in values for b in v})
+           if len(values) * atoms > MATRIX_MAX_CELLS:
+               return False
+       return True
+   # -------------------------
+   # Pairwise relations
+   # -------------------------
+   def overlap_row(self, i: int, upto: Optional[int] = None) -> np.ndarray:
+       """[j]: rule j (j < upto) can match some packet rule i matches."""
+       upto = self.n if upto is None else upto
+       out = np.ones(upto, dtype=bool)
+       for d in self.dims:
+           out &= d.overlap[d.ids[i], d.ids[:upto]]
+       return out
+   # -------------------------
+   # Union shadowing
+   # -------------------------
+   def union_covered(self, i: int) -> Optional[np.ndarray]:
+       """
+       Positions of the earlier rules overlapping rule i when together they match
+       everything rule i matches; None when they don't or the atom grid would
+       exceed UNION_MAX_CELLS.
+       """
+       if i == 0:
+           return None
+       before = np.flatnonzero(self.overlap_row(i, i))
+       if not len(before):
+           return None
+       atoms = []
+       for d in self.dims:
+           own = d.rows[d.ids[i]]
+           sub = d.rows[d.ids[before]][:, own]
+           if not sub.size or not sub.any(axis=0).all():
+               # Some atom of this dimension is matched by no earlier rule.
+               return None
+           atoms.append(_distinct_columns(sub))
+       sif, dif, src, dst, svc = atoms
+       k = len(before)
+       width = src.shape[1] * dst.shape[1]
+       height = svc.shape[1] * sif.shape[1] * dif.shape[1]
+       if max(k, width) * height > UNION_MAX_CELLS or k * width > UNION_MAX_CELLS:
+           return None
+       left = (src[:, :, None] & dst[:, None, :]).reshape(k, -1).astype(np.float32)
+       right = (svc[:, :, None, None] & sif[:, None, :, None] & dif[:, None, None, :]).reshape(k, -1).astype(np.float32)
+       if (left.T @ right).min() > 0:
+           return before
+       return None
+   def union_shadowed(self, skip: Sequence[int] = (), start: int = 0) -> List[Tuple[int, np.ndarray]]:
+       """(position, earlier overlapping positions) for union-covered rules at position >= start, excluding `skip`."""
+       skip = set(skip)
+       out = []
+       for i in range(max(start, 1), self.n):
+           if i in skip:
+               continue
+           before = self.union_covered(i)
+           if before is not None:
+               out.append((i, before))
+       return out
+def find_union_shadowed(records: List[PolicyRecord], start: int = 0, vdom: str = "root",
+                        coverers: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+   """
+   Rules at position >= `start` that never match a packet first although no
+   single earlier rule covers them (those are in find_shadowed): only several
+   earlier rules together do. `coverers` is first_coverers(records, start,
+   same_action=False) when the caller already has it. Skipped above
+   UNION_SHADOW_MAX_POLICIES policies.
+   """
+   if start >= len(records) or len(records) > UNION_SHADOW_MAX_POLICIES or not PolicyMatrix.fits(records):
+       return []
+   matrix = PolicyMatrix(records)
+   if coverers is None:
+       coverers = first_coverers(records, start, same_action=False)
+   skip = [i for i, by in enumerate(coverers) if by >= 0]
+   rows: List[Dict[str, Any]] = []
+   for i, before in matrix.union_shadowed(skip, start):
+       curr = records[i]
+       by, reason = list(before), "Covered only by a combination of earlier rules"
+       ids = [records[j].policy_id for j in by]
+       shown = " ".join(map(str, ids[:UNION_SHOWN_IDS]))
+       if len(ids) > UNION_SHOWN_IDS:
+           shown += f" (+{len(ids) - UNION_SHOWN_IDS} more)"
+       rows.append({
+           "vdom": vdom,
+           "policy_id": curr.policy_id,
+           "covered_by": shown,
+           "same_action": "YES" if all(records[j].action_key == curr.action_key for j in by) else "NO",
+           "reason": reason,
+       })
+   return rows
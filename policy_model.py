@@ -0,0 +1,122 @@
+# policy_model.py
+"""
+Compact firewall policy records, built once per parse.
+List fields are tokenized a single time per distinct raw value and every token
+and token tuple is interned, so thousands of policies referencing `"all"` or
+`"port1"` share the same objects. Address and service fields are resolved to
+interval sets through the VDOM's object tables (see fw_objects).
+"""
+from __future__ import annotations
+import re
+import sys
+from typing import TYPE_CHECKING, Dict, FrozenSet, List, Mapping, Optional, Tuple
+if TYPE_CHECKING:
+   from fw_objects import PolicyObjects
+UTM_KEYS = (
+   "av-profile", "ips-sensor", "webfilter-profile",
+   "application-list", "ssl-ssh-profile", "profile-protocol-options"
+)
+# PolicyRecord.flags bits: the boolean fields packed into one int for columnar scoring.
+FLAG_ACCEPT, FLAG_ANY_SRC, FLAG_ANY_DST, FLAG_ANY_SVC, FLAG_LOGGED, FLAG_UTM = 1, 2, 4, 8, 16, 32
+FLAG_VALUES = 64
+# Settings left out of PolicyRecord.settings: labels, and the fields a consolidation may merge.
+SETTINGS_IGNORED = frozenset(("name", "uuid", "comments", "srcaddr", "dstaddr", "service"))
+_TOKEN_RE = re.compile(r'"([^"]+)"|(\S+)')
+def norm_list_val(v) -> List[str]:
+   if not v:
+       return []
+   tokens = _TOKEN_RE.findall(str(v))
+   return [a if a else b for a, b in tokens]
+def has_utm(p: Mapping[str, str]) -> bool:
+   return any(k in p and p.get(k) not in (None, "", "0", "\"\"") for k in UTM_KEYS)
+class PolicyRecord:
+   """
+   One firewall policy. `srcintf` .. `service` keep the tokens as written (for
+   display and signatures); `src`/`dst`/`svc` are the resolved address and
+   service spans (negation applied) and `sif`/`dif` the lower-cased interface
+   sets used for matching. `settings` holds every other setting as sorted
+   (key, value) pairs: policies with equal settings differ only in name and
+   in the addresses and services they match.
+   """
+   __slots__ = (
+       "policy_id", "name", "status", "action", "action_key", "schedule", "logtraffic",
+       "srcintf", "dstintf", "srcaddr", "dstaddr", "service",
+       "sif", "dif", "src", "dst", "svc", "any_src", "any_dst", "any_svc", "broad_svc",
+       "accept", "logged", "utm", "flags", "settings",
+   )
+   def __repr__(self) -> str:
+       return f"PolicyRecord({self.policy_id}, {self.action_key}, {self.srcaddr}->{self.dstaddr} {self.service})"
+class TokenPool:
+   """Per-parse interning of tokens, token tuples, name sets and strings."""
+   __slots__ = ("_split", "_sets", "_strings", "_settings")
+   def __init__(self):
+       self._split: Dict[str, Tuple[str, ...]] = {}
+       self._sets: Dict[Tuple[str, ...], FrozenSet[str]] = {}
+       self._strings: Dict[str, str] = {}
+       self._settings: Dict[Tuple[Tuple[str, str], ...], Tuple[Tuple[str, str], ...]] = {}
+   def string(self, s: str) -> str:
+       return self._strings.setdefault(s, s)
+   def tokens(self, raw) -> Tuple[str, ...]:
+       if not raw:
+           return ()
+       t = self._split.get(raw)
+       if t is None:
+           t = self._split[raw] = tuple(sys.intern(a or b) for a, b in _TOKEN_RE.findall(raw))
+       return t
+   def settings(self, p: Mapping[str, str]) -> Tuple[Tuple[str, str], ...]:
+       key = tuple(sorted((k, v) for k, v in p.items() if k not in SETTINGS_IGNORED))
+       return self._settings.setdefault(key, key)
+   def name_set(self, tokens: Tuple[str, ...]) -> FrozenSet[str]:
+       k = self._sets.get(tokens)
+       if k is None:
+           k = self._sets[tokens] = frozenset(sys.intern(x.lower()) for x in tokens)
+       return k
+def _enabled(p: Mapping[str, str], key: str) -> bool:
+   return p.get(key, "").strip('"') == "enable"
+def build_policy_record(pid: int, p: Mapping[str, str], pool: TokenPool, objects: "PolicyObjects") -> PolicyRecord:
+   tokens = pool.tokens
+   r = PolicyRecord()
+   r.policy_id = pid
+   r.name = p.get("name", "")
+   r.status = pool.string(p.get("status", "enable"))
+   r.action = pool.string(p.get("action", ""))
+   r.action_key = pool.string(r.action.strip('"').lower())
+   r.schedule = pool.string(p.get("schedule", ""))
+   r.logtraffic = pool.string(p.get("logtraffic", ""))
+   r.srcintf = tokens(p.get("srcintf"))
+   r.dstintf = tokens(p.get("dstintf"))
+   r.srcaddr = tokens(p.get("srcaddr"))
+   r.dstaddr = tokens(p.get("dstaddr"))
+   r.service = tokens(p.get("service"))
+   r.sif = pool.name_set(r.srcintf)
+   r.dif = pool.name_set(r.dstintf)
+   addresses = objects.addresses
+   r.src = addresses.field(r.srcaddr, _enabled(p, "srcaddr-negate"))
+   if _enabled(p, "internet-service"):
+       # ISDB destinations are not IP objects we can expand.
+       r.dst = addresses.opaque("isdb:" + " ".join(tokens(p.get("internet-service-name"))))
+   else:
+       r.dst = addresses.field(r.dstaddr, _enabled(p, "dstaddr-negate"))
+   r.svc = objects.services.field(r.service, _enabled(p, "service-negate"))
+   r.any_src = addresses.is_any(r.src)
+   r.any_dst = addresses.is_any(r.dst)
+   r.any_svc = objects.services.is_any(r.svc)
+   # Every TCP or UDP port counts as ANY-SVC for permissive scoring, not as ANY for merges or labels.
+   r.broad_svc = objects.services.is_broad(r.svc)
+   r.accept = r.action_key == "accept"
+   r.logged = r.logtraffic.strip('"').lower() not in ("disable", "none", "")
+   r.utm = has_utm(p)
+   r.flags = (r.accept * FLAG_ACCEPT | r.any_src * FLAG_ANY_SRC | r.any_dst * FLAG_ANY_DST
+              | r.broad_svc * FLAG_ANY_SVC | r.logged * FLAG_LOGGED | r.utm * FLAG_UTM)
+   r.settings = pool.settings(p)
+   return r
+def build_policy_records(policies: Mapping[str, Mapping[str, str]], objects: Optional["PolicyObjects"] = None) -> List[PolicyRecord]:
+   """
+   Records for every numbered policy in config sequence, the order FortiOS
+   evaluates them in; a moved rule keeps its id but not its position.
+   """
+   if objects is None:
+       from fw_objects import PolicyObjects
+       objects = PolicyObjects()
+   pool = TokenPool()
+   return [build_policy_record(int(k), p, pool, objects) for k, p in policies.items() if str(k).isdigit()]
@@ -0,0 +1,261 @@
+# policy_overlap.py
+"""
+Partial-overlap detection: pairs of rules that match some common traffic.
+Two rules overlap when their source/destination interfaces, addresses and
+services all intersect. Interfaces are put on a line too (one unit per name,
+plus one only `any` covers), so every field is a span and the question is the
+same interval problem five times over.
+A sweep over interval starts finds, for each interval, the intervals starting
+inside it: every overlapping pair exactly once, and the number of such pairs is
+a searchsorted away before anything is enumerated. Besides the five fields, an
+address or service field is also swept per (srcintf unit, dstintf unit) pair,
+each pair getting its own stretch of a compressed line, so those candidates
+already overlap in both interfaces. Candidates come from whichever sweep has
+the fewest, and the remaining fields are checked on whole columns of pairs:
+bounds first (exact when both spans are one interval), then a binary search
+of each interval into the other span. Work therefore follows the overlaps of
+the most selective field rather than all pairs of rules.
+Earlier and later mean config sequence, the order FortiOS evaluates rules in,
+whatever the policy ids. Overlapping pairs where the earlier rule covers the
+later one are shadowing (analyzer.find_shadowed_redundant) and are not
+repeated here. Of the rest, an accept and a non-accept rule are a conflict,
+two accepts a correlation.
+"""
+from __future__ import annotations
+from itertools import chain
+from typing import Any, Dict, List, Sequence, Tuple
+import numpy as np
+from fw_objects import Span
+from policy_engine import ANY_INTERFACE
+from policy_model import PolicyRecord
+# Candidate pairs enumerated per block.
+OVERLAP_BLOCK_PAIRS = 1 << 22
+# Interval count up to which the per-interface-pair sweeps are built.
+OVERLAP_MAX_INTERVALS = 1 << 24
+# Conflict/correlation rows kept per VDOM (earliest later-rule first).
+OVERLAP_MAX_ROWS = 100000
+def interface_spans(values: Sequence[frozenset]) -> List[Span]:
+   """Interface name sets as spans: name k is [k, k+1); `any` also covers the unit past the last name."""
+   names = sorted({n for v in values for n in v if n != ANY_INTERFACE})
+   index = {n: k for k, n in enumerate(names)}
+   everything = (0, len(names) + 1)
+   out: List[Span] = []
+   memo: Dict[frozenset, Span] = {}
+   for v in values:
+       span = memo.get(v)
+       if span is None:
+           if ANY_INTERFACE in v:
+               span = everything
+           else:
+               # Adjacent names merge into one interval.
+               merged: List[int] = []
+               for k in sorted(index[n] for n in v):
+                   if merged and merged[-1] == k:
+                       merged[-1] = k + 1
+                   else:
+                       merged += [k, k + 1]
+               span = tuple(merged)
+           memo[v] = span
+       out.append(span)
+   return out
+class _Field:
+   """
+   One field's per-rule spans, their bounds and their intervals as columns in
+   rule order. Interval bounds are also ranked among all of the field's bounds,
+   and `key` (owner * width + start rank) is ascending, so a binary search
+   finds an interval of a given rule's span.
+   """
+   __slots__ = ("spans", "lo", "hi", "simple", "lengths", "offset", "starts", "ends", "rs", "re", "width", "key")
+   def __init__(self, spans: List[Span]):
+       n = len(spans)
+       self.spans = spans
+       self.lo = np.fromiter((s[0] if s else 0 for s in spans), dtype=np.int64, count=n)
+       self.hi = np.fromiter((s[-1] if s else 0 for s in spans), dtype=np.int64, count=n)
+       self.simple = np.fromiter((len(s) == 2 for s in spans), dtype=bool, count=n)
+       self.lengths = np.fromiter((len(s) // 2 for s in spans), dtype=np.int64, count=n)
+       self.offset = np.cumsum(self.lengths) - self.lengths
+       flat = np.fromiter(chain.from_iterable(spans), dtype=np.int64, count=int(self.lengths.sum()) * 2)
+       self.starts, self.ends = flat[0::2], flat[1::2]
+       bounds, inverse = np.unique(flat, return_inverse=True)
+       self.rs, self.re = inverse[0::2], inverse[1::2]
+       self.width = len(bounds) + 1
+       self.key = self.owners() * self.width + self.rs
+   def owners(self) -> np.ndarray:
+       return np.repeat(np.arange(len(self.spans), dtype=np.int64), self.lengths)
+   def _expand(self, a: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+       """(pair index, interval index, segment starts) over every interval of each rule in `a`."""
+       k = self.lengths[a]
+       seg = np.cumsum(k) - k
+       pair = np.repeat(np.arange(len(a), dtype=np.int64), k)
+       return pair, self.offset[a][pair] + np.arange(int(k.sum()), dtype=np.int64) - seg[pair], seg
+   def overlaps(self, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+       """Exact span overlap per pair: the last interval of one span starting before an interval of the other ends."""
+       if not len(i):
+           return np.zeros(0, dtype=bool)
+       swap = self.lengths[i] > self.lengths[j]
+       a, b = np.where(swap, j, i), np.where(swap, i, j)
+       pair, iv, seg = self._expand(a)
+       other = b[pair]
+       p = np.searchsorted(self.key, other * self.width + self.re[iv], side="left") - 1
+       hit = (p >= self.offset[other]) & (self.re[p] > self.rs[iv])
+       return np.maximum.reduceat(hit, seg) if len(hit) else np.zeros(len(i), dtype=bool)
+   def contains(self, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+       """Exact span containment per pair (i's span contains j's): each interval of j lies in one of i."""
+       out = np.ones(len(i), dtype=bool)
+       some = np.flatnonzero(self.lengths[j] > 0)
+       if not len(some):
+           return out
+       i, j = i[some], j[some]
+       pair, iv, seg = self._expand(j)
+       outer = i[pair]
+       p = np.searchsorted(self.key, outer * self.width + self.rs[iv], side="right") - 1
+       inside = (p >= self.offset[outer]) & (self.re[p] >= self.re[iv])
+       out[some] = np.minimum.reduceat(inside, seg)
+       return out
+class _Sweep:
+   """Intervals sorted by start; interval r overlaps the ones at ranks r+1 .. hi_rank[r]-1."""
+   __slots__ = ("fields", "owner", "counts")
+   def __init__(self, fields: Tuple[_Field, ...], starts: np.ndarray, ends: np.ndarray, owner: np.ndarray):
+       self.fields = fields
+       order = np.argsort(starts, kind="stable")
+       starts = starts[order]
+       self.owner = owner[order]
+       hi_rank = np.searchsorted(starts, ends[order], side="left")
+       self.counts = hi_rank - np.arange(len(starts)) - 1
+   def candidates(self) -> int:
+       return int(self.counts.sum())
+   def blocks(self):
+       """(a, b) rule columns of every overlapping interval pair, in blocks of about OVERLAP_BLOCK_PAIRS."""
+       counts, owner = self.counts, self.owner
+       ends = np.cumsum(counts)
+       r0 = 0
+       while r0 < len(counts):
+           base = ends[r0] - counts[r0]
+           r1 = max(int(np.searchsorted(ends, base + OVERLAP_BLOCK_PAIRS, side="right")), r0 + 1)
+           c = counts[r0:r1]
+           total = int(c.sum())
+           if total:
+               first = np.repeat(np.arange(r0, r1, dtype=np.int64), c)
+               offset = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(c) - c, c)
+               yield owner[first], owner[first + 1 + offset]
+           r0 = r1
+def _interface_units(sif: _Field, dif: _Field) -> Tuple[np.ndarray, np.ndarray]:
+   """(units, lengths): per rule, the ids of the (srcintf unit, dstintf unit) pairs it matches."""
+   width = int(dif.hi.max()) if len(dif.hi) else 0
+   memo: Dict[Tuple[Span, Span], List[int]] = {}
+   units: List[List[int]] = []
+   for s, d in zip(sif.spans, dif.spans):
+       u = memo.get((s, d))
+       if u is None:
+           srcs = [k for a, b in zip(s[0::2], s[1::2]) for k in range(a, b)]
+           dsts = [k for a, b in zip(d[0::2], d[1::2]) for k in range(a, b)]
+           u = memo[(s, d)] = [x * width + y for x in srcs for y in dsts]
+       units.append(u)
+   lengths = np.fromiter((len(u) for u in units), dtype=np.int64, count=len(units))
+   return np.fromiter(chain.from_iterable(units), dtype=np.int64, count=int(lengths.sum())), lengths
+def _composite(sif: _Field, dif: _Field, units: np.ndarray, unit_lengths: np.ndarray, f: _Field):
+   """Sweep of field `f` with every interval repeated once per interface unit pair, on its own stretch."""
+   per_rule = unit_lengths * f.lengths
+   total = int(per_rule.sum())
+   if total > OVERLAP_MAX_INTERVALS:
+       return None
+   width, cs, ce = f.width, f.rs, f.re
+   owner = np.repeat(np.arange(len(per_rule), dtype=np.int64), per_rule)
+   t = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(per_rule) - per_rule, per_rule)
+   k = f.lengths[owner]
+   unit = units[(np.cumsum(unit_lengths) - unit_lengths)[owner] + t // k]
+   interval = (np.cumsum(f.lengths) - f.lengths)[owner] + t % k
+   base = unit * width
+   return _Sweep((sif, dif, f), base + cs[interval], base + ce[interval], owner)
+def _fields(records: Sequence[PolicyRecord]) -> List[_Field]:
+   return [
+       _Field(interface_spans([r.sif for r in records])),
+       _Field(interface_spans([r.dif for r in records])),
+       _Field([r.src for r in records]),
+       _Field([r.dst for r in records]),
+       _Field([r.svc for r in records]),
+   ]
+def _check(fields: List[_Field], i: np.ndarray, j: np.ndarray, test: str) -> np.ndarray:
+   """
+   Per pair, `test` ("overlaps" or "contains") holds in every field. The same
+   test on the spans' bounds decides pairs of one-interval spans and prefilters
+   the rest, which the field's exact method settles.
+   """
+   ok = np.ones(len(i), dtype=bool)
+   vector = _overlap_vector if test == "overlaps" else _contains_vector
+   for f in fields:
+       both = f.simple[i] & f.simple[j]
+       ok &= vector(f, i, j)
+       rest = np.flatnonzero(ok & ~both)
+       if len(rest):
+           ok[rest] = getattr(f, test)(i[rest], j[rest])
+   return ok
+def _overlap_vector(f: _Field, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+   return (f.lo[i] < f.hi[j]) & (f.lo[j] < f.hi[i])
+def _contains_vector(f: _Field, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+   return (f.lo[i] <= f.lo[j]) & (f.hi[j] <= f.hi[i])
+def _pairs(fields: List[_Field], start: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+   """Overlapping (i, j), i < j, with j at `start` or after."""
+   n = len(fields[0].spans)
+   sif, dif = fields[0], fields[1]
+   sweeps = [_Sweep((f,), f.starts, f.ends, f.owners()) for f in fields]
+   units, unit_lengths = _interface_units(sif, dif)
+   for f in fields[2:]:
+       sweep = _composite(sif, dif, units, unit_lengths, f)
+       if sweep is not None:
+           sweeps.append(sweep)
+   sweep = min(sweeps, key=_Sweep.candidates)
+   others = [f for f in fields if all(f is not g for g in sweep.fields)]
+   keys: List[np.ndarray] = []
+   for a, b in sweep.blocks():
+       i, j = np.minimum(a, b), np.maximum(a, b)
+       keep = (i != j) & (j >= start)
+       for f in others:
+           # Bounding boxes must overlap; exact for one-interval spans.
+           keep &= _overlap_vector(f, i, j)
+       keys.append(i[keep] * n + j[keep])
+   key = np.sort(np.concatenate(keys)) if keys else np.empty(0, dtype=np.int64)
+   # Rules with several intervals can meet more than once.
+   key = key[np.concatenate(([True], key[1:] != key[:-1]))] if len(key) else key
+   i, j = np.divmod(key, n)
+   ok = _check(others, i, j, "overlaps")
+   return i[ok], j[ok]
+def overlapping_pairs(records: Sequence[PolicyRecord]) -> Tuple[np.ndarray, np.ndarray]:
+   """(i, j) positions, i < j, of every pair of rules that overlap in all five fields."""
+   return _pairs(_fields(records))
+def find_conflicts(records: List[PolicyRecord], vdom: str = "root", start: int = 0,
+                   max_rows: int = OVERLAP_MAX_ROWS) -> List[Dict[str, Any]]:
+   """
+   Conflicts (accept vs non-accept) and correlations (accept vs accept) between
+   enabled rules that partially overlap, one row per (later rule, earlier rule)
+   pair. At most `max_rows` rows per VDOM. Only later rules at position `start`
+   or after are reported; rows are ordered by later rule, so the rows for
+   records[:start] are a prefix of the full result.
+   """
+   live = [r for r in records if r.status.strip('"').lower() != "disable"]
+   if len(live) < 2 or max_rows <= 0:
+       return []
+   fields = _fields(live)
+   i, j = _pairs(fields, sum(r.status.strip('"').lower() != "disable" for r in records[:start]))
+   accept = np.fromiter((r.accept for r in live), dtype=bool, count=len(live))
+   keep = accept[i] | accept[j]
+   i, j = i[keep], j[keep]
+   # Earlier rule covering the later one is shadowing, reported elsewhere.
+   shadow = _check(fields, i, j, "contains")
+   i, j = i[~shadow], j[~shadow]
+   order = np.lexsort((i, j))[:max_rows]
+   i, j = i[order], j[order]
+   narrower = _check(fields, j, i, "contains")
+   rows: List[Dict[str, Any]] = []
+   for a, b, inside in zip(i.tolist(), j.tolist(), narrower.tolist()):
+       earlier, later = live[a], live[b]
+       rows.append({
+           "vdom": vdom,
+           "policy_id": later.policy_id,
+           "action": later.action_key,
+           "overlaps_with": earlier.policy_id,
+           "other_action": earlier.action_key,
+           "type": "Correlation" if earlier.accept and later.accept else "Conflict",
+           "relation": "Earlier rule is narrower" if inside else "Partial overlap",
+       })
+   return rows
@@ -0,0 +1,168 @@
+# reachability.py
+"""
+Zone reachability graph: which interface or zone can open sessions to which,
+directly or through intermediate zones.
+Nodes are the interface/zone names enabled accept policies reference (`any`
+stands for every node). Each policy adds an edge from every source to every
+destination interface, and each edge carries the union of its policies'
+addresses and services. Multi-hop reachability is the boolean closure of the
+adjacency matrix A, one level at a time:
+
+   R_1 = A,   R_h = R_h-1 | (R_h-1 @ A)
+
+with a float32 matmul per level, so the graph is done after `diameter`
+products however many interfaces and zones there are. The level a pair first
+appears at is its hop count; a predecessor per (source, node) gives one
+shortest path for display.
+A transitive path assumes a host reached in the middle zone is used as a
+pivot; `pivot` says whether each hop's destinations overlap the next hop's
+sources, i.e. whether the rules themselves allow the pivot host to go on.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Sequence, Tuple
+import numpy as np
+from fw_objects import Span, overlaps, union
+from policy_engine import ANY_INTERFACE
+from policy_model import PolicyRecord
+# Address/service names and policy ids listed per edge.
+REACH_SHOWN_NAMES = 25
+def _shown(values: Sequence, limit: int = REACH_SHOWN_NAMES) -> str:
+   text = " ".join(str(v) for v in values[:limit])
+   return text + f" (+{len(values) - limit} more)" if len(values) > limit else text
+class Edge:
+   """The accept policies from one node to another and what they allow."""
+   __slots__ = ("positions", "policy_ids", "srcaddr", "dstaddr", "service", "src", "dst")
+   def __init__(self, records: Sequence[PolicyRecord], positions: Tuple[int, ...]):
+       rules = [records[i] for i in positions]
+       self.positions = positions
+       self.policy_ids = [r.policy_id for r in rules]
+       self.srcaddr = "all" if any(r.any_src for r in rules) else _shown(sorted({a for r in rules for a in r.srcaddr}))
+       self.dstaddr = "all" if any(r.any_dst for r in rules) else _shown(sorted({a for r in rules for a in r.dstaddr}))
+       self.service = "ALL" if any(r.any_svc for r in rules) else _shown(sorted({s for r in rules for s in r.service}))
+       self.src: Span = union(r.src for r in rules)
+       self.dst: Span = union(r.dst for r in rules)
+class ZoneGraph:
+   """Interface/zone graph of one VDOM's enabled accept policies."""
+   def __init__(self, records: Sequence[PolicyRecord]):
+       rules = [i for i, r in enumerate(records) if r.accept and r.status.strip('"').lower() != "disable"]
+       names: Dict[str, str] = {}
+       for i in rules:
+           for raw in records[i].srcintf + records[i].dstintf:
+               key = raw.lower()
+               if key != ANY_INTERFACE:
+                   names.setdefault(key, raw)
+       if not names and rules:
+           names[ANY_INTERFACE] = ANY_INTERFACE
+       self.nodes: List[str] = sorted(names)
+       self.labels: List[str] = [names[k] for k in self.nodes]
+       index = {name: k for k, name in enumerate(self.nodes)}
+       everything = list(range(len(self.nodes)))
+       def ends(names_: frozenset) -> List[int]:
+           return everything if ANY_INTERFACE in names_ else [index[n] for n in names_ if n in index]
+       by_pair: Dict[Tuple[int, int], List[int]] = {}
+       for i in rules:
+           r = records[i]
+           dsts = ends(r.dif)
+           for s in ends(r.sif):
+               for d in dsts:
+                   by_pair.setdefault((s, d), []).append(i)
+       # Edges sharing a policy set (typically everything an any -> any rule adds) share one annotation.
+       shared: Dict[Tuple[int, ...], Edge] = {}
+       self.edges: Dict[Tuple[int, int], Edge] = {}
+       for pair, positions in by_pair.items():
+           key = tuple(positions)
+           edge = shared.get(key)
+           if edge is None:
+               edge = shared[key] = Edge(records, key)
+           self.edges[pair] = edge
+       n = len(self.nodes)
+       self.adjacency = np.zeros((n, n), dtype=bool)
+       if self.edges:
+           s, d = np.array(list(self.edges), dtype=np.int64).T
+           self.adjacency[s, d] = True
+       self.hops, self.pred = self._closure()
+   def _closure(self) -> Tuple[np.ndarray, np.ndarray]:
+       """(hops, pred): shortest hop count per pair (0 = unreachable) and the node before the last hop."""
+       a = self.adjacency
+       n = len(a)
+       hops = np.zeros((n, n), dtype=np.int32)
+       hops[a] = 1
+       reach = a.copy()
+       frontier = a
+       af = a.astype(np.float32)
+       level = 1
+       while frontier.any():
+           level += 1
+           frontier = ((frontier.astype(np.float32) @ af) > 0) & ~reach
+           hops[frontier] = level
+           reach |= frontier
+       pred = np.tile(np.arange(n, dtype=np.int32)[:, None], (1, n))
+       for src in range(n):
+           row = hops[src]
+           for h in range(2, int(row.max()) + 1):
+               before = np.flatnonzero(row == h - 1)
+               now = np.flatnonzero(row == h)
+               pred[src, now] = before[a[np.ix_(before, now)].argmax(axis=0)]
+       return hops, pred
+   def path(self, src: int, dst: int) -> List[int]:
+       """One shortest node path from src to dst (empty when unreachable)."""
+       h = int(self.hops[src, dst])
+       if not h:
+           return []
+       out = [dst]
+       for _ in range(h - 1):
+           out.append(int(self.pred[src, out[-1]]))
+       out.append(src)
+       return out[::-1]
+   def rows(self, vdom: str = "root") -> List[Dict[str, Any]]:
+       """
+       Every reachable (source, destination) pair: direct edges first, then by
+       hop count. A path extends the path to its predecessor by one edge, so
+       each row reuses the path text, policy chain and pivot check of a row
+       listed before it.
+       """
+       labels, edges, pred = self.labels, self.edges, self.pred
+       src_idx, dst_idx = np.nonzero(self.hops)
+       hop_counts = self.hops[src_idx, dst_idx]
+       order = np.lexsort((dst_idx, src_idx, hop_counts))
+       # (source, node) -> (path text, first policy per hop, pivot ok, first edge, last edge)
+       done: Dict[Tuple[int, int], Tuple[str, str, bool, Edge, Edge]] = {}
+       pivot: Dict[Tuple[int, int], bool] = {}
+       out: List[Dict[str, Any]] = []
+       for s, d, h in zip(src_idx[order].tolist(), dst_idx[order].tolist(), hop_counts[order].tolist()):
+           if h == 1:
+               edge = edges[(s, d)]
+               text, via, ok, first, last = labels[s] + " -> " + labels[d], str(edge.policy_ids[0]), True, edge, edge
+               indicator = "Hairpin / Same-Zone" if s == d else "Direct"
+               policies = _shown(edge.policy_ids)
+           else:
+               if s == d:
+                   continue
+               p = int(pred[s, d])
+               text, via, ok, first, prev = done[(s, p)]
+               last = edges[(p, d)]
+               key = (id(prev), id(last))
+               if ok and key not in pivot:
+                   pivot[key] = overlaps(prev.dst, last.src)
+               ok = ok and pivot[key]
+               text, via = text + " -> " + labels[d], via + " -> " + str(last.policy_ids[0])
+               indicator = "Transitive"
+               policies = via
+           done[(s, d)] = text, via, ok, first, last
+           out.append({
+               "vdom": vdom,
+               "srcintf": labels[s],
+               "dstintf": labels[d],
+               "hops": h,
+               "path": text,
+               "policies": policies,
+               "srcaddr": first.srcaddr,
+               "dstaddr": last.dstaddr,
+               "service": last.service,
+               "pivot": "" if h == 1 else ("YES" if ok else "NO"),
+               "indicator": indicator,
+           })
+       return out
+def zone_reachability(records: Sequence[PolicyRecord], vdom: str = "root") -> List[Dict[str, Any]]:
+   """Direct and multi-hop interface/zone reachability rows for one VDOM (see ZoneGraph)."""
+   return ZoneGraph(records).rows(vdom)
@@ -3,6 +3,7 @@ from io import BytesIO
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment
 from openpyxl.utils import get_column_letter
+from analyzer import permissive_view
 HEADER_FILL = PatternFill("solid", start_color="D9E1F2", end_color="D9E1F2")
 PASS_FILL = PatternFill("solid", start_color="C6EFCE", end_color="C6EFCE")
 FAIL_FILL = PatternFill("solid", start_color="FFC7CE", end_color="FFC7CE")
@@ -73,12 +74,21 @@ def build_excel_report(result) -> bytes:
    dash["A16"] = "Duplicates";                  dash["B16"] = len(result.duplicates)
    dash["A17"] = "Shadowed";                    dash["B17"] = len(result.shadowed)
    dash["A18"] = "Redundant";                   dash["B18"] = len(result.redundant)
+   dash["A19"] = "Union-Shadowed";              dash["B19"] = len(getattr(result, "union_shadowed", []) or [])
    dash["A20"] = "Internet UTM coverage %";     dash["B20"] = result.sec_profile_coverage.get("utm_coverage_pct", 0)
+   dash["A21"] = "Transitive Zone Paths";       dash["B21"] = sum(1 for r in getattr(result, "reachability", []) or [] if r["hops"] > 1)
+   consolidation = getattr(result, "consolidation", []) or []
+   removable = sum(g["removed"] for g in consolidation)
+   dash["A22"] = "Consolidation Groups";        dash["B22"] = len(consolidation)
+   dash["A23"] = "Rules Removable by Merging";  dash["B23"] = removable
+   conflicts = getattr(result, "conflicts", []) or []
+   dash["A24"] = "Conflicts (accept/deny overlap)"; dash["B24"] = sum(1 for c in conflicts if c["type"] == "Conflict")
+   dash["A25"] = "Correlations (accept overlap)";   dash["B25"] = sum(1 for c in conflicts if c["type"] == "Correlation")
    # Lifecycle on dashboard
    life = result.lifecycle_assessment or {}
-   dash["A22"] = "Firmware Lifecycle Status"; dash["B22"] = life.get("firmware_status", "Review")
-   dash["A23"] = "Security Exposure";         dash["B23"] = life.get("security_exposure", "Unknown")
-   for r in range(8, 24):
+   dash["A27"] = "Firmware Lifecycle Status"; dash["B27"] = life.get("firmware_status", "Review")
+   dash["A28"] = "Security Exposure";         dash["B28"] = life.get("security_exposure", "Unknown")
+   for r in range(8, 29):
        dash[f"A{r}"].font = HFONT
        dash[f"A{r}"].alignment = WRAP
    autosize(dash, min_w=18, max_w=80)
@@ -105,6 +115,27 @@ def build_excel_report(result) -> bytes:
        fail_rows = [["-","-","No FAIL controls in current subset","-","-","-","-"]]
    add_table(fail_ws, fail_headers, fail_rows, status_col_idx=4)
    # ----------------------------
+   # Benchmark Comparison
+   # ----------------------------
+   comparison = getattr(result, "benchmark_comparison", {}) or {}
+   if comparison.get("controls"):
+       cmp_ws = wb.create_sheet("Benchmark Comparison")
+       labels = [p["pack"] for p in comparison["packs"]]
+       add_table(cmp_ws, ["Control ID","Category","Control Name"] + labels,
+                 [[c["control_id"], c["category"], c["control_name"]] + [c.get(label, "N/A") for label in labels]
+                  for c in comparison["controls"]])
+       fills = {"PASS": PASS_FILL, "FAIL": FAIL_FILL}
+       for r in range(2, cmp_ws.max_row + 1):
+           for col in range(4, 4 + len(labels)):
+               cell = cmp_ws.cell(r, col)
+               cell.fill = fills.get(str(cell.value).upper(), UNKNOWN_FILL)
+       cmp_ws.append([])
+       cmp_ws.append(["Pack","Name","Selected","Compliance %","Maturity %","PASS","FAIL","UNKNOWN"])
+       style_header(cmp_ws, cmp_ws.max_row)
+       for p in comparison["packs"]:
+           cmp_ws.append([p["pack"], p["pack_name"], "YES" if p["selected"] else "", p["compliance_score"],
+                          p["maturity_score"], p["pass"], p["fail"], p["unknown"]])
+   # ----------------------------
    # Lifecycle Risk Sheet
    # ----------------------------
    life_ws = wb.create_sheet("Lifecycle Risk")
@@ -126,32 +157,62 @@ def build_excel_report(result) -> bytes:
    # Policies Raw
    # ----------------------------
    pol_ws = wb.create_sheet("Policies Raw")
-   pol_headers = ["Policy ID","Name","Status","SrcIntf","DstIntf","SrcAddr","DstAddr","Service","Action","Schedule","Logtraffic","UTM Detected"]
+   pol_headers = ["VDOM","Policy ID","Name","Status","SrcIntf","DstIntf","SrcAddr","DstAddr","Service","Action","Schedule","Logtraffic","UTM Detected"]
    pol_rows = [
-       [p["policy_id"], p["name"], p["status"], p["srcintf"], p["dstintf"], p["srcaddr"], p["dstaddr"],
+       [p["vdom"], p["policy_id"], p["name"], p["status"], p["srcintf"], p["dstintf"], p["srcaddr"], p["dstaddr"],
         p["service"], p["action"], p["schedule"], p["logtraffic"], p["utm_detected"]]
        for p in result.policies_raw
    ]
+   traffic = getattr(result, "traffic", {}) or {}
+   if traffic:
+       # Usage from replayed traffic logs (traffic_logs.apply_hits).
+       pol_headers += ["Hits","Bytes","Last Seen"]
+       for row, p in zip(pol_rows, result.policies_raw):
+           row += [p.get("hits", 0), p.get("bytes", 0), p.get("last_seen", "")]
    add_table(pol_ws, pol_headers, pol_rows)
    # ----------------------------
    # Permissive Rules
    # ----------------------------
    perm_ws = wb.create_sheet("Permissive Rules")
-   perm_headers = ["Policy ID","Name","SrcIntf","DstIntf","SrcAddr","DstAddr","Service","Action","Logtraffic","UTM Detected","Risk Score","Severity","Reasons"]
+   perm_headers = ["VDOM","Policy ID","Name","SrcIntf","DstIntf","SrcAddr","DstAddr","Service","Action","Logtraffic","UTM Detected","Risk Score","Severity","Reasons"]
    perm_rows = [
-       [p["policy_id"], p["name"], p["srcintf"], p["dstintf"], p["srcaddr"], p["dstaddr"], p["service"],
+       [p["vdom"], p["policy_id"], p["name"], p["srcintf"], p["dstintf"], p["srcaddr"], p["dstaddr"], p["service"],
         p["action"], p["logtraffic"], p["utm_detected"], p["risk_score"], p["severity"], p["reasons"]]
-       for p in result.permissive
+       for p in permissive_view(result)
    ]
    add_table(perm_ws, perm_headers, perm_rows)
    # ----------------------------
    # Segmentation Matrix
    # ----------------------------
    seg_ws = wb.create_sheet("Network Segmentation")
-   seg_headers = ["Source Interface","Destination Interface","Allowed Policy Count","Indicator"]
-   seg_rows = [[s["srcintf"], s["dstintf"], s["policy_count"], s["indicator"]] for s in result.segmentation]
+   seg_headers = ["VDOM","Source Interface","Destination Interface","Source Role","Destination Role","Allowed Policy Count","Indicator"]
+   seg_rows = [[s["vdom"], s["srcintf"], s["dstintf"], s.get("src_role", ""), s.get("dst_role", ""), s["policy_count"], s["indicator"]]
+               for s in result.segmentation]
    add_table(seg_ws, seg_headers, seg_rows)
    # ----------------------------
+   # Zone Reachability
+   # ----------------------------
+   reach_ws = wb.create_sheet("Zone Reachability")
+   reach_headers = ["VDOM","Source Interface","Destination Interface","Hops","Path","Policies",
+                    "Source Address","Destination Address","Service","Pivot Allowed","Indicator"]
+   reach_rows = [
+       [r["vdom"], r["srcintf"], r["dstintf"], r["hops"], r["path"], r["policies"],
+        r["srcaddr"], r["dstaddr"], r["service"], r["pivot"], r["indicator"]]
+       for r in getattr(result, "reachability", []) or []
+   ]
+   add_table(reach_ws, reach_headers, reach_rows)
+   # ----------------------------
+   # Consolidation
+   # ----------------------------
+   cons_ws = wb.create_sheet("Consolidation")
+   cons_headers = ["VDOM","Keep Policy","Merged Policies","Field","Merged Value","Rules Removed","CLI"]
+   cons_rows = [[g["vdom"], g["keep_id"], g["policy_ids"], g["field"], g["merged"], g["removed"], g["cli"]] for g in consolidation]
+   add_table(cons_ws, cons_headers, cons_rows)
+   total_rules = result.sec_profile_coverage.get("total_policies", 0)
+   cons_ws.append([])
+   cons_ws.append([f"Estimated reduction: {removable:,} of {total_rules:,} rules"
+                   + (f" ({removable / total_rules:.1%})" if total_rules else "")])
+   # ----------------------------
    # Security Profile Coverage
    # ----------------------------
    cov_ws = wb.create_sheet("Security Profile Coverage")
@@ -166,18 +227,42 @@ def build_excel_report(result) -> bytes:
            cell.alignment = WRAP
    autosize(cov_ws, min_w=24, max_w=60)
    # ----------------------------
+   # VDOM Summary
+   # ----------------------------
+   vdom_ws = wb.create_sheet("VDOM Summary")
+   vdom_headers = ["VDOM","Policies","Permissive","Critical","Duplicates","Shadowed","Redundant","Union-Shadowed","Transitive Paths","Mergeable","Conflicts","Correlations","Internet-bound","UTM Coverage %"]
+   vdom_rows = [
+       [v["vdom"], v["policies"], v["permissive"], v["critical"], v["duplicates"], v["shadowed"], v["redundant"], v.get("union_shadowed", 0),
+        v.get("transitive_paths", 0), v.get("mergeable", 0), v.get("conflicts", 0), v.get("correlations", 0),
+        v["internet_bound_policies"], v["utm_coverage_pct"]]
+       for v in getattr(result, "vdoms", []) or []
+   ]
+   add_table(vdom_ws, vdom_headers, vdom_rows)
+   # ----------------------------
    # Lists
    # ----------------------------
    def list_sheet(name, headers, rows):
        ws = wb.create_sheet(name)
        add_table(ws, headers, rows)
        return ws
-   list_sheet("Duplicate Rules", ["Policy ID","Duplicate Of","Criteria"],
-              [[d["policy_id"], d["duplicate_of"], d["criteria"]] for d in result.duplicates])
-   list_sheet("Shadowed Rules", ["Policy ID","Shadowed By","Reason"],
-              [[s["policy_id"], s["shadowed_by"], s["reason"]] for s in result.shadowed])
-   list_sheet("Redundant Rules", ["Policy ID","Covered By","Reason"],
-              [[r["policy_id"], r["covered_by"], r["reason"]] for r in result.redundant])
+   list_sheet("Duplicate Rules", ["VDOM","Policy ID","Duplicate Of","Criteria"],
+              [[d["vdom"], d["policy_id"], d["duplicate_of"], d["criteria"]] for d in result.duplicates])
+   list_sheet("Shadowed Rules", ["VDOM","Policy ID","Shadowed By","Reason"],
+              [[s["vdom"], s["policy_id"], s["shadowed_by"], s["reason"]] for s in result.shadowed])
+   list_sheet("Redundant Rules", ["VDOM","Policy ID","Covered By","Reason"],
+              [[r["vdom"], r["policy_id"], r["covered_by"], r["reason"]] for r in result.redundant])
+   if traffic:
+       unused_ws = list_sheet("Unused Rules", ["VDOM","Policy ID","Name","Action","Reason"],
+                              [[u["vdom"], u["policy_id"], u["name"], u["action"], u["reason"]] for u in result.unused])
+       unused_ws.append([])
+       unused_ws.append([f"Logs: {traffic['files']} file(s), {traffic['traffic_lines']:,} traffic sessions, "
+                         f"{traffic['first_seen'] or '?'} .. {traffic['last_seen'] or '?'}"])
+   list_sheet("Conflicts", ["VDOM","Policy ID","Action","Overlaps With","Other Action","Type","Relation"],
+              [[c["vdom"], c["policy_id"], c["action"], c["overlaps_with"], c["other_action"], c["type"], c["relation"]]
+               for c in conflicts])
+   list_sheet("Union-Shadowed Rules", ["VDOM","Policy ID","Covered By","Same Action","Reason"],
+              [[u["vdom"], u["policy_id"], u["covered_by"], u["same_action"], u["reason"]]
+               for u in getattr(result, "union_shadowed", []) or []])
    bio = BytesIO()
    wb.save(bio)
    return bio.getvalue()
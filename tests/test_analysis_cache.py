@@ -0,0 +1,68 @@
+# tests/test_analysis_cache.py
+"""AnalysisCache: data-only disk entries in a private directory, buffers analyzed in place."""
+import os
+import pickle
+import zlib
+import benchmark_loader
+from dataclasses import asdict
+from analysis_cache import AnalysisCache, cache_key, content_hash
+from analyzer import stage_sections
+from config_tree import parse_config_tree
+from perf_bench import synthetic_config
+DATA = synthetic_config(120, n_hosts=80, n_groups=8).encode("utf-8")
+def test_disk_entry_round_trips(tmp_path):
+   disk = str(tmp_path / "results")
+   first = AnalysisCache(disk_dir=disk).analyze(DATA, compare_packs=True)
+   assert [name.endswith(".json.z") for name in os.listdir(disk)] == [True]
+   fresh = AnalysisCache(disk_dir=disk)
+   again = fresh.analyze(DATA, compare_packs=True)
+   assert fresh.stats["disk_hits"] == 1
+   assert asdict(again) == asdict(first)
+class _Boom:
+   def __reduce__(self):
+       return (os.remove, (__file__ + ".never",))
+def test_pickled_entry_is_never_unpickled(tmp_path):
+   disk = tmp_path / "results"
+   cache = AnalysisCache(disk_dir=str(disk))
+   key = cache_key(content_hash(DATA), "Auto (from firmware)", "Auto")
+   (disk / f"{key}.json.z").write_bytes(zlib.compress(pickle.dumps(_Boom())))
+   assert cache.get(key) is None
+   assert os.listdir(disk) == []
+def test_shared_directory_is_not_used(tmp_path):
+   disk = tmp_path / "results"
+   disk.mkdir()
+   os.chmod(disk, 0o777)
+   cache = AnalysisCache(disk_dir=str(disk))
+   assert cache.disk_dir is None
+   cache.analyze(DATA)
+   assert os.listdir(disk) == []
+def test_pack_edit_changes_the_key(monkeypatch):
+   digest = content_hash(DATA)
+   before = cache_key(digest, "Auto (from firmware)", "Auto")
+   key = "7.0.x|v1.4.0"
+   pack = benchmark_loader.get_pack(key)
+   edited = benchmark_loader.BenchmarkPack(pack.pack_id, pack.pack_name, pack.pack_version, pack.family,
+                                           pack.controls[1:], pack.rules, pack.sections)
+   benchmark_loader.registry_digest.cache_clear()
+   monkeypatch.setitem(benchmark_loader._PACKS, key, edited)
+   try:
+       assert cache_key(digest, "Auto (from firmware)", "Auto") != before
+   finally:
+       monkeypatch.undo()
+       benchmark_loader.registry_digest.cache_clear()
+   assert cache_key(digest, "Auto (from firmware)", "Auto") == before
+def test_buffer_is_parsed_in_place():
+   # An upload widget's getbuffer(): a memoryview over a mutable buffer.
+   view = memoryview(bytearray(DATA))
+   assert asdict(AnalysisCache().analyze(view)) == asdict(AnalysisCache().analyze(DATA))
+   tree = parse_config_tree(view, stage_sections())
+   assert tree.items("firewall policy") == parse_config_tree(DATA, stage_sections()).items("firewall policy")
+def test_given_tree_is_used_on_a_miss_only():
+   cache = AnalysisCache()
+   trees = []
+   def load():
+       trees.append(parse_config_tree(DATA, stage_sections()))
+       return trees[-1]
+   first = cache.analyze(DATA, load_tree=load)
+   assert cache.analyze(DATA, load_tree=load) is first
+   assert len(trees) == 1
@@ -0,0 +1,47 @@
+# tests/test_batch_scan.py
+"""Fleet scan records: resume from an earlier output, duplicates within a run, error records."""
+import json
+import batch_scan
+from batch_scan import completed_keys, iter_configs, scan_fleet
+from perf_bench import synthetic_config
+CONFIG = synthetic_config(20, n_hosts=100, n_groups=4)
+def _fleet(tmp_path, texts):
+   for name, text in texts.items():
+       (tmp_path / name).write_text(text, encoding="utf-8")
+   return sorted(str(tmp_path / name) for name in texts)
+def _scan(paths, out_path, done=None):
+   with open(out_path, "a", encoding="utf-8") as out:
+       summary = scan_fleet(paths, out, workers=1, done=done)
+   with open(out_path, encoding="utf-8") as f:
+       return summary, [json.loads(line) for line in f]
+def test_records_and_duplicates(tmp_path):
+   paths = _fleet(tmp_path, {"a.conf": CONFIG, "b.conf": CONFIG, "c.conf": CONFIG.replace("FGT-BENCH", "FGT-OTHER")})
+   summary, records = _scan(paths, tmp_path / "out.jsonl")
+   by_path = {r["path"]: r for r in records}
+   assert summary["analyzed"] == 2 and summary["duplicates"] == 1
+   assert by_path[paths[1]]["status"] == "duplicate"
+   assert by_path[paths[1]]["duplicate_of"] == paths[0]
+   ok = by_path[paths[0]]
+   assert ok["status"] == "ok" and ok["policies"] == 20
+   assert set(ok["timings"]) == set(batch_scan.STEPS)
+def test_unreadable_input_is_an_error_record(tmp_path):
+   missing = str(tmp_path / "missing.conf")
+   summary, records = _scan([missing], tmp_path / "out.jsonl")
+   assert summary["failed"] == 1
+   assert records[0]["path"] == missing and records[0]["status"] == "error"
+def test_resume_skips_completed_devices(tmp_path):
+   paths = _fleet(tmp_path, {"a.conf": CONFIG, "b.conf": CONFIG.replace("FGT-BENCH", "FGT-OTHER")})
+   out = tmp_path / "out.jsonl"
+   _scan(paths[:1], out)
+   summary, records = _scan(paths + [str(tmp_path / "missing.conf")], out, completed_keys(str(out)))
+   assert (summary["skipped"], summary["analyzed"], summary["failed"]) == (1, 1, 1)
+   # Only "ok" records count as done: the failed device is retried next time.
+   assert len(completed_keys(str(out))) == 2
+   assert completed_keys(str(out), ("cis",)) == set()
+def test_directory_inputs_and_cut_short_lines(tmp_path):
+   _fleet(tmp_path, {"a.conf": CONFIG, "notes.txt": "x"})
+   out = tmp_path / "out.jsonl"
+   with open(out, "w", encoding="utf-8") as f:
+       f.write('{"status": "ok", "key"')
+   assert list(iter_configs([str(tmp_path)])) == [str(tmp_path / "a.conf")]
+   assert completed_keys(str(out)) == set()
@@ -0,0 +1,43 @@
+# tests/test_benchmarks.py
+"""Firmware detection and benchmark pack evaluation."""
+from dataclasses import replace
+from analyzer import analyze_config, analyze_tree
+from benchmark_loader import load_supported_packs
+from config_tree import parse_config_tree
+from control_engine import compile_pack
+from perf_bench import synthetic_config
+CONFIG = synthetic_config(120, n_hosts=80, n_groups=8)
+def test_comparison_is_opt_in():
+   tree = parse_config_tree(CONFIG)
+   selected = analyze_tree(tree, max_workers=1)
+   compared = analyze_tree(tree, max_workers=1, compare_packs=True)
+   assert selected.benchmark_comparison == {}
+   assert compared.benchmark_comparison["packs"]
+   assert selected.cis == compared.cis
+def test_firmware_falls_back_to_system_global():
+   # No `#config-version=` header: platform and version come from the settings, as from the full text before.
+   result = analyze_config('config system global\n    set hostname "FGVM-lab"\n    set alias "FortiGate v7.2.5,build1517"\nend\n')
+   assert result.meta["platform"] == "FORTIGATE-VM"
+   assert (result.meta["firmware_version"], result.meta["firmware_build"]) == ("7.2.5", "1517")
+def test_compiled_pack_is_keyed_by_pack_object():
+   pack = next(iter(load_supported_packs().values()))
+   compile_pack(pack)
+   # Same pack_id, different content (a reloaded pack file): compiled afresh.
+   edited = replace(pack, controls=pack.controls[:1])
+   assert [c for c, _ in compile_pack(edited)] == [pack.controls[0]]
+   assert len(compile_pack(pack)) == len(pack.controls)
+def _vdom_block(name, routes):
+   lines = [f"    edit {name}", "        config router static"]
+   for k, device in enumerate(routes, 1):
+       lines += [f"            edit {k}", "                set dst 0.0.0.0 0.0.0.0", f'                set device "{device}"', "            next"]
+   return lines + ["        end", "    next"]
+def test_mgmt_access_uses_each_vdoms_routes():
+   lines = ["config global", "config system interface"]
+   for name, vdom in (("lan1", "vd1"), ("lan2", "vd2")):
+       lines += [f'    edit "{name}"', f'        set vdom "{vdom}"', "        set allowaccess ping https ssh", "    next"]
+   # vd1 routes its default through lan1, which makes it WAN there; vd1 says nothing about vd2's lan2.
+   lines += ["end", "end", "config vdom"] + _vdom_block("vd1", ["lan1", "lan2"]) + _vdom_block("vd2", []) + ["end", ""]
+   result = analyze_config("\n".join(lines))
+   row = next(r for r in result.cis if r["control_id"] == "CIS-3.1")
+   assert row["status"] == "FAIL"
+   assert "lan2" in row["why_failed"] and "lan1" not in row["why_failed"]
@@ -0,0 +1,112 @@
+# tests/test_config_tree.py
+"""Config parsing: nested blocks, quoted values, VDOM scopes and section filters, from every source type."""
+import io
+from config_tree import load_config_tree, parse_config_tree
+CONFIG = """#config-version=FGT60F-7.0.12-FW-build0523-230419:opmode=0:vdom=1:user=admin
+#conf_file_ver=42
+config vdom
+edit root
+next
+edit "dmz vdom"
+next
+end
+config global
+config system global
+    set hostname "FGT-A"
+    set pre-login-banner enable
+end
+config system interface
+    edit "port1"
+        set vdom "root"
+        set ip 10.0.0.1 255.255.255.0
+        config secondaryip
+            edit 1
+                set ip 10.0.9.1 255.255.255.0
+            next
+        end
+    next
+end
+config system replacemsg admin "pre_admin-disclaimer-text"
+    set buffer "Authorized use only
+end
+config system interface
+not a block"
+end
+end
+config vdom
+edit root
+config firewall address
+    edit "h1"
+        set subnet 10.0.0.10 255.255.255.255
+    next
+    edit "h2"
+        set subnet 10.0.0.11 255.255.255.255
+end
+config firewall policy
+    edit 7
+        set srcaddr "h1" "h2"
+        set action accept
+    next
+end
+next
+edit "dmz vdom"
+config firewall policy
+    edit 1
+        set action deny
+    next
+end
+next
+end
+"""
+def _shape(node):
+   return (dict(node.settings),
+           {k: _shape(e) for k, e in node.entries.items()},
+           {k: _shape(c) for k, c in node.children.items()})
+def test_sources_parse_alike(tmp_path):
+   path = tmp_path / "fgt.conf"
+   path.write_bytes(CONFIG.encode("utf-8"))
+   expected = _shape(parse_config_tree(CONFIG).root)
+   for source in (CONFIG.encode("utf-8"), memoryview(bytearray(CONFIG.encode("utf-8"))),
+                  io.BytesIO(CONFIG.encode("utf-8")), io.StringIO(CONFIG), CONFIG.splitlines(keepends=True)):
+       assert _shape(parse_config_tree(source).root) == expected
+   assert _shape(load_config_tree(str(path)).root) == expected
+def test_vdom_scopes():
+   tree = parse_config_tree(CONFIG)
+   assert tree.is_multi_vdom()
+   assert tree.header.splitlines()[1] == "#conf_file_ver=42"
+   assert tree.global_scope().settings("system global")["hostname"] == '"FGT-A"'
+   # The `config vdom` list and the per-VDOM blocks merge into one scope per name.
+   vdoms = tree.vdoms()
+   assert list(vdoms) == ["root", "dmz vdom"]
+   assert vdoms["root"].items("firewall policy")["7"]["srcaddr"] == '"h1" "h2"'
+   assert vdoms["dmz vdom"].items("firewall policy") == {"1": {"action": "deny"}}
+def test_nested_blocks_and_missing_next():
+   scope = parse_config_tree(CONFIG).global_scope()
+   port1 = scope.node("system interface").entries["port1"]
+   assert port1.children["secondaryip"].items() == {"1": {"ip": "10.0.9.1 255.255.255.0"}}
+   # `edit "h2"` closed by `end` alone still ends the table.
+   addresses = parse_config_tree(CONFIG).vdoms()["root"].items("firewall address")
+   assert list(addresses) == ["h1", "h2"]
+def test_multiline_quoted_value():
+   scope = parse_config_tree(CONFIG).global_scope()
+   buffer = scope.settings('system replacemsg admin "pre_admin-disclaimer-text"')["buffer"]
+   assert buffer == '"Authorized use only\nend\nconfig system interface\nnot a block"'
+   # The quoted `config system interface` line opened no block.
+   assert list(scope.items("system interface")) == ["port1"]
+def test_section_filter_per_scope(tmp_path):
+   path = tmp_path / "fgt.conf"
+   path.write_text(CONFIG, encoding="utf-8")
+   for tree in (parse_config_tree(CONFIG, ["system global", "firewall policy"]),
+                load_config_tree(str(path), ["system global", "firewall policy"])):
+       scope = tree.global_scope()
+       assert list(scope.root.children) == ["system global"]
+       assert scope.settings("system global")["hostname"] == '"FGT-A"'
+       assert {name: list(v.root.children) for name, v in tree.vdoms().items()} == {
+           "root": ["firewall policy"], "dmz vdom": ["firewall policy"]}
+def test_empty_sources(tmp_path):
+   path = tmp_path / "empty.conf"
+   path.write_bytes(b"")
+   for tree in (parse_config_tree(""), load_config_tree(str(path))):
+       assert not tree.is_multi_vdom()
+       assert list(tree.vdoms()) == ["root"]
+       assert tree.items("firewall policy") == {}
@@ -0,0 +1,52 @@
+# tests/test_consolidation.py
+"""Consolidation proposals must not widen or narrow what the merged rules allow."""
+from analyzer import find_consolidations, policy_tables, vdom_records
+from config_tree import parse_config_tree
+def _config(services):
+   out = [
+       "config firewall service custom\n",
+       '    edit "ALLTCP"\n        set tcp-portrange 1-65535\n    next\n',
+       '    edit "DNS"\n        set udp-portrange 53\n    next\n',
+       '    edit "ALL"\n        set protocol IP\n    next\n',
+       "end\n",
+       "config firewall policy\n",
+   ]
+   for pid, svc in enumerate(services, 1):
+       out.append(f'    edit {pid}\n        set srcintf "port2"\n        set dstintf "port1"\n'
+                  f'        set srcaddr "all"\n        set dstaddr "all"\n        set action accept\n'
+                  f'        set schedule "always"\n        set service "{svc}"\n    next\n')
+   out.append("end\n")
+   return "".join(out)
+def _groups(services):
+   return find_consolidations(vdom_records(policy_tables(parse_config_tree(_config(services)))))
+def test_all_tcp_merge_keeps_udp_service():
+   groups = _groups(["ALLTCP", "DNS"])
+   assert len(groups) == 1
+   assert groups[0]["field"] == "service"
+   assert groups[0]["merged"] == '"ALLTCP" "DNS"'
+   assert 'set service "ALLTCP" "DNS"' in groups[0]["cli"]
+def test_exact_any_service_absorbs_the_group():
+   groups = _groups(["DNS", "ALL"])
+   assert len(groups) == 1
+   assert groups[0]["merged"] == '"ALL"'
+def _rules(*rules):
+   out = ["config firewall address\n"]
+   for name, ip in (("h1", "10.0.0.1"), ("h2", "10.0.0.2"), ("net10", "10.0.0.0")):
+       mask = "255.255.255.0" if name == "net10" else "255.255.255.255"
+       out.append(f'    edit "{name}"\n        set subnet {ip} {mask}\n    next\n')
+   out.append("end\nconfig firewall policy\n")
+   for pid, srcaddr, action in rules:
+       out.append(f'    edit {pid}\n        set srcintf "port2"\n        set dstintf "port1"\n'
+                  f'        set srcaddr "{srcaddr}"\n        set dstaddr "all"\n        set action {action}\n'
+                  f'        set schedule "always"\n        set service "ALL"\n    next\n')
+   out.append("end\n")
+   return find_consolidations(vdom_records(policy_tables(parse_config_tree("".join(out)))))
+def test_rule_moved_between_candidates_blocks_the_merge():
+   # Deny 3 was moved between 1 and 2: merging 2 into 1 would let h2 through.
+   assert _rules((1, "h1", "accept"), (3, "net10", "deny"), (2, "h2", "accept")) == []
+   groups = _rules((1, "h1", "accept"), (2, "h2", "accept"), (3, "net10", "deny"))
+   assert [(g["keep_id"], g["policy_ids"]) for g in groups] == [(1, "1 2")]
+def test_group_keeps_the_rule_first_in_config_sequence():
+   groups = _rules((5, "h2", "accept"), (2, "h1", "accept"))
+   assert [(g["keep_id"], g["policy_ids"]) for g in groups] == [(5, "5 2")]
+   assert groups[0]["cli"].splitlines()[1:3] == ["    edit 5", '        set srcaddr "h2" "h1"']
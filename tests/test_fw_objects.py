@@ -0,0 +1,122 @@
+# tests/test_fw_objects.py
+"""Address and service objects as interval spans: groups, ranges, wildcards/FQDNs, port ranges."""
+from fw_objects import (
+   ANY_ADDRESS, ANY_SERVICE, IPV4_END, PORT_SPACE, PROTO_ICMP, PROTO_TCP, PROTO_UDP, SERVICE_IP_END,
+   AddressBook, PolicyObjects, ServiceBook, complement, contains, normalize, overlaps, subtract, union,
+)
+def _ip(text):
+   a, b, c, d = map(int, text.split("."))
+   return a << 24 | b << 16 | c << 8 | d
+def _tcp(lo, hi=None):
+   return (PROTO_TCP * PORT_SPACE + lo, PROTO_TCP * PORT_SPACE + (hi or lo) + 1)
+ADDRESSES = {
+   "net10": {"subnet": "10.0.0.0 255.0.0.0"},
+   "net10-cidr": {"subnet": "10.0.0.0/8"},
+   "host": {"subnet": "10.1.2.3 255.255.255.255"},
+   "range": {"type": "iprange", "start-ip": "10.1.0.0", "end-ip": "10.1.0.255"},
+   "bad-range": {"type": "iprange", "start-ip": "10.1.0.9", "end-ip": "10.1.0.1"},
+   "wildcard": {"type": "wildcard", "wildcard": "10.0.0.0 255.0.255.0"},
+   "noncontig": {"subnet": "10.0.0.0 255.0.255.0"},
+   "site": {"type": "fqdn", "fqdn": '"example.com"'},
+   "everything": {"subnet": "0.0.0.0 0.0.0.0"},
+}
+GROUPS = {
+   "inner": {"member": '"host" "range"'},
+   "outer": {"member": '"inner" "site"'},
+   "net10-but-host": {"member": '"net10"', "exclude": "enable", "exclude-member": '"host"'},
+   "loop-a": {"member": '"loop-b" "host"'},
+   "loop-b": {"member": '"loop-a"'},
+}
+VIPS = {"web": {"extip": "203.0.113.10-203.0.113.12"}, "fqdn-vip": {"type": "fqdn"}}
+def _addresses():
+   return AddressBook(ADDRESSES, GROUPS, VIPS, {"vips": {"member": '"web"'}})
+def test_span_arithmetic():
+   assert normalize([(5, 9), (0, 2), (2, 3), (8, 12), (4, 4)]) == (0, 3, 5, 12)
+   assert subtract((0, 10, 20, 30), (5, 25)) == (0, 5, 25, 30)
+   assert complement((10, 20), 100) == (0, 10, 20, 100)
+   assert contains((0, 10, 20, 30), (22, 25)) and not contains((0, 10, 20, 30), (8, 22))
+   assert overlaps((0, 10, 20, 30), (12, 15, 29, 40)) and not overlaps((0, 10, 20, 30), (10, 20))
+def test_subnets_ranges_and_any():
+   book = _addresses()
+   assert book.resolve("net10") == book.resolve("net10-cidr") == (_ip("10.0.0.0"), _ip("11.0.0.0"))
+   assert book.resolve("host") == (_ip("10.1.2.3"), _ip("10.1.2.4"))
+   assert book.resolve("range") == (_ip("10.1.0.0"), _ip("10.1.1.0"))
+   assert book.is_any(book.resolve("everything")) and book.is_any(book.resolve("all"))
+   assert book.resolve("web") == (_ip("203.0.113.10"), _ip("203.0.113.13"))
+   assert book.resolve("vips") == book.resolve("web")
+def test_unexpandable_objects_are_opaque_points():
+   book = _addresses()
+   points = [book.resolve(n) for n in ("bad-range", "wildcard", "noncontig", "site", "fqdn-vip", "undefined")]
+   assert all(p[0] >= IPV4_END and p[1] == p[0] + 1 for p in points)
+   assert len(set(points)) == len(points)
+   # Covered only by themselves or ANY, whatever the subnet they might resolve to.
+   assert not contains(book.resolve("net10"), book.resolve("wildcard"))
+   assert contains(ANY_ADDRESS, book.resolve("site"))
+   assert book.opaque("SITE") == book.resolve("site")
+def test_groups_nest_exclude_and_survive_cycles():
+   book = _addresses()
+   outer = book.resolve("outer")
+   assert contains(outer, book.resolve("host")) and contains(outer, book.resolve("range"))
+   assert contains(outer, book.resolve("site")) and not contains(outer, book.resolve("wildcard"))
+   carved = book.resolve("net10-but-host")
+   assert not overlaps(carved, book.resolve("host"))
+   assert carved == subtract(book.resolve("net10"), book.resolve("host"))
+   assert book.resolve("loop-a") == book.resolve("host")
+def test_fields_negate_and_unset():
+   book = _addresses()
+   assert book.field(["host", "range"]) == union([book.resolve("host"), book.resolve("range")])
+   negated = book.field(["net10"], negate=True)
+   assert not overlaps(negated, book.resolve("net10")) and contains(negated, book.resolve("site"))
+   assert book.field([]) == book.opaque("<unset>")
+SERVICES = {
+   "HTTPS": {"protocol": "TCP/UDP/SCTP", "tcp-portrange": "443"},
+   "web": {"tcp-portrange": "80 443 8080-8090"},
+   "dns": {"tcp-portrange": "53", "udp-portrange": "53"},
+   "src-pinned": {"tcp-portrange": "443:1024-2048"},
+   "src-any": {"tcp-portrange": "443:1-65535"},
+   "all-tcp": {"tcp-portrange": "1-65535"},
+   "PING": {"protocol": "ICMP", "icmptype": "8"},
+   "echo-code": {"protocol": "ICMP", "icmptype": "8", "icmpcode": "0"},
+   "icmp-any": {"protocol": "ICMP"},
+   "gre": {"protocol": "IP", "protocol-number": "47"},
+   "any-ip": {"protocol": "IP", "protocol-number": "0"},
+   "everything": {"protocol": "ALL"},
+   "proxy": {"protocol": "HTTP"},
+   "to-host": {"tcp-portrange": "22", "iprange": "10.0.0.1"},
+}
+def _services():
+   return ServiceBook(SERVICES, {"web+dns": {"member": '"web" "dns"'}})
+def test_service_port_ranges():
+   book = _services()
+   assert book.resolve("HTTPS") == _tcp(443)
+   assert book.resolve("web") == normalize([_tcp(80), _tcp(443), _tcp(8080, 8090)])
+   udp53 = (PROTO_UDP * PORT_SPACE + 53, PROTO_UDP * PORT_SPACE + 54)
+   assert book.resolve("dns") == normalize([_tcp(53), udp53])
+   assert book.resolve("src-any") == _tcp(443)
+   assert book.resolve("web+dns") == union([book.resolve("web"), book.resolve("dns")])
+   assert contains(book.resolve("web+dns"), book.resolve("HTTPS"))
+def test_service_protocols():
+   book = _services()
+   base = PROTO_ICMP * PORT_SPACE
+   assert book.resolve("PING") == (base + 8 * 256, base + 9 * 256)
+   assert book.resolve("echo-code") == (base + 8 * 256, base + 8 * 256 + 1)
+   assert book.resolve("icmp-any") == (base, base + PORT_SPACE)
+   assert book.resolve("gre") == (47 * PORT_SPACE, 48 * PORT_SPACE)
+   assert book.is_any(book.resolve("any-ip")) and book.is_any(book.resolve("everything")) and book.is_any(book.resolve("ALL"))
+def test_unexpandable_services_are_opaque():
+   book = _services()
+   for name in ("src-pinned", "proxy", "to-host", "undefined"):
+       span = book.resolve(name)
+       assert span[0] >= SERVICE_IP_END and span[1] == span[0] + 1, name
+   assert not contains(book.resolve("HTTPS"), book.resolve("src-pinned"))
+def test_broad_is_not_any():
+   book = _services()
+   assert book.is_broad(book.resolve("all-tcp")) and not book.is_any(book.resolve("all-tcp"))
+   assert book.is_broad(ANY_SERVICE) and not book.is_broad(book.resolve("web"))
+def test_new_book_keeps_opaque_points():
+   first = PolicyObjects.from_tables({"firewall address": ADDRESSES})
+   site = first.addresses.resolve("site")
+   # A new book would number opaque names from zero; built from `first` it keeps their points.
+   later = PolicyObjects.from_tables({"firewall address": {**ADDRESSES, "other": {"type": "fqdn"}}}, first)
+   assert later.addresses.resolve("site") == site
+   assert later.addresses.resolve("other") != site
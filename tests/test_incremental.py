@@ -0,0 +1,135 @@
+# tests/test_incremental.py
+"""reanalyze(old snapshot, new tree) must equal a full analyze_tree(new tree)."""
+from dataclasses import asdict
+import pytest
+from analyzer import analyze_tree
+from config_tree import ConfigNode, parse_config_tree
+from incremental import reanalyze
+from perf_bench import multi_vdom_config, synthetic_config
+SINGLE = synthetic_config(300, n_hosts=200, n_groups=20)
+MULTI = multi_vdom_config(3, 120)
+def _policies(tree, vdom="root"):
+   return tree.vdoms()[vdom].node("firewall policy").entries
+def _set(tree, pid, key, value, vdom="root"):
+   entry = _policies(tree, vdom)[str(pid)]
+   entry.settings = {**entry.settings, key: value}
+def _edit_late(tree):
+   _set(tree, 290, "schedule", '"never"')
+def _edit_first(tree):
+   _set(tree, 1, "logtraffic", "disable")
+def _add(tree):
+   entry = ConfigNode("301")
+   entry.settings = {"srcintf": '"port2"', "dstintf": '"port1"', "srcaddr": '"all"', "dstaddr": '"all"',
+                     "action": "accept", "schedule": '"always"', "service": '"ALL"'}
+   _policies(tree)["301"] = entry
+def _delete(tree):
+   del _policies(tree)["150"]
+def _reorder(tree):
+   # Same ids, swapped bodies.
+   entries = _policies(tree)
+   entries["100"].settings, entries["200"].settings = entries["200"].settings, entries["100"].settings
+def _move(tree):
+   # `move 200 before 100`: every policy keeps its id and settings, only the sequence changes.
+   node = tree.vdoms()["root"].node("firewall policy")
+   ids = list(node.entries)
+   ids.remove("200")
+   ids.insert(ids.index("100"), "200")
+   node.entries = {pid: node.entries[pid] for pid in ids}
+def _object(tree):
+   entry = tree.node("firewall address").entries["h5"]
+   entry.settings = {**entry.settings, "subnet": "10.0.0.0 255.0.0.0"}
+def _global(tree):
+   node = tree.node("system global")
+   node.settings = {**node.settings, "admintimeout": "30"}
+SCENARIOS = [
+   ("unchanged", lambda tree: None),
+   ("edit late policy", _edit_late),
+   ("edit first policy", _edit_first),
+   ("add policy", _add),
+   ("delete policy", _delete),
+   ("reorder policies", _reorder),
+   ("move policy", _move),
+   ("address object change", _object),
+   ("system global change", _global),
+]
+def _check(old_text, new_tree):
+   snap = reanalyze(reanalyze(None, parse_config_tree(old_text)), new_tree)
+   assert asdict(snap.result) == asdict(analyze_tree(new_tree, max_workers=1))
+   return snap
+@pytest.mark.parametrize("label,mutate", SCENARIOS, ids=[s[0] for s in SCENARIOS])
+def test_single_vdom(label, mutate):
+   tree = parse_config_tree(SINGLE)
+   mutate(tree)
+   _check(SINGLE, tree)
+def test_unchanged_reuses_everything():
+   base = reanalyze(None, parse_config_tree(SINGLE))
+   snap = reanalyze(base, parse_config_tree(SINGLE))
+   assert snap.reused["cis"]
+   assert snap.vdoms["root"].hygiene is base.vdoms["root"].hygiene
+def test_vdom_edit():
+   tree = parse_config_tree(MULTI)
+   _set(tree, 60, "schedule", '"never"', vdom="vd1")
+   snap = _check(MULTI, tree)
+   assert snap.reused["first_changed_policy"] == {"vd0": 120, "vd1": 59, "vd2": 120}
+def test_vdom_route_change_reruns_cis():
+   tree = parse_config_tree(MULTI)
+   route = ConfigNode("1")
+   route.settings = {"dst": "0.0.0.0 0.0.0.0", "device": '"port2"'}
+   routes = ConfigNode("router static")
+   routes.entries = {"1": route}
+   vd1 = tree.vdoms()["vd1"].root
+   vd1.children = {**vd1.children, "router static": routes}
+   snap = _check(MULTI, tree)
+   assert not snap.reused["cis"]
+def test_vdom_removed():
+   tree = parse_config_tree(MULTI)
+   del tree.root.children["vdom"].entries["vd1"]
+   _check(MULTI, tree)
+def test_vdom_added():
+   old = parse_config_tree(MULTI)
+   del old.root.children["vdom"].entries["vd2"]
+   snap = reanalyze(reanalyze(None, old), parse_config_tree(MULTI))
+   assert asdict(snap.result) == asdict(analyze_tree(parse_config_tree(MULTI), max_workers=1))
+def test_move_is_a_change():
+   tree = parse_config_tree(SINGLE)
+   _move(tree)
+   snap = _check(SINGLE, tree)
+   assert snap.reused["first_changed_policy"] == {"root": 99}
+def _small(addresses, policies):
+   lines = ["config system interface", '    edit "port1"', "        set role wan", "    next",
+            '    edit "port2"', "        set role lan", "    next", "end", "config firewall address"]
+   for name, body in addresses:
+       lines += [f'    edit "{name}"'] + [f"        set {line}" for line in body] + ["    next"]
+   lines += ["end", "config firewall addrgrp", '    edit "g"', '        set member "a1"', "    next", "end",
+             "config firewall policy"]
+   for pid, dst in enumerate(policies, 1):
+       lines += [f'    edit {pid}', '        set srcintf "port2"', '        set dstintf "port1"', '        set srcaddr "all"',
+                 f'        set dstaddr "{dst}"', "        set action accept", '        set schedule "always"',
+                 '        set service "HTTPS"', "    next"]
+   return "\n".join(lines + ["end", ""])
+HOSTS = [("a1", ["subnet 10.0.0.1 255.255.255.255"]), ("a2", ["subnet 10.0.0.2 255.255.255.255"])]
+def test_object_change_starts_at_first_user():
+   old = _small(HOSTS, ["a2", "g", "a2"])
+   new = _small([("a1", ["subnet 10.0.0.3 255.255.255.255"]), HOSTS[1]], ["a2", "g", "a2"])
+   snap = _check(old, parse_config_tree(new))
+   # a1 is only reached through group g, first named by policy 2.
+   assert snap.reused["first_changed_policy"] == {"root": 1}
+def test_unused_object_change_reuses_everything():
+   old = _small(HOSTS, ["a2", "a2"])
+   new = _small([("a1", ["subnet 10.0.0.3 255.255.255.255"]), HOSTS[1]], ["a2", "a2"])
+   base = reanalyze(None, parse_config_tree(old))
+   snap = reanalyze(base, parse_config_tree(new))
+   assert snap.reused["first_changed_policy"] == {"root": 2}
+   assert snap.vdoms["root"].hygiene is base.vdoms["root"].hygiene
+def test_new_opaque_name_keeps_its_own_point():
+   fqdn = [("fa", ["type fqdn", 'fqdn "a.example.com"'])]
+   old = _small(HOSTS + fqdn, ["fa", "a1", "a2"])
+   new = _small(HOSTS + fqdn + [("fb", ["type fqdn", 'fqdn "b.example.com"'])], ["fa", "a1", "fb"])
+   snap = _check(old, parse_config_tree(new))
+   assert not snap.result.shadowed
+def test_role_change_keeps_records():
+   tree = parse_config_tree(SINGLE)
+   entry = tree.node("system interface").entries["port3"]
+   entry.settings = {**entry.settings, "role": "dmz"}
+   snap = _check(SINGLE, tree)
+   assert snap.reused["first_changed_policy"] == {"root": 300}
@@ -0,0 +1,71 @@
+# tests/test_interface_roles.py
+"""Interface/zone roles: explicit roles, default routes, naming hints, zones and per-VDOM tables."""
+from analyzer import policy_tables
+from config_tree import parse_config_tree
+from interface_roles import ROLE_DMZ, ROLE_LAN, ROLE_UNDEFINED, ROLE_WAN, InterfaceRoles, name_role
+def test_name_hints():
+   assert [name_role(n) for n in ("port1-untrust", "wan2", "Internet", "dmz1", "internal", "LAN-users")] == [
+       ROLE_WAN, ROLE_WAN, ROLE_WAN, ROLE_DMZ, ROLE_LAN, ROLE_LAN]
+   # A hint has to start a word: "vlan10" is not a LAN, "swan" not a WAN.
+   assert name_role("vlan10") == name_role("swan") == name_role("port3") == ROLE_UNDEFINED
+def test_interface_sources_in_order():
+   roles = InterfaceRoles(
+       interfaces={
+           '"wan1"': {"role": "lan"},
+           "port1": {"role": "undefined"},
+           "port2": {},
+           "port3": {},
+           "lan-uplink": {},
+       },
+       routes={
+           "1": {"dst": "0.0.0.0 0.0.0.0", "device": '"port2"'},
+           "2": {"dst": "10.0.0.0 255.0.0.0", "device": '"port3"'},
+           "3": {"dst": "0.0.0.0/0", "device": '"lan-uplink"'},
+           "4": {"device": '"port9"', "status": "disable"},
+       },
+   )
+   # An explicit role beats the name; "undefined" carries nothing.
+   assert roles.role("WAN1") == ROLE_LAN
+   assert roles.role("port1") == ROLE_UNDEFINED
+   # A default route beats the name; other routes say nothing.
+   assert roles.role("port2") == ROLE_WAN and roles.role("lan-uplink") == ROLE_WAN
+   assert roles.role("port3") == ROLE_UNDEFINED
+   assert not roles.is_wan("port9")
+   # Undeclared names fall back to the hint.
+   assert roles.role("dmz-servers") == ROLE_DMZ
+def test_sdwan_routes():
+   roles = InterfaceRoles(
+       interfaces={"port4": {}},
+       routes={"1": {"sdwan-zone": '"virtual-wan-link" "isp2"', "dst": ""}, "2": {"sdwan": "enable"}},
+   )
+   assert roles.is_wan("isp2") and roles.is_wan("virtual-wan-link")
+   assert not roles.is_wan("port4")
+def test_zones_take_strongest_member():
+   roles = InterfaceRoles(
+       interfaces={"port1": {"role": "lan"}, "port2": {"role": "dmz"}, "port3": {"role": "wan"}, "port4": {}},
+       zones={
+           "mixed": {"interface": '"port1" "port2"'},
+           "edge": {"interface": '"port1" "port3"'},
+           "trust-zone": {"interface": '"port4"'},
+           "plain": {"interface": '"port4"'},
+           "routed": {"interface": '"port1"'},
+       },
+       routes={"1": {"dst": "0.0.0.0 0.0.0.0", "device": '"routed"'}},
+   )
+   assert [roles.role(z) for z in ("mixed", "edge", "trust-zone", "plain", "routed")] == [
+       ROLE_DMZ, ROLE_WAN, ROLE_LAN, ROLE_UNDEFINED, ROLE_WAN]
+def test_per_vdom_tables():
+   text = "\n".join([
+       "config global", "config system interface",
+       '    edit "port1"', '        set vdom "vd1"', "    next",
+       '    edit "port2"', '        set vdom "vd2"', "    next",
+       "end", "end",
+       "config vdom",
+       "edit vd1", "config router static", "    edit 1", '        set device "port1"', "    next", "end", "next",
+       "edit vd2", "config system zone", '    edit "outside"', '        set interface "port2"', "    next", "end", "next",
+       "end", "",
+   ])
+   tree = parse_config_tree(text)
+   roles = {name: InterfaceRoles.from_tables(policy_tables(scope, tree.global_scope())) for name, scope in tree.vdoms().items()}
+   assert roles["vd1"].is_wan("port1") and not roles["vd2"].is_wan("port1")
+   assert roles["vd2"].is_wan("outside") and not roles["vd2"].is_wan("port2")
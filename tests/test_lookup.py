@@ -0,0 +1,68 @@
+# tests/test_lookup.py
+"""PolicyLookup answers with the first enabled policy in config sequence that matches a flow."""
+import numpy as np
+from config_tree import parse_config_tree
+from policy_lookup import PolicyLookup, ip_value
+OBJECTS = (
+   "config firewall address\n"
+   '    edit "net10"\n        set subnet 10.0.0.0 255.255.255.0\n    next\n'
+   '    edit "h5"\n        set subnet 10.0.0.5 255.255.255.255\n    next\n'
+   '    edit "web"\n        set subnet 10.1.0.10 255.255.255.255\n    next\n'
+   "end\n"
+   "config firewall service custom\n"
+   '    edit "HTTPS"\n        set tcp-portrange 443\n    next\n'
+   '    edit "PING"\n        set protocol ICMP\n        set icmptype 8\n    next\n'
+   '    edit "ANY"\n        set protocol ALL\n    next\n'
+   "end\n"
+)
+def _policy(pid, srcintf, dstintf, srcaddr, dstaddr, service, action, extra=""):
+   return (f'    edit {pid}\n        set srcintf "{srcintf}"\n        set dstintf "{dstintf}"\n'
+           f'        set srcaddr "{srcaddr}"\n        set dstaddr "{dstaddr}"\n'
+           f'        set service "{service}"\n        set action {action}\n{extra}    next\n')
+def _lookup(*policies):
+   text = OBJECTS + "config firewall policy\n" + "".join(policies) + "end\n"
+   return PolicyLookup.from_tree(parse_config_tree(text))
+RULEBASE = (
+   _policy(10, "port1", "port2", "h5", "web", "HTTPS", "accept"),
+   _policy(11, "port1", "port2", "net10", "all", "ANY", "accept", "        set status disable\n"),
+   _policy(12, "port1", "port2", "net10", "web", "PING", "accept"),
+   _policy(13, "any", "port2", "all", "all", "HTTPS", "deny"),
+)
+FLOWS = [
+   ("port1", "port2", "10.0.0.5", "10.1.0.10", "tcp", 443),
+   ("port1", "port2", "10.0.0.6", "10.1.0.10", "tcp", 443),
+   ("port1", "port2", "10.0.0.6", "10.1.0.10", "icmp", 8 * 256),
+   ("port1", "port2", "10.0.0.6", "10.1.0.10", "icmp", 8 * 256 + 3),
+   ("port1", "port2", "10.0.0.6", "10.1.0.10", "icmp", 0),
+   ("port3", "port2", "10.0.0.5", "10.1.0.10", "tcp", 443),
+   ("port3", "port1", "10.0.0.5", "10.1.0.10", "tcp", 443),
+   (None, None, "10.0.0.5", "10.1.0.10", 6, 443),
+   ("port1", "port2", "10.0.0.5", "10.1.0.10", "udp", 443),
+]
+EXPECTED = [10, 13, 12, 12, None, 13, None, 10, None]
+def test_single_lookups():
+   engine = _lookup(*RULEBASE)
+   assert [engine.lookup(*flow) for flow in FLOWS] == EXPECTED
+def test_disabled_rule_never_matches():
+   engine = _lookup(*RULEBASE)
+   # 11 would match any service from net10 if it were enabled.
+   assert engine.matching("port1", "port2", "10.0.0.5", "10.1.0.10", "tcp", 443) == [10, 13]
+   assert engine.lookup("port1", "port2", "10.0.0.7", "8.8.8.8", "udp", 53) is None
+def test_batches_match_single_lookups():
+   engine = _lookup(*RULEBASE)
+   expected = [-1 if pid is None else pid for pid in EXPECTED]
+   assert engine.lookup_many(FLOWS).tolist() == expected
+   assert engine.lookup_many(FLOWS, chunk_size=2).tolist() == expected
+   sif, dif, src, dst, proto, port = zip(*FLOWS[:3])
+   columns = (np.array([ip_value(x) for x in src]), np.array([ip_value(x) for x in dst]), np.array([6, 6, 1]), np.array(port))
+   assert engine.lookup_arrays(*columns, srcintf=list(sif), dstintf=list(dif)).tolist() == expected[:3]
+   # No interface columns: any interface.
+   assert engine.lookup_arrays(*columns).tolist() == expected[:3]
+def test_config_sequence_not_policy_id_decides():
+   # `edit 2` was moved above `edit 1`: the device hits 2 first.
+   engine = _lookup(
+       _policy(2, "port1", "port2", "all", "all", "ANY", "deny"),
+       _policy(1, "port1", "port2", "net10", "all", "ANY", "accept"),
+   )
+   assert engine.lookup("port1", "port2", "10.0.0.5", "10.1.0.10", "tcp", 443) == 2
+   assert engine.matching("port1", "port2", "10.0.0.5", "10.1.0.10", "tcp", 443) == [2, 1]
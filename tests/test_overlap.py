@@ -0,0 +1,43 @@
+# tests/test_overlap.py
+"""Conflicts and correlations between partially overlapping rules, earlier/later in config sequence."""
+import pytest
+from analyzer import policy_tables, vdom_records
+from config_tree import parse_config_tree
+from policy_overlap import find_conflicts, overlapping_pairs
+OBJECTS = (
+   "config firewall address\n"
+   '    edit "a"\n        set type iprange\n        set start-ip 10.0.0.0\n        set end-ip 10.0.0.99\n    next\n'
+   '    edit "b"\n        set type iprange\n        set start-ip 10.0.0.50\n        set end-ip 10.0.0.199\n    next\n'
+   '    edit "c"\n        set type iprange\n        set start-ip 10.0.0.200\n        set end-ip 10.0.0.250\n    next\n'
+   '    edit "inner"\n        set subnet 10.0.0.60 255.255.255.252\n    next\n'
+   "end\n"
+)
+def _records(*rules):
+   out = [OBJECTS, "config firewall policy\n"]
+   for pid, srcintf, srcaddr, action, *status in rules:
+       out.append(f'    edit {pid}\n        set srcintf "{srcintf}"\n        set dstintf "port2"\n'
+                  f'        set srcaddr "{srcaddr}"\n        set dstaddr "all"\n        set service "ALL"\n'
+                  f'        set action {action}\n' + "".join(f"        set status {s}\n" for s in status) + "    next\n")
+   out.append("end\n")
+   return vdom_records(policy_tables(parse_config_tree("".join(out))))
+def _rows(records):
+   return [(r["policy_id"], r["overlaps_with"], r["type"], r["relation"]) for r in find_conflicts(records)]
+def test_earlier_and_later_follow_config_sequence():
+   # `edit 2` (deny) sits above `edit 1`: 1 is the later rule.
+   assert _rows(_records((2, "port1", "a", "deny"), (1, "port1", "b", "accept"))) == [(1, 2, "Conflict", "Partial overlap")]
+   assert _rows(_records((1, "port1", "b", "accept"), (2, "port1", "a", "deny"))) == [(2, 1, "Conflict", "Partial overlap")]
+def test_correlation_and_narrower_earlier_rule():
+   assert _rows(_records((1, "port1", "inner", "accept"), (2, "port1", "b", "accept"))) == [(2, 1, "Correlation", "Earlier rule is narrower")]
+@pytest.mark.parametrize("rules", [
+   # Disjoint addresses, disjoint interfaces, two denies, an earlier rule covering the later one, a disabled rule.
+   [(1, "port1", "a", "accept"), (2, "port1", "c", "deny")],
+   [(1, "port1", "a", "accept"), (2, "port3", "b", "deny")],
+   [(1, "port1", "a", "deny"), (2, "port1", "b", "deny")],
+   [(1, "port1", "b", "deny"), (2, "port1", "inner", "accept")],
+   [(1, "port1", "a", "deny", "disable"), (2, "port1", "b", "accept")],
+])
+def test_no_conflict(rules):
+   assert _rows(_records(*rules)) == []
+def test_any_interface_overlaps_every_interface():
+   i, j = overlapping_pairs(_records((1, "any", "a", "accept"), (2, "port3", "b", "deny"), (3, "port4", "c", "deny")))
+   assert list(zip(i.tolist(), j.tolist())) == [(0, 1)]
@@ -0,0 +1,29 @@
+# tests/test_pack_cache.py
+"""Compiled-pack cache: data-only entries in a private directory, keyed on the rule registry too."""
+import os
+import benchmark_loader
+from benchmark_loader import PACK_DIR, SUPPORTED_PACKS, load_pack_file, pack_to_data
+PACK = os.path.join(PACK_DIR, SUPPORTED_PACKS["7.0.x|v1.4.0"])
+def test_cached_load_matches_compile(tmp_path):
+   cache = str(tmp_path / "cache")
+   compiled = load_pack_file(PACK, None)
+   load_pack_file(PACK, cache)
+   assert [f.endswith(".pack.json") for f in os.listdir(cache)] == [True]
+   assert pack_to_data(load_pack_file(PACK, cache)) == pack_to_data(compiled)
+def test_shared_directory_is_not_used(tmp_path):
+   cache = tmp_path / "cache"
+   cache.mkdir(mode=0o777)
+   os.chmod(cache, 0o777)
+   load_pack_file(PACK, str(cache))
+   assert os.listdir(cache) == []
+def test_registry_change_invalidates_entries(tmp_path, monkeypatch):
+   with open(PACK, "rb") as f:
+       raw = f.read()
+   before = benchmark_loader._cache_path(raw, str(tmp_path))
+   benchmark_loader._registry_fingerprint.cache_clear()
+   from benchmark_packs import rules
+   monkeypatch.setitem(rules.RULE_CONTEXT, "snmp_strong", ("snmp_users", "sys_global"))
+   try:
+       assert benchmark_loader._cache_path(raw, str(tmp_path)) != before
+   finally:
+       benchmark_loader._registry_fingerprint.cache_clear()
@@ -0,0 +1,70 @@
+# tests/test_reachability.py
+"""Zone reachability: direct and multi-hop paths, pivot checks, `any` interfaces, ignored rules."""
+from analyzer import policy_tables, vdom_records
+from config_tree import parse_config_tree
+from reachability import ZoneGraph, zone_reachability
+ADDRESSES = {"lan-net": "10.0.1.0 255.255.255.0", "dmz-net": "10.0.2.0 255.255.255.0", "db": "10.0.3.5 255.255.255.255"}
+def _records(rules):
+   lines = ["config firewall address"]
+   for name, subnet in ADDRESSES.items():
+       lines += [f'    edit "{name}"', f"        set subnet {subnet}", "    next"]
+   lines += ["end", "config firewall policy"]
+   for pid, (sif, dif, src, dst, action, *status) in enumerate(rules, 1):
+       lines += [f"    edit {pid}", f'        set srcintf "{sif}"', f'        set dstintf "{dif}"',
+                 f'        set srcaddr "{src}"', f'        set dstaddr "{dst}"', f"        set action {action}",
+                 '        set service "ALL"', '        set schedule "always"']
+       lines += [f"        set status {s}" for s in status] + ["    next"]
+   return vdom_records(policy_tables(parse_config_tree("\n".join(lines + ["end", ""]))))
+def _by_pair(rows):
+   return {(r["srcintf"], r["dstintf"]): r for r in rows}
+def test_multi_hop_path_and_pivot():
+   rows = _by_pair(zone_reachability(_records([
+       ("lan", "dmz", "lan-net", "dmz-net", "accept"),
+       ("dmz", "db", "dmz-net", "db", "accept"),
+       ("dmz", "wan", "db", "all", "accept"),
+   ])))
+   assert rows[("lan", "dmz")]["indicator"] == "Direct" and rows[("lan", "dmz")]["hops"] == 1
+   two = rows[("lan", "db")]
+   assert (two["hops"], two["path"], two["policies"], two["indicator"]) == (2, "lan -> dmz -> db", "1 -> 2", "Transitive")
+   # Hosts lan reaches in dmz (dmz-net) are the sources dmz -> db allows.
+   assert two["pivot"] == "YES"
+   assert (two["srcaddr"], two["dstaddr"]) == ("lan-net", "db")
+   # dmz -> wan only lets db out, and db is not in dmz-net.
+   assert rows[("lan", "wan")]["pivot"] == "NO"
+   assert ("db", "lan") not in rows
+def test_ignored_rules_and_hairpin():
+   rows = _by_pair(zone_reachability(_records([
+       ("lan", "wan", "all", "all", "deny"),
+       ("lan", "dmz", "all", "all", "accept", "disable"),
+       ("LAN", "lan", "all", "all", "accept"),
+   ]), vdom="vd1"))
+   assert list(rows) == [("LAN", "LAN")]
+   assert rows[("LAN", "LAN")]["indicator"] == "Hairpin / Same-Zone"
+   assert rows[("LAN", "LAN")]["vdom"] == "vd1"
+def test_any_interface_reaches_every_node():
+   graph = ZoneGraph(_records([
+       ("lan", "any", "all", "all", "accept"),
+       ("dmz", "wan", "all", "all", "accept"),
+   ]))
+   assert graph.nodes == ["dmz", "lan", "wan"]
+   lan, dmz, wan = graph.nodes.index("lan"), graph.nodes.index("dmz"), graph.nodes.index("wan")
+   assert graph.adjacency[lan].all()
+   assert graph.hops[dmz, lan] == 0
+   assert graph.path(lan, wan) == [lan, wan]
+   assert graph.path(dmz, lan) == []
+def test_hops_match_breadth_first_search():
+   chain = [(f"z{k}", f"z{k + 1}", "all", "all", "accept") for k in range(6)] + [("z6", "z2", "all", "all", "accept")]
+   graph = ZoneGraph(_records(chain))
+   n = len(graph.nodes)
+   for s in range(n):
+       dist, frontier, level = {}, [s], 0
+       while frontier:
+           level += 1
+           nxt = [d for f in frontier for d in range(n) if graph.adjacency[f, d] and d not in dist]
+           for d in nxt:
+               dist.setdefault(d, level)
+           frontier = list(dict.fromkeys(nxt))
+       assert {d: int(graph.hops[s, d]) for d in range(n) if graph.hops[s, d]} == dist
+       for d, h in dist.items():
+           path = graph.path(s, d)
+           assert len(path) == h + 1 and all(graph.adjacency[a, b] for a, b in zip(path, path[1:]))
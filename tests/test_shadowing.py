@@ -0,0 +1,41 @@
+# tests/test_shadowing.py
+"""Shadowed, redundant and union-shadowed rules follow config sequence, not policy ids."""
+from analyzer import find_shadowed_redundant, policy_tables, vdom_records
+from config_tree import parse_config_tree
+from policy_matrix import find_union_shadowed
+OBJECTS = (
+   "config firewall address\n"
+   '    edit "net10"\n        set subnet 10.0.0.0 255.255.255.0\n    next\n'
+   '    edit "low"\n        set subnet 10.0.0.0 255.255.255.128\n    next\n'
+   '    edit "high"\n        set subnet 10.0.0.128 255.255.255.128\n    next\n'
+   "end\n"
+)
+def _records(*rules):
+   out = [OBJECTS, "config firewall policy\n"]
+   for pid, srcaddr, action in rules:
+       out.append(f'    edit {pid}\n        set srcintf "port1"\n        set dstintf "port2"\n'
+                  f'        set srcaddr "{srcaddr}"\n        set dstaddr "all"\n        set service "ALL"\n'
+                  f'        set action {action}\n        set schedule "always"\n    next\n')
+   out.append("end\n")
+   return vdom_records(policy_tables(parse_config_tree("".join(out))))
+def test_rule_moved_above_lower_id_shadows_it():
+   # `edit 5` was moved above `edit 1`.
+   shadowed, redundant = find_shadowed_redundant(_records((5, "all", "accept"), (1, "net10", "accept")))
+   assert [(r["policy_id"], r["shadowed_by"]) for r in shadowed] == [(1, 5)]
+   assert [(r["policy_id"], r["covered_by"]) for r in redundant] == [(1, 5)]
+def test_lower_id_below_is_not_shadowed():
+   shadowed, _ = find_shadowed_redundant(_records((1, "net10", "accept"), (5, "all", "accept")))
+   assert shadowed == []
+def test_earlier_deny_shadows_allow():
+   records = _records((2, "all", "deny"), (1, "net10", "accept"))
+   shadowed, redundant = find_shadowed_redundant(records)
+   assert [(r["policy_id"], r["shadowed_by"]) for r in shadowed] == [(1, 2)]
+   assert "different action" in shadowed[0]["reason"]
+   # Removing 1 changes nothing, but no allow covers it.
+   assert redundant == []
+   assert find_union_shadowed(records) == []
+def test_combination_of_earlier_rules():
+   records = _records((3, "low", "deny"), (2, "high", "accept"), (1, "net10", "accept"))
+   assert find_shadowed_redundant(records) == ([], [])
+   rows = find_union_shadowed(records)
+   assert [(r["policy_id"], r["covered_by"], r["same_action"]) for r in rows] == [(1, "3 2", "NO")]
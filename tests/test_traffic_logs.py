@@ -0,0 +1,71 @@
+# tests/test_traffic_logs.py
+"""Traffic log replay: chunk boundaries, gzip, non-traffic lines, VDOM and timestamp defaults."""
+import gzip
+import io
+from dataclasses import asdict
+from analyzer import analyze_config
+from traffic_logs import apply_hits, iter_chunks, open_log, scan_logs, scan_stream
+T0 = 1700000000
+def _line(pid, kind="traffic", vd='"root"', sent=100, rcvd=50, eventtime=None, extra=""):
+   # eventtime wins over the device-local date/time when both are present.
+   stamp = f"date=2020-01-01 time=00:00:00 eventtime={eventtime} " if eventtime is not None else "date=2023-11-14 time=22:13:20 "
+   vdom = f" vd={vd}" if vd else ""
+   return (f'{stamp}devname="fgt" type="{kind}" subtype="forward"{vdom} policyid={pid} '
+           f"sentbyte={sent} rcvdbyte={rcvd}{extra}\n")
+LOG = "".join([
+   _line(1, eventtime=T0 * 10 ** 9),
+   _line(1, eventtime=T0 * 1000 + 5, sent=1, rcvd=1),
+   _line(2, vd='"dmz"', eventtime=T0 + 60),
+   _line(3, vd=None, eventtime=T0),
+   # UTM and event logs carry policyid too; only traffic lines are sessions.
+   _line(1, kind="utm"),
+   _line(2, kind="event", vd='"dmz"'),
+   'date=2023-11-14 time=22:13:20 type="traffic" policyid=abc sentbyte=1\n',
+   _line(4),
+]).encode("ascii")
+def _table(hits):
+   return {key: tuple(v) for key, v in hits.policies.items()}
+def test_counts_traffic_lines_only():
+   hits = scan_stream(io.BytesIO(LOG))
+   assert _table(hits) == {
+       ("root", 1): (2, 152, T0),
+       ("dmz", 2): (1, 150, T0 + 60),
+       # No vd= field: the root VDOM.
+       ("root", 3): (1, 150, T0),
+       # No eventtime: date= time= as wall clock.
+       ("root", 4): (1, 150, T0),
+   }
+   assert hits.lines == 5 and hits.vdoms() == ["dmz", "root"]
+   assert (hits.first_seen, hits.last_seen) == (T0, T0 + 60)
+def test_chunk_boundaries_do_not_change_the_result():
+   whole = _table(scan_stream(io.BytesIO(LOG)))
+   for size in (1, 7, 64, len(LOG) - 1):
+       chunks = list(iter_chunks(io.BytesIO(LOG), size))
+       assert b"".join(chunks) == LOG
+       assert all(c.endswith(b"\n") for c in chunks)
+       assert _table(scan_stream(io.BytesIO(LOG), size)) == whole
+def test_last_line_without_newline():
+   hits = scan_stream(io.BytesIO(LOG.rstrip(b"\n")), 64)
+   assert ("root", 4) in hits.policies
+def test_gzip_paths_and_streams(tmp_path):
+   plain, packed = tmp_path / "a.log", tmp_path / "b.log.gz"
+   plain.write_bytes(LOG)
+   packed.write_bytes(gzip.compress(LOG))
+   expected = _table(scan_stream(io.BytesIO(LOG)))
+   with open_log(str(packed)) as stream:
+       assert _table(scan_stream(stream)) == expected
+   assert _table(scan_stream(open_log(io.BytesIO(gzip.compress(LOG))))) == expected
+   both = scan_logs([str(plain), str(packed)], max_workers=1)
+   assert both.files == 2
+   assert both.policies[("root", 1)] == [4, 304, T0]
+   assert _table(scan_logs([str(plain), str(packed)], max_workers=2)) == _table(both)
+def test_unused_rules_need_full_logging():
+   config = "config firewall policy\n" + "".join(
+       f'    edit {pid}\n        set srcintf "port1"\n        set dstintf "port2"\n        set action accept\n'
+       f'        set logtraffic {mode}\n    next\n' for pid, mode in ((1, "all"), (5, "all"), (6, "utm"))) + "end\n"
+   result = analyze_config(config)
+   applied = apply_hits(result, scan_stream(io.BytesIO(LOG)))
+   assert [row["policy_id"] for row in applied.unused] == [5]
+   assert {row["policy_id"]: row["hits"] for row in applied.policies_raw} == {1: 2, 5: 0, 6: 0}
+   assert applied.traffic["traffic_lines"] == 5
+   assert asdict(result)["unused"] == []